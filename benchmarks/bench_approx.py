@@ -0,0 +1,55 @@
+"""
+Benchmark: exact vs. mode=approx charts over long transaction lists.
+
+Usage:
+    python -m benchmarks.bench_approx [--sizes 100000 1000000] [--sample 10000] [--repeat 3]
+
+For each size it reports the time of an exact expense pie + line chart over
+the whole six-year history (bucketing every row) and of the approximate
+ones (scanning a sample of --sample rows), the largest relative error of the
+approximate monthly expense totals and the widest reported 95% half-width,
+relative to its total. The last column times the median/p90 distribution
+chart over every row.
+"""
+import argparse
+
+from src.utils.aggregator import compute_line_data, compute_pie_data_range
+from src.utils.approx import approx_line_data, approx_pie_data, distribution_data
+from .bench_frame import EXPENSE_CATEGORIES, best_of, make_transactions
+
+WINDOW = (1, 2019, 12, 2024)
+
+
+def exact(transactions):
+    compute_pie_data_range(transactions, *WINDOW, EXPENSE_CATEGORIES)
+    return compute_line_data(transactions, *WINDOW)
+
+
+def approx(transactions, sample_size):
+    approx_pie_data(transactions, *WINDOW, EXPENSE_CATEGORIES, sample_size=sample_size, seed=1)
+    return approx_line_data(transactions, *WINDOW, sample_size=sample_size, seed=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--sample', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'exact ms':>9} {'approx ms':>10} {'max err':>8} {'max bound':>10} {'distr ms':>9}")
+    for n in args.sizes:
+        transactions = make_transactions(n)
+        exact_s, truth = best_of(args.repeat, exact, transactions)
+        approx_s, line = best_of(args.repeat, approx, transactions, args.sample)
+        distribution_s, _ = best_of(args.repeat, distribution_data, transactions, *WINDOW)
+
+        points = list(zip(line["expenseData"], line["expenseError"], truth["expenseData"]))
+        error = max(abs(v - t) / t for v, _, t in points if t)
+        bound = max(e / t for _, e, t in points if t)
+        print(f"{n:>10} {exact_s * 1000:>9.1f} {approx_s * 1000:>10.1f} {error:>7.1%} {bound:>9.1%} "
+              f"{distribution_s * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: memoized date parsing and month-key range checks.
+
+Usage:
+    python -m benchmarks.bench_dates [--rows 100000] [--repeat 5]
+
+Compares, per transaction date:
+- the original split/int parser vs. the memoized parse_full_date
+- the original `any(...)` scan over generate_month_range() vs. an O(1)
+  membership test on month_key_range()
+"""
+import argparse
+
+from src.utils.date_utils import (
+    date_month_key,
+    generate_month_range,
+    month_key_range,
+    parse_full_date
+)
+from .bench_frame import best_of, make_transactions
+
+
+def legacy_parse_full_date(dd_mm_yyyy):
+    # parse_full_date before memoization, kept verbatim for comparison.
+    try:
+        y, m, d = dd_mm_yyyy.split('-')
+        day = int(d)
+        month = int(m)
+        year = int(y)
+
+        if month < 1 or month > 12:
+            return (0, 0, 0)
+        if day < 1 or day > 31:
+            return (0, 0, 0)
+
+        return (day, month, year)
+    except:
+        return (0, 0, 0)
+
+
+def parse_all(parse, dates):
+    for d in dates:
+        parse(d)
+
+
+def legacy_count_in_range(dates, window):
+    month_tuples = generate_month_range(*window)
+    count = 0
+    for d in dates:
+        _, mm, yyyy = legacy_parse_full_date(d)
+        if any((mm == m and yyyy == y) for (m, y) in month_tuples):
+            count += 1
+    return count
+
+
+def keyed_count_in_range(dates, window):
+    keys = month_key_range(*window)
+    count = 0
+    for d in dates:
+        if date_month_key(d) in keys:
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    dates = [t["date"] for t in make_transactions(args.rows)]
+    window = (1, 2020, 12, 2024)
+    parse_all(parse_full_date, dates)  # warm the cache, as a second chart pass would
+
+    rows = [
+        ("parse", best_of(args.repeat, parse_all, legacy_parse_full_date, dates)[0],
+         best_of(args.repeat, parse_all, parse_full_date, dates)[0]),
+        ("range check", best_of(args.repeat, legacy_count_in_range, dates, window)[0],
+         best_of(args.repeat, keyed_count_in_range, dates, window)[0]),
+    ]
+
+    print(f"{args.rows} dates, {len(set(dates))} distinct, window {window}")
+    print(f"{'':>12} {'legacy (ns/row)':>16} {'new (ns/row)':>14} {'speedup':>9}")
+    for name, legacy, new in rows:
+        print(
+            f"{name:>12} {legacy / args.rows * 1e9:>16.0f} {new / args.rows * 1e9:>14.0f} "
+            f"{legacy / new:>8.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: pure-Python bucket engine vs. NumPy TransactionFrame.
+
+Usage:
+    python -m benchmarks.bench_frame [--sizes 10000 100000 1000000] [--repeat 3]
+
+For each size it reports the time to answer line + expense pie + bar charts
+over a 5-year range from the raw list, the one-off cost of building the
+frame, and the time to answer the same charts from the frame.
+"""
+import argparse
+import random
+import time
+
+from src.utils.aggregator import compute_line_data, compute_pie_data_range, compute_bar_data
+from src.utils.frame import HAS_NUMPY, TransactionFrame
+
+EXPENSE_CATEGORIES = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+INCOME_CATEGORIES = ["Salary", "Investments", "Gifts", "Refunds", "Other"]
+
+
+def make_transactions(n, seed=42):
+    rng = random.Random(seed)
+    transactions = []
+    for _ in range(n):
+        expense = rng.random() < 0.8
+        transactions.append({
+            "date": f"{rng.randint(2019, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": "spent" if expense else "receive",
+            "amount": round(rng.uniform(1, 2000), 2),
+            "category": rng.choice(EXPENSE_CATEGORIES if expense else INCOME_CATEGORIES)
+        })
+    return transactions
+
+
+def run_charts(transactions):
+    compute_line_data(transactions, 1, 2020, 12, 2024)
+    compute_pie_data_range(transactions, 1, 2020, 12, 2024, EXPENSE_CATEGORIES, expense=True)
+    compute_bar_data(transactions, 1, 2020, 12, 2024, "Expense", "Groceries")
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        raise SystemExit("NumPy is not installed; nothing to compare.")
+
+    print(f"{'rows':>10} {'python (s)':>12} {'build (s)':>12} {'numpy (s)':>12} {'speedup':>10} {'w/ build':>10}")
+    for n in args.sizes:
+        transactions = make_transactions(n)
+        py_time, _ = best_of(args.repeat, run_charts, transactions)
+        build_time, frame = best_of(args.repeat, TransactionFrame.from_transactions, transactions)
+        np_time, _ = best_of(args.repeat, run_charts, frame)
+        print(
+            f"{n:>10} {py_time:>12.4f} {build_time:>12.4f} {np_time:>12.4f} "
+            f"{py_time / np_time:>9.1f}x {py_time / (build_time + np_time):>9.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: JSON encode/decode cost, standard library vs. orjson.
+
+Usage:
+    python -m benchmarks.bench_json [--rows 1000 10000 100000] [--users 1000] [--repeat 5]
+
+Measures, with each available engine (make_codec('stdlib') / make_codec('orjson')):
+- decoding upstream payloads of --rows transactions (what the clients do
+  with every Transaction Service response)
+- encoding a dashboard response over 12 and 120 months (line, both pies
+  and four bar series), through Flask's jsonify() with the engine's provider
+- encoding one NDJSON line per user for a --users batch
+"""
+import argparse
+import json
+
+from flask import Flask, jsonify
+
+from src.utils.aggregator import compute_charts, compute_dashboard_data
+from src.utils.json_codec import HAS_ORJSON, CodecJSONProvider, make_codec
+from .bench_frame import best_of, make_transactions
+from .suite import month_window
+
+EXPENSE_CATEGORIES = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+INCOME_CATEGORIES = ["Salary", "Investments", "Gifts", "Refunds", "Other"]
+BAR_SPECS = [("Expense", "Rent"), ("Expense", "Groceries"), ("Income", "Salary"), ("Income", "Gifts")]
+BATCH_CHARTS = [("line", None, None), ("pie/expense", None, None), ("pie/income", None, None),
+                ("bar", "Expense", "Rent")]
+
+
+def flask_app(codec):
+    app = Flask(__name__)
+    if codec.name != 'stdlib':
+        app.json = CodecJSONProvider(app, codec)
+    return app
+
+
+def encode_response(app, payload):
+    with app.app_context():
+        return jsonify(payload).data
+
+
+def encode_lines(codec, lines):
+    return [codec.dumps(line) + b"\n" for line in lines]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    codecs = [make_codec('stdlib')] + ([make_codec('orjson')] if HAS_ORJSON else [])
+    if not HAS_ORJSON:
+        print("orjson is not installed; only the standard library is measured")
+
+    def report(label, size, fn, *fn_args):
+        timings = []
+        for codec in codecs:
+            seconds, _ = best_of(args.repeat, fn, codec, *fn_args)
+            timings.append(seconds)
+        cells = " ".join(f"{t * 1000:>10.3f}" for t in timings)
+        speedup = f"{timings[0] / timings[-1]:>7.1f}x" if len(timings) > 1 else ""
+        print(f"{label:>18} {size:>12} {cells} {speedup}")
+
+    print(f"{'':>18} {'size':>12} " + " ".join(f"{c.name + ' ms':>10}" for c in codecs)
+          + ("  speedup" if len(codecs) > 1 else ""))
+
+    for n in args.rows:
+        body = json.dumps(make_transactions(n)).encode('utf-8')
+        report("decode upstream", f"{len(body) / 2 ** 20:.1f} MB", lambda codec, b: codec.loads(b), body)
+
+    transactions = make_transactions(10_000)
+    for months in (12, 120):
+        payload = compute_dashboard_data(transactions, *month_window(months),
+                                         EXPENSE_CATEGORIES, INCOME_CATEGORIES, BAR_SPECS)
+        apps = {codec.name: flask_app(codec) for codec in codecs}
+        size = f"{len(json.dumps(payload)) / 2 ** 10:.0f} KB"
+        report(f"dashboard {months}m", size, lambda codec, p: encode_response(apps[codec.name], p), payload)
+
+    charts = compute_charts(transactions, *month_window(120), BATCH_CHARTS, EXPENSE_CATEGORIES, INCOME_CATEGORIES)
+    lines = [{"userId": user_id, "charts": charts} for user_id in range(args.users)]
+    size = f"{sum(len(json.dumps(line)) for line in lines) / 2 ** 20:.1f} MB"
+    report(f"batch {args.users} users", size, encode_lines, lines)
+
+
+if __name__ == '__main__':
+    main()
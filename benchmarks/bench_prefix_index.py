@@ -0,0 +1,54 @@
+"""
+Benchmark: date-range slider windows from a PrefixIndex vs. MonthlyBuckets.
+
+Usage:
+    python -m benchmarks.bench_prefix_index [--sizes 10000 100000 1000000] [--windows 50] [--repeat 3]
+
+For each size it reports the one-off cost of building the index from the
+user's monthly buckets, then the time to answer a run of slider windows
+(expense pie + line chart each) from the buckets (what a cached chart
+request does today) and from the index.
+"""
+import argparse
+import random
+
+from src.utils.aggregator import bucket_transactions, compute_line_data, compute_pie_data_range
+from src.utils.prefix_index import PrefixIndex
+from .bench_frame import EXPENSE_CATEGORIES, best_of, make_transactions
+
+
+def slider_windows(n, seed=7):
+    rng = random.Random(seed)
+    windows = []
+    for _ in range(n):
+        start, end = sorted(rng.sample(range(2019 * 12 + 1, 2024 * 12 + 13), 2))
+        windows.append(((start - 1) % 12 + 1, (start - 1) // 12, (end - 1) % 12 + 1, (end - 1) // 12))
+    return windows
+
+
+def answer(source, windows):
+    for window in windows:
+        compute_pie_data_range(source, *window, EXPENSE_CATEGORIES)
+        compute_line_data(source, *window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--windows', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    windows = slider_windows(args.windows)
+
+    print(f"{'rows':>10} {'build ms':>9} {'buckets ms':>11} {'index ms':>9} {'speedup':>8}")
+    for n in args.sizes:
+        buckets = bucket_transactions(make_transactions(n))
+        build_s, index = best_of(args.repeat, PrefixIndex.from_buckets, buckets)
+        buckets_s, _ = best_of(args.repeat, answer, buckets, windows)
+        index_s, _ = best_of(args.repeat, answer, index, windows)
+        print(f"{n:>10} {build_s * 1000:>9.2f} {buckets_s * 1000:>11.1f} {index_s * 1000:>9.2f} "
+              f"{buckets_s / index_s:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark: SQLite snapshot GROUP BY vs. bucketing the full transaction list.
+
+Usage:
+    python -m benchmarks.bench_snapshots [--sizes 10000 100000 1000000] [--repeat 3]
+
+For each size it reports the time to bucket the whole list in Python (what
+every uncached chart request does after its fetch), the one-off cost of a
+full snapshot sync, and the time to answer 12-month and 5-year windows from
+the snapshot.
+"""
+import argparse
+import os
+import tempfile
+
+from src.utils.aggregator import bucket_transactions
+from src.utils.date_utils import month_key
+from src.utils.snapshots import SnapshotStore, SyncPlan
+from .bench_frame import best_of, make_transactions
+
+OWNER = ("1", "bench")
+CURRENT_KEY = month_key(12, 2024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'python ms':>10} {'sync ms':>10} {'sql 12m ms':>11} {'sql 5y ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        transactions = make_transactions(n)
+        python_s, _ = best_of(args.repeat, bucket_transactions, transactions)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(os.path.join(tmp, "snapshots.sqlite3"))
+            sync_s, _ = best_of(1, store.apply_sync, OWNER, SyncPlan(None), transactions, CURRENT_KEY)
+            year_s, _ = best_of(args.repeat, store.buckets, OWNER, (1, 2024, 12, 2024))
+            five_s, buckets = best_of(args.repeat, store.buckets, OWNER, (1, 2020, 12, 2024))
+            store.close()
+
+        assert len(buckets) > 0
+        print(f"{n:>10} {python_s * 1000:>10.1f} {sync_s * 1000:>10.1f} {year_s * 1000:>11.2f} "
+              f"{five_s * 1000:>10.2f} {python_s / five_s:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
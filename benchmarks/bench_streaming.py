@@ -0,0 +1,65 @@
+"""
+Benchmark: whole-body `json.loads` + bucketing vs. streaming ingestion.
+
+Usage:
+    python -m benchmarks.bench_streaming [--sizes 10000 100000 1000000] [--chunk-size 65536]
+
+For each size the raw JSON body is built up front, then both ingestion
+paths turn it into MonthlyBuckets. Peak memory is measured with tracemalloc
+(allocations made while ingesting only, not the raw body itself); timings
+include tracemalloc overhead, so compare them with each other only.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from src.utils.aggregator import bucket_transactions
+from src.utils.json_stream import iter_json_array
+from benchmarks.bench_frame import make_transactions
+
+
+def iter_chunks(raw, chunk_size):
+    view = memoryview(raw)
+    for start in range(0, len(raw), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+def load_whole(raw, chunk_size):
+    return bucket_transactions(json.loads(raw))
+
+
+def load_streaming(raw, chunk_size):
+    return bucket_transactions(iter_json_array(iter_chunks(raw, chunk_size)))
+
+
+def measure(fn, raw, chunk_size):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(raw, chunk_size)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'body MB':>9} {'whole s':>9} {'whole MB':>10} {'stream s':>9} {'stream MB':>10}")
+    for n in args.sizes:
+        raw = json.dumps(make_transactions(n)).encode('utf-8')
+        whole_time, whole_peak, whole = measure(load_whole, raw, args.chunk_size)
+        stream_time, stream_peak, streamed = measure(load_streaming, raw, args.chunk_size)
+        assert whole == streamed
+        print(
+            f"{n:>10} {len(raw) / 2 ** 20:>9.1f} {whole_time:>9.3f} {whole_peak / 2 ** 20:>10.1f} "
+            f"{stream_time:>9.3f} {stream_peak / 2 ** 20:>10.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
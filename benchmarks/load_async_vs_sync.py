@@ -0,0 +1,149 @@
+"""
+Load test: sync Flask app vs. async ASGI app under concurrent dashboard load.
+
+Usage:
+    python -m benchmarks.load_async_vs_sync [--requests 2000] [--concurrency 200]
+                                            [--upstream-delay 0.05] [--transactions 500]
+
+Starts a local stub Transaction Service (each call sleeps --upstream-delay
+seconds to mimic network/DB latency), then serves the analytics app twice:
+the Flask app on its threaded development server, and src.asgi:app under
+uvicorn (one process). Both are hit with the same concurrent load on
+/analytics/dashboard with the transaction cache disabled, so every request
+waits on the upstream.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+import requests
+
+from benchmarks.bench_frame import make_transactions
+from tests.stub_transaction_service import StubResponse, StubTransactionService
+
+SYNC_CMD = (
+    "from src.app import create_app; "
+    "create_app().run(host='127.0.0.1', port={port}, threaded=True)"
+)
+
+DASHBOARD_PATH = "/analytics/dashboard?userId=1&startMonth=2020-01&endMonth=2024-12&bar=Expense:Rent"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def start_server(kind, port, env):
+    if kind == 'sync':
+        cmd = [sys.executable, '-c', SYNC_CMD.format(port=port)]
+    elif kind == 'gunicorn':
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'src.wsgi:app']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'src.asgi:app',
+               '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(base_url, total, concurrency, paths=(DASHBOARD_PATH,)):
+    """
+    Sends `total` GETs with `concurrency` workers, cycling through `paths`.
+    """
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(paths[i % len(paths)])
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(base_url, connector=connector) as session:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    async with session.get(path) as resp:
+                        await resp.read()
+                        if resp.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--upstream-delay', type=float, default=0.05)
+    parser.add_argument('--transactions', type=int, default=500)
+    args = parser.parse_args()
+
+    stub = StubTransactionService().start()
+    payload = json.dumps(make_transactions(args.transactions)).encode("utf-8")
+    stub.queue(StubResponse(body=payload, delay=args.upstream_delay))
+
+    env = dict(os.environ, TRANSACTION_SERVICE_URL=stub.url, TRANSACTION_CACHE_TTL='0')
+    print(f"{'mode':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    try:
+        for kind in ('sync', 'async'):
+            port = free_port()
+            server = start_server(kind, port, env)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                wait_until_up(base_url + "/analytics/line")
+                result = asyncio.run(run_load(base_url, args.requests, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+            print(
+                f"{kind:>6} {result['throughput_rps']:>10.1f} {result['p50_ms']:>10.1f} "
+                f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>8}"
+            )
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Load test: Flask development server vs. gunicorn with pre-forked workers.
+
+Usage:
+    python -m benchmarks.load_wsgi [--workers 1 2 4] [--threads 8] [--requests 2000]
+                                   [--concurrency 50] [--upstream-delay 0] [--transactions 5000]
+
+Serves the Flask app on its threaded development server (one process), then
+under gunicorn (gunicorn.conf.py) once per --workers count, and sends the
+same mixed chart load (line, pies, bar, dashboard) to each against a local
+stub Transaction Service. The transaction cache is disabled and the default
+payload is large enough that aggregation, not the upstream, dominates, which
+is where extra worker processes pay off: the development server is bound to
+one core by the GIL.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from benchmarks.bench_frame import make_transactions
+from tests.stub_transaction_service import StubResponse, StubTransactionService
+from .load_async_vs_sync import free_port, run_load, start_server, wait_until_up
+from .suite import LOAD_PATHS
+
+
+def measure(kind, env, args):
+    port = free_port()
+    server = start_server(kind, port, env)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url + "/healthz")
+        return asyncio.run(run_load(base_url, args.requests, args.concurrency, LOAD_PATHS))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--upstream-delay', type=float, default=0.0)
+    parser.add_argument('--transactions', type=int, default=5000)
+    args = parser.parse_args()
+
+    stub = StubTransactionService().start()
+    payload = json.dumps(make_transactions(args.transactions)).encode("utf-8")
+    stub.queue(StubResponse(body=payload, delay=args.upstream_delay))
+
+    env = dict(os.environ, TRANSACTION_SERVICE_URL=stub.url, TRANSACTION_CACHE_TTL='0',
+               WSGI_THREADS=str(args.threads))
+    runs = [('dev server', 'sync', env)]
+    runs += [(f'gunicorn {n}w x {args.threads}t', 'gunicorn', dict(env, WSGI_WORKERS=str(n)))
+             for n in args.workers]
+
+    print(f"{'server':>20} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    try:
+        for label, kind, run_env in runs:
+            result = measure(kind, run_env, args)
+            print(
+                f"{label:>20} {result['throughput_rps']:>10.1f} {result['p50_ms']:>10.1f} "
+                f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>8}"
+            )
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Benchmark suite: aggregator micro-benchmarks and an end-to-end load test.
+
+Usage:
+    python -m benchmarks.suite micro [--sizes 1000 10000 100000 1000000] [--months 1 12 120]
+                                     [--repeat 3] [--output micro.json]
+    python -m benchmarks.suite load [--server sync|gunicorn|async] [--requests 2000] [--concurrency 50]
+                                    [--upstream-delay 0] [--transactions 500] [--output load.json]
+    python -m benchmarks.suite compare BASELINE.json CURRENT.json [--threshold 0.1]
+
+`micro` times compute_line_data, compute_pie_data_range, compute_bar_data,
+parse_full_date (cold and memoized) and generate_month_range on synthetic
+transaction lists. `load` serves the app in a subprocess against a local
+stub Transaction Service and reports throughput, p50/p95/p99 latency and the
+server's peak RSS. Both write their results as JSON; `compare` diffs two
+such files and exits with status 1 if anything regressed by more than the
+threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from src.utils.aggregator import compute_line_data, compute_pie_data_range, compute_bar_data
+from src.utils.date_utils import _parse_full_date, generate_month_range, parse_full_date
+from src.utils.frame import HAS_NUMPY
+from .bench_frame import EXPENSE_CATEGORIES, best_of, make_transactions
+from .load_async_vs_sync import DASHBOARD_PATH, free_port, run_load, start_server, wait_until_up
+
+LOAD_PATHS = (
+    "/analytics/line?userId=1&startMonth=2020-01&endMonth=2024-12",
+    "/analytics/pie/expense?userId=1&startMonth=2020-01&endMonth=2024-12",
+    "/analytics/bar?userId=1&startMonth=2020-01&endMonth=2024-12&type=Expense&category=Rent",
+    DASHBOARD_PATH
+)
+
+# Which way is better, per reported metric (used by `compare`).
+LOWER_IS_BETTER = {"seconds", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"}
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size of this process (or of its waited-for children).
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    divisor = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    return usage.ru_maxrss / divisor
+
+
+def process_peak_rss_mb(pid):
+    """
+    VmHWM of a running process (Linux only), or None.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    return None
+
+
+def month_window(months, end_m=12, end_y=2024):
+    """
+    The `months`-long window ending at (end_m, end_y): (start_m, start_y, end_m, end_y).
+    """
+    start = end_y * 12 + end_m - months
+    return (start % 12 + 1, start // 12, end_m, end_y)
+
+
+def environment():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": HAS_NUMPY
+    }
+
+
+def parse_dates(dates):
+    for d in dates:
+        parse_full_date(d)
+
+
+def parse_dates_cold(dates):
+    _parse_full_date.cache_clear()
+    parse_dates(dates)
+
+
+def run_micro(sizes, month_ranges, repeat):
+    results = []
+
+    def record(name, seconds, **params):
+        results.append(dict(name=name, seconds=seconds, **params))
+        detail = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:>24} {detail:<24} {seconds * 1000:>12.3f} ms")
+
+    for months in month_ranges:
+        window = month_window(months)
+        seconds, _ = best_of(max(repeat, 100), generate_month_range, *window)
+        record("generate_month_range", seconds, months=months)
+
+    for n in sizes:
+        transactions = make_transactions(n)
+        dates = [t["date"] for t in transactions]
+        record("parse_full_date", best_of(repeat, parse_dates_cold, dates)[0], rows=n, cache="cold")
+        record("parse_full_date", best_of(repeat, parse_dates, dates)[0], rows=n, cache="warm")
+
+        for months in month_ranges:
+            window = month_window(months)
+            record("compute_line_data", best_of(repeat, compute_line_data, transactions, *window)[0],
+                   rows=n, months=months)
+            record("compute_pie_data_range", best_of(
+                repeat, compute_pie_data_range, transactions, *window, EXPENSE_CATEGORIES, True
+            )[0], rows=n, months=months)
+            record("compute_bar_data", best_of(
+                repeat, compute_bar_data, transactions, *window, "Expense", "Rent"
+            )[0], rows=n, months=months)
+
+    return {"suite": "micro", **environment(), "results": results, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_load_test(server_kind, total, concurrency, upstream_delay, transaction_count, cache_ttl):
+    from tests.stub_transaction_service import StubResponse, StubTransactionService
+
+    stub = StubTransactionService().start()
+    payload = json.dumps(make_transactions(transaction_count)).encode("utf-8")
+    stub.queue(StubResponse(body=payload, delay=upstream_delay))
+    env = dict(os.environ, TRANSACTION_SERVICE_URL=stub.url, TRANSACTION_CACHE_TTL=str(cache_ttl))
+
+    port = free_port()
+    server = start_server(server_kind, port, env)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url + "/analytics/line")
+        result = asyncio.run(run_load(base_url, total, concurrency, LOAD_PATHS))
+        result["peak_rss_mb"] = process_peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+        stub.stop()
+    if result["peak_rss_mb"] is None:
+        result["peak_rss_mb"] = peak_rss_mb(children=True)
+
+    result.update(name=f"{server_kind}/mixed", concurrency=concurrency,
+                  upstream_delay=upstream_delay, transactions=transaction_count)
+    print(
+        f"{result['name']}: {result['throughput_rps']:.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+        f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+        f"{result['errors']} errors, peak RSS {result['peak_rss_mb']:.1f} MB"
+    )
+    return {"suite": "load", **environment(), "results": [result]}
+
+
+def result_key(result):
+    """
+    Identifies the same measurement across runs: name plus its parameters.
+    """
+    params = {k: v for k, v in result.items()
+              if k not in LOWER_IS_BETTER | HIGHER_IS_BETTER and k not in ("requests", "errors")}
+    return json.dumps(params, sort_keys=True)
+
+
+def compare(baseline, current, threshold):
+    """
+    Prints metric changes from `baseline` to `current`; returns the list of
+    regressions beyond `threshold` (a fraction, e.g. 0.1 for 10%).
+    """
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for metric in sorted((LOWER_IS_BETTER | HIGHER_IS_BETTER) & result.keys() & old.keys()):
+            before, after = old[metric], result[metric]
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            label = result_key(result)
+            print(f"{'REGRESSION' if worse else 'ok':>10} {metric:>14} {before:>12.3f} -> {after:>12.3f} "
+                  f"({change:+.1%}) {label}")
+            if worse:
+                regressions.append((label, metric, before, after))
+    return regressions
+
+
+def write_report(report, output):
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    micro = commands.add_parser('micro', help='aggregator and date micro-benchmarks')
+    micro.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    micro.add_argument('--months', type=int, nargs='+', default=[1, 12, 120])
+    micro.add_argument('--repeat', type=int, default=3)
+    micro.add_argument('--output')
+
+    load = commands.add_parser('load', help='end-to-end load test against a stub upstream')
+    load.add_argument('--server', choices=['sync', 'gunicorn', 'async'], default='sync')
+    load.add_argument('--requests', type=int, default=2000)
+    load.add_argument('--concurrency', type=int, default=50)
+    load.add_argument('--upstream-delay', type=float, default=0.0)
+    load.add_argument('--transactions', type=int, default=500)
+    load.add_argument('--cache-ttl', type=float, default=0)
+    load.add_argument('--output')
+
+    diff = commands.add_parser('compare', help='compare two result files')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == 'micro':
+        write_report(run_micro(args.sizes, args.months, args.repeat), args.output)
+    elif args.command == 'load':
+        write_report(run_load_test(args.server, args.requests, args.concurrency, args.upstream_delay,
+                                   args.transactions, args.cache_ttl), args.output)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for the Analytics microservice, read from src/config.py:
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+
+Workers are pre-forked processes (chart aggregation is CPU-bound and holds
+the GIL), each with WSGI_THREADS threads to overlap upstream waits. With
+preload the app is imported once in the master so workers share its code
+pages; connections the master may have opened are dropped in post_fork.
+Workers are recycled after WSGI_MAX_REQUESTS (+ jitter) requests, finishing
+in-flight requests within WSGI_GRACEFUL_TIMEOUT.
+"""
+import multiprocessing
+
+from src.config import (
+    APP_DEBUG,
+    WSGI_BIND,
+    WSGI_WORKERS,
+    WSGI_THREADS,
+    WSGI_PRELOAD,
+    WSGI_TIMEOUT,
+    WSGI_GRACEFUL_TIMEOUT,
+    WSGI_KEEPALIVE,
+    WSGI_MAX_REQUESTS,
+    WSGI_MAX_REQUESTS_JITTER
+)
+
+bind = WSGI_BIND
+workers = WSGI_WORKERS or multiprocessing.cpu_count() * 2 + 1
+threads = WSGI_THREADS
+worker_class = 'gthread' if WSGI_THREADS > 1 else 'sync'
+preload_app = WSGI_PRELOAD
+timeout = WSGI_TIMEOUT
+graceful_timeout = WSGI_GRACEFUL_TIMEOUT
+keepalive = WSGI_KEEPALIVE
+max_requests = WSGI_MAX_REQUESTS
+max_requests_jitter = WSGI_MAX_REQUESTS_JITTER
+loglevel = 'debug' if APP_DEBUG else 'info'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from src.routes.analytics_routes import after_fork
+    after_fork()
@@ -1,10 +1,15 @@
 import logging
 from flask import Flask
-from .config import APP_PORT, APP_DEBUG
-from .routes.analytics_routes import analytics_blueprint
+from .config import APP_PORT, APP_DEBUG, WARM_UP
+from .routes.analytics_routes import (
+    analytics_blueprint, json_codec, liveness, metrics, readiness, start_warm_up
+)
+from .utils.json_codec import CodecJSONProvider
 
 def create_app():
     app = Flask(__name__)
+    if json_codec.name != 'stdlib':
+        app.json = CodecJSONProvider(app, json_codec)
 
     logging.basicConfig(
         level=logging.DEBUG if APP_DEBUG else logging.INFO,
@@ -14,8 +19,13 @@ def create_app():
     logger.info("Starting Analytics Microservice...")
 
     app.register_blueprint(analytics_blueprint, url_prefix='/analytics')
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    app.add_url_rule('/healthz', 'liveness', liveness)
+    app.add_url_rule('/readyz', 'readiness', readiness)
     return app
 
 if __name__ == '__main__':
     app = create_app()
+    if WARM_UP:
+        start_warm_up()
     app.run(host='0.0.0.0', port=APP_PORT, debug=APP_DEBUG)
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+ASGI entry point for the Analytics microservice (async serving mode).
+
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+
+Serves the chart endpoints from routes/async_routes.py under /analytics,
+fetching transactions with a non-blocking HTTP client so one process can
+keep hundreds of dashboard requests in flight, and thousands of /stream
+connections open. The Flask app from create_app() remains the synchronous
+fallback.
+"""
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from .config import APP_DEBUG, SERVER_TIMING, COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY, WARM_UP
+from .routes.analytics_routes import compression_encodings, json_codec
+from .routes.async_routes import ASYNC_ROUTES, async_transaction_client, warm_up_async
+from .services.transaction_client import CircuitBreaker
+from .utils.compression import compress, negotiate_encoding, weak_etag
+from .utils.metrics import PROMETHEUS_CONTENT_TYPE, instrumentation, server_timing
+
+URL_PREFIX = '/analytics'
+METRICS_PATH = '/metrics'
+LIVENESS_PATH = '/healthz'
+READINESS_PATH = '/readyz'
+
+
+def create_asgi_app(routes=None, url_prefix=URL_PREFIX, client=async_transaction_client):
+    """
+    Builds the ASGI application callable.
+    """
+    routes = {url_prefix + path: handler for path, handler in (routes or ASYNC_ROUTES).items()}
+
+    logging.basicConfig(
+        level=logging.DEBUG if APP_DEBUG else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+    )
+    logger = logging.getLogger(__name__)
+
+    def encode_body(payload, extra_headers, accept_encoding):
+        """
+        JSON body of `payload`, compressed if the client accepts an encoding
+        (updating Vary, Content-Encoding and ETag in `extra_headers`).
+        """
+        with instrumentation.stage('serialize'):
+            body = json_codec.dumps(payload)
+        if compression_encodings:
+            extra_headers['Vary'] = 'Accept-Encoding'
+            encoding = negotiate_encoding(accept_encoding, compression_encodings)
+            if encoding is not None and len(body) >= COMPRESSION_MIN_SIZE:
+                with instrumentation.stage('compress'):
+                    body = compress(body, encoding, BROTLI_QUALITY if encoding == 'br' else GZIP_LEVEL)
+                extra_headers['Content-Encoding'] = encoding
+                if 'ETag' in extra_headers:
+                    extra_headers['ETag'] = weak_etag(extra_headers['ETag'])
+        return body
+
+    async def send_json(send, payload, status, extra_headers=None, timer=None, endpoint=None,
+                        accept_encoding=None):
+        extra_headers = dict(extra_headers or {})
+        content_type = 'application/json'
+        if payload is None:  # 304 Not Modified
+            body = b''
+        elif isinstance(payload, str):  # /metrics
+            body, content_type = payload.encode('utf-8'), PROMETHEUS_CONTENT_TYPE
+        else:
+            # serializing and compressing a large chart is CPU work: keep it off the event loop
+            body = await asyncio.to_thread(encode_body, payload, extra_headers, accept_encoding)
+
+        timings = instrumentation.finish_request(timer, endpoint, status)
+        if SERVER_TIMING and timings:
+            extra_headers['Server-Timing'] = server_timing(timings)
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in extra_headers.items()]
+        if payload is not None:
+            headers.append((b'content-type', content_type.encode('latin-1')))
+            headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def send_stream(send, receive, stream, status, extra_headers, timer, endpoint):
+        """
+        Sends `stream` (an async iterable of encoded events with aclose(),
+        e.g. async_routes.EventStream) as text/event-stream until it ends or
+        the client disconnects. Request metrics cover opening the stream.
+        """
+        instrumentation.finish_request(timer, endpoint, status)
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in (extra_headers or {}).items()]
+        headers.append((b'content-type', b'text/event-stream'))
+
+        async def stream_events():
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            async for chunk in stream:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        streaming = asyncio.ensure_future(stream_events())
+        watching = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait((streaming, watching), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            streaming.cancel()
+            watching.cancel()
+            await stream.aclose()
+        if streaming.done() and not streaming.cancelled() and streaming.exception() is not None:
+            logger.error(f"Stream {endpoint} failed", exc_info=streaming.exception())
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                logger.info("Starting Analytics Microservice (ASGI)...")
+                if WARM_UP:
+                    # the server accepts no requests (nor probes) until startup completes
+                    await warm_up_async(client)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path'].rstrip('/') or '/'
+        if path == METRICS_PATH and instrumentation.enabled and scope['method'] == 'GET':
+            await send_json(send, instrumentation.render(), 200)
+            return
+        if path == LIVENESS_PATH:
+            await send_json(send, {"status": "ok"}, 200)
+            return
+        if path == READINESS_PATH:
+            circuit = client.breaker.state
+            ready = circuit != CircuitBreaker.OPEN
+            await send_json(send, {"status": "ok" if ready else "unavailable", "transactionService": circuit},
+                            200 if ready else 503)
+            return
+        handler = routes.get(path)
+        if handler is None:
+            await send_json(send, {"error": "Not found."}, 404)
+            return
+        if scope['method'] != 'GET':
+            await send_json(send, {"error": "Method not allowed."}, 405)
+            return
+
+        args = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                   for name, value in scope.get('headers', [])}
+        extra_headers = None
+        timer = instrumentation.start_request()
+        try:
+            result = await handler(args, headers)
+            payload, status = result[:2]
+            if len(result) > 2:
+                extra_headers = result[2]
+        except Exception:
+            logger.exception(f"Unhandled error on {scope['path']}")
+            payload, status = {"error": "Internal server error."}, 500
+        if hasattr(payload, '__aiter__'):
+            await send_stream(send, receive, payload, status, extra_headers, timer, f"analytics.{handler.__name__}")
+            return
+        await send_json(send, payload, status, extra_headers, timer, f"analytics.{handler.__name__}",
+                        headers.get('accept-encoding'))
+
+    return app
+
+
+app = create_asgi_app()
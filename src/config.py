@@ -6,4 +6,111 @@ load_dotenv()  # Load environment variables from .env if present
 TRANSACTION_SERVICE_URL = os.getenv('TRANSACTION_SERVICE_URL', 'http://localhost:3000/transaction-service/api')
 
 APP_PORT = int(os.getenv('PORT', 5000))
-APP_DEBUG = (os.getenv('DEBUG', 'False').lower() == 'true')
\ No newline at end of file
+APP_DEBUG = (os.getenv('DEBUG', 'False').lower() == 'true')
+
+# Build a NumPy TransactionFrame from the upstream payload (ignored if NumPy is missing)
+USE_NUMPY_ENGINE = (os.getenv('USE_NUMPY_ENGINE', 'True').lower() == 'true')
+
+# Parse the upstream response incrementally into monthly buckets (takes precedence over NumPy)
+STREAM_TRANSACTIONS = (os.getenv('STREAM_TRANSACTIONS', 'False').lower() == 'true')
+
+# Per-user transaction cache (TTL in seconds; 0 disables it)
+TRANSACTION_CACHE_TTL = float(os.getenv('TRANSACTION_CACHE_TTL', 10))
+TRANSACTION_CACHE_MAX_ENTRIES = int(os.getenv('TRANSACTION_CACHE_MAX_ENTRIES', 256))
+TRANSACTION_CACHE_MAX_BYTES = int(os.getenv('TRANSACTION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Transaction Service HTTP client
+TRANSACTION_SERVICE_POOL_SIZE = int(os.getenv('TRANSACTION_SERVICE_POOL_SIZE', 10))
+TRANSACTION_SERVICE_CONNECT_TIMEOUT = float(os.getenv('TRANSACTION_SERVICE_CONNECT_TIMEOUT', 3.05))
+TRANSACTION_SERVICE_READ_TIMEOUT = float(os.getenv('TRANSACTION_SERVICE_READ_TIMEOUT', 10))
+TRANSACTION_SERVICE_MAX_RETRIES = int(os.getenv('TRANSACTION_SERVICE_MAX_RETRIES', 2))
+TRANSACTION_SERVICE_BACKOFF = float(os.getenv('TRANSACTION_SERVICE_BACKOFF', 0.2))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.getenv('CIRCUIT_BREAKER_RESET_TIMEOUT', 30))
+ASYNC_TRANSACTION_SERVICE_POOL_SIZE = int(os.getenv('ASYNC_TRANSACTION_SERVICE_POOL_SIZE', 100))
+
+# Send the chart's date window / type upstream and walk paginated responses (page size 0 = no paging)
+PUSH_DOWN_FILTERS = (os.getenv('PUSH_DOWN_FILTERS', 'True').lower() == 'true')
+TRANSACTION_SERVICE_PAGE_SIZE = int(os.getenv('TRANSACTION_SERVICE_PAGE_SIZE', 0))
+TRANSACTION_SERVICE_PAGE_CONCURRENCY = int(os.getenv('TRANSACTION_SERVICE_PAGE_CONCURRENCY', 4))
+# Pages walked at most per fetch; a longer history fails rather than looping on an upstream that ignores `page`
+TRANSACTION_SERVICE_MAX_PAGES = int(os.getenv('TRANSACTION_SERVICE_MAX_PAGES', 1000))
+
+# Materialized monthly rollups of closed months: none | memory | sqlite
+ROLLUP_STORE = os.getenv('ROLLUP_STORE', 'none').lower()
+ROLLUP_SQLITE_PATH = os.getenv('ROLLUP_SQLITE_PATH', 'rollups.sqlite3')
+ROLLUP_MAX_USERS = int(os.getenv('ROLLUP_MAX_USERS', 10000))
+
+# Share one upstream fetch (both transaction types) between concurrent requests for the same window
+COALESCE_FETCHES = (os.getenv('COALESCE_FETCHES', 'True').lower() == 'true')
+
+# HTTP caching of chart responses (empty CHART_CACHE_CONTROL = no header)
+CHART_ETAGS = (os.getenv('CHART_ETAGS', 'True').lower() == 'true')
+CHART_CACHE_CONTROL = os.getenv('CHART_CACHE_CONTROL', 'private, no-cache')
+# Revalidate expired upstream payloads with If-None-Match when the Transaction Service sends ETags
+CONDITIONAL_UPSTREAM = (os.getenv('CONDITIONAL_UPSTREAM', 'True').lower() == 'true')
+UPSTREAM_REVALIDATION_TTL = float(os.getenv('UPSTREAM_REVALIDATION_TTL', 3600))
+
+# POST /analytics/batch: upstream fetch threads, aggregation processes (0 = aggregate in the fetch threads)
+BATCH_FETCH_WORKERS = int(os.getenv('BATCH_FETCH_WORKERS', 16))
+BATCH_PROCESSES = int(os.getenv('BATCH_PROCESSES', 0))
+BATCH_MAX_USERS = int(os.getenv('BATCH_MAX_USERS', 10000))
+
+# Per-stage request timers and histograms served at /metrics; Server-Timing response header
+METRICS_ENABLED = (os.getenv('METRICS_ENABLED', 'True').lower() == 'true')
+SERVER_TIMING = (os.getenv('SERVER_TIMING', 'False').lower() == 'true')
+
+# Production WSGI serving (gunicorn.conf.py); WSGI_WORKERS=0 => 2 x CPUs + 1
+WSGI_BIND = os.getenv('WSGI_BIND', f"0.0.0.0:{APP_PORT}")
+WSGI_WORKERS = int(os.getenv('WSGI_WORKERS', 0))
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 8))
+WSGI_PRELOAD = (os.getenv('WSGI_PRELOAD', 'True').lower() == 'true')
+WSGI_TIMEOUT = int(os.getenv('WSGI_TIMEOUT', 30))
+WSGI_GRACEFUL_TIMEOUT = int(os.getenv('WSGI_GRACEFUL_TIMEOUT', 30))
+WSGI_KEEPALIVE = int(os.getenv('WSGI_KEEPALIVE', 5))
+WSGI_MAX_REQUESTS = int(os.getenv('WSGI_MAX_REQUESTS', 10000))
+WSGI_MAX_REQUESTS_JITTER = int(os.getenv('WSGI_MAX_REQUESTS_JITTER', 1000))
+
+# JSON engine for responses and upstream payloads: auto (orjson if installed) | orjson | stdlib
+JSON_ENGINE = os.getenv('JSON_ENGINE', 'auto').lower()
+
+# Response compression: encodings offered in order of preference (empty = off), size threshold in bytes, levels
+RESPONSE_COMPRESSION = [e.strip() for e in os.getenv('RESPONSE_COMPRESSION', 'br,gzip').lower().split(',') if e.strip()]
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+# Ask the Transaction Service for gzip (and brotli, if installed) encoded payloads
+UPSTREAM_COMPRESSION = (os.getenv('UPSTREAM_COMPRESSION', 'True').lower() == 'true')
+
+# Local SQLite snapshot of users' transactions (empty path = off); seconds before a snapshot is re-synced;
+# snapshots kept before the least recently synced are dropped
+SNAPSHOT_STORE_PATH = os.getenv('SNAPSHOT_STORE_PATH', '')
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', 60))
+SNAPSHOT_MAX_OWNERS = int(os.getenv('SNAPSHOT_MAX_OWNERS', 1000))
+
+# Prime engines and upstream connections in each worker before /readyz reports ready
+WARM_UP = (os.getenv('WARM_UP', 'True').lower() == 'true')
+
+# Answer monthly-or-coarser charts from a cached per-user prefix-sum index over the whole history
+PREFIX_INDEX = (os.getenv('PREFIX_INDEX', 'False').lower() == 'true')
+
+# Server-Sent Events chart streams: keep-alive seconds, seconds between upstream polls of a user's open months
+# (0 = webhook updates only), open streams per process, events queued per slow client.
+# Each open stream holds a worker thread, so by default streams may take half of them (none with the
+# sync worker, which then refuses streams); the ASGI app holds no thread per stream and has its own cap.
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', 15))
+STREAM_POLL_INTERVAL = float(os.getenv('STREAM_POLL_INTERVAL', 30))
+STREAM_MAX_SUBSCRIPTIONS = int(os.getenv('STREAM_MAX_SUBSCRIPTIONS', WSGI_THREADS // 2))
+ASYNC_STREAM_MAX_SUBSCRIPTIONS = int(os.getenv('ASYNC_STREAM_MAX_SUBSCRIPTIONS', 10000))
+STREAM_MAX_PENDING = int(os.getenv('STREAM_MAX_PENDING', 64))
+# Shared secret the ingest webhook must send as X-Ingest-Secret (empty = webhook disabled)
+INGEST_SECRET = os.getenv('INGEST_SECRET', '')
+
+# JSON file with the category taxonomy: pie categories, aliases, case sensitivity (empty = built-in categories)
+TAXONOMY_PATH = os.getenv('TAXONOMY_PATH', '')
+
+# mode=approx charts: rows sampled at most, milliseconds the scan of the sample may take (0 = no limit);
+# relative accuracy of the quantile sketches of /distribution
+APPROX_SAMPLE_SIZE = int(os.getenv('APPROX_SAMPLE_SIZE', 10000))
+APPROX_TIME_BUDGET = float(os.getenv('APPROX_TIME_BUDGET', 250))
+SKETCH_RELATIVE_ACCURACY = float(os.getenv('SKETCH_RELATIVE_ACCURACY', 0.01))
\ No newline at end of file
@@ -1,17 +1,772 @@
-import requests
+import hmac
 import logging
-from flask import Blueprint, request, jsonify
-from ..config import TRANSACTION_SERVICE_URL
-from ..utils.date_utils import parse_month_year
+import threading
+import time
+from flask import Blueprint, Response, current_app, g, request, jsonify
+from ..config import (
+    TRANSACTION_SERVICE_URL,
+    USE_NUMPY_ENGINE,
+    STREAM_TRANSACTIONS,
+    PUSH_DOWN_FILTERS,
+    TRANSACTION_CACHE_TTL,
+    TRANSACTION_CACHE_MAX_ENTRIES,
+    TRANSACTION_CACHE_MAX_BYTES,
+    TRANSACTION_SERVICE_POOL_SIZE,
+    TRANSACTION_SERVICE_CONNECT_TIMEOUT,
+    TRANSACTION_SERVICE_READ_TIMEOUT,
+    TRANSACTION_SERVICE_MAX_RETRIES,
+    TRANSACTION_SERVICE_BACKOFF,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_RESET_TIMEOUT,
+    TRANSACTION_SERVICE_PAGE_SIZE,
+    TRANSACTION_SERVICE_PAGE_CONCURRENCY,
+    TRANSACTION_SERVICE_MAX_PAGES,
+    ROLLUP_STORE,
+    ROLLUP_SQLITE_PATH,
+    ROLLUP_MAX_USERS,
+    COALESCE_FETCHES,
+    CHART_ETAGS,
+    CHART_CACHE_CONTROL,
+    CONDITIONAL_UPSTREAM,
+    UPSTREAM_REVALIDATION_TTL,
+    BATCH_FETCH_WORKERS,
+    BATCH_PROCESSES,
+    BATCH_MAX_USERS,
+    METRICS_ENABLED,
+    SERVER_TIMING,
+    JSON_ENGINE,
+    RESPONSE_COMPRESSION,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL,
+    BROTLI_QUALITY,
+    UPSTREAM_COMPRESSION,
+    SNAPSHOT_STORE_PATH,
+    SNAPSHOT_MAX_AGE,
+    SNAPSHOT_MAX_OWNERS,
+    WARM_UP,
+    PREFIX_INDEX,
+    STREAM_HEARTBEAT,
+    STREAM_POLL_INTERVAL,
+    STREAM_MAX_SUBSCRIPTIONS,
+    STREAM_MAX_PENDING,
+    INGEST_SECRET,
+    TAXONOMY_PATH,
+    APPROX_SAMPLE_SIZE,
+    APPROX_TIME_BUDGET,
+    SKETCH_RELATIVE_ACCURACY
+)
+from ..services.transaction_client import (
+    CircuitBreaker,
+    TransactionClient,
+    TransactionServiceError,
+    is_valid_window
+)
+from ..utils.calendar_index import DAY_GRANULARITIES, GRANULARITIES
+from ..utils.date_utils import month_key_range, parse_month_year
+from ..utils.frame import to_frame
+from ..utils.cache import TransactionCache
+from ..utils.rollups import current_month_key, make_rollup_store, rollup_buckets, rollup_owner
+from ..utils.snapshots import SnapshotStore, sync_snapshot
+from ..utils.prefix_index import PrefixIndex
+from ..utils.chart_stream import ChartStreams, StreamLimitExceeded
+from ..utils.taxonomy import get_taxonomy, load_taxonomy, set_taxonomy
+from ..utils.approx import MODES, approx_bar_data, approx_line_data, approx_pie_data, distribution_data, \
+    is_truncated
+from ..utils.singleflight import SingleFlight
+from ..utils.http_cache import chart_etag, data_version, etag_matches
+from ..utils.fanout import fan_out, process_pool
+from ..utils.json_codec import make_codec
+from ..utils.compression import (
+    compress,
+    is_compressible,
+    iter_compress,
+    negotiate_encoding,
+    supported_encodings,
+    upstream_accept_encoding,
+    weak_etag
+)
+from ..utils.metrics import PROMETHEUS_CONTENT_TYPE, instrumentation, server_timing, stats_collector
 from ..utils.aggregator import (
     compute_line_data,
     compute_pie_data_range,
-    compute_bar_data
+    compute_bar_data,
+    compute_dashboard_data,
+    compute_charts,
+    bucket_days,
+    bucket_transactions,
+    DailyBuckets,
+    MonthlyBuckets
 )
 
 analytics_blueprint = Blueprint('analytics', __name__)
 logger = logging.getLogger(__name__)
 
+# Category taxonomy of every aggregation in this process (and its batch workers).
+taxonomy = load_taxonomy(TAXONOMY_PATH) if TAXONOMY_PATH else get_taxonomy()
+set_taxonomy(taxonomy)
+
+EXPENSE_CATEGORIES = list(taxonomy.expense)
+INCOME_CATEGORIES = list(taxonomy.income)
+
+# Encodes responses (see create_app) and decodes upstream payloads.
+json_codec = make_codec(JSON_ENGINE)
+
+# Content-Encodings offered to clients, most preferred first.
+compression_encodings = supported_encodings(RESPONSE_COMPRESSION)
+upstream_encoding = upstream_accept_encoding() if UPSTREAM_COMPRESSION else 'identity'
+
+transaction_client = TransactionClient(
+    TRANSACTION_SERVICE_URL,
+    pool_size=TRANSACTION_SERVICE_POOL_SIZE,
+    connect_timeout=TRANSACTION_SERVICE_CONNECT_TIMEOUT,
+    read_timeout=TRANSACTION_SERVICE_READ_TIMEOUT,
+    max_retries=TRANSACTION_SERVICE_MAX_RETRIES,
+    backoff_factor=TRANSACTION_SERVICE_BACKOFF,
+    breaker=CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT),
+    page_size=TRANSACTION_SERVICE_PAGE_SIZE,
+    page_concurrency=TRANSACTION_SERVICE_PAGE_CONCURRENCY,
+    max_pages=TRANSACTION_SERVICE_MAX_PAGES,
+    json_codec=json_codec,
+    accept_encoding=upstream_encoding
+)
+
+transaction_cache = TransactionCache(
+    ttl=TRANSACTION_CACHE_TTL,
+    max_entries=TRANSACTION_CACHE_MAX_ENTRIES,
+    max_bytes=TRANSACTION_CACHE_MAX_BYTES
+)
+
+# Payloads that came with an upstream ETag, kept past TRANSACTION_CACHE_TTL so
+# they can be revalidated with If-None-Match instead of downloaded again.
+revalidation_cache = TransactionCache(
+    ttl=UPSTREAM_REVALIDATION_TTL if CONDITIONAL_UPSTREAM else 0,
+    max_entries=TRANSACTION_CACHE_MAX_ENTRIES,
+    max_bytes=TRANSACTION_CACHE_MAX_BYTES
+)
+
+# Concurrent cache misses for the same key share one upstream fetch.
+transaction_flights = SingleFlight()
+
+# Shared with the async routes; None when ROLLUP_STORE=none.
+rollup_store = make_rollup_store(ROLLUP_STORE, ROLLUP_SQLITE_PATH, ROLLUP_MAX_USERS)
+
+# Shared with the async routes; None unless SNAPSHOT_STORE_PATH is set.
+snapshot_store = SnapshotStore(SNAPSHOT_STORE_PATH, SNAPSHOT_MAX_OWNERS) if SNAPSHOT_STORE_PATH else None
+
+# Open /analytics/stream subscriptions of this process, fed by /analytics/ingest and polling.
+chart_streams = ChartStreams(STREAM_MAX_SUBSCRIPTIONS, STREAM_MAX_PENDING)
+
+# Cleared while start_warm_up() runs; /readyz answers 503 until it is set again.
+warmed_up = threading.Event()
+warmed_up.set()
+
+# Extra callables run as hook(user_id, month_keys) by invalidate_rollups(),
+# e.g. to drop other caches holding the user's data.
+invalidation_hooks = []
+
+instrumentation.enabled = METRICS_ENABLED
+instrumentation.add_collector(stats_collector(
+    'analytics_cache', 'cache',
+    {'transactions': transaction_cache, 'revalidation': revalidation_cache},
+    counters=('hits', 'misses', 'evictions', 'expirations')
+))
+instrumentation.add_collector(stats_collector(
+    'analytics_fetch_flights', 'client', {'sync': transaction_flights}, counters=('executions', 'coalesced')
+))
+instrumentation.add_collector(stats_collector(
+    'analytics_streams', 'transport', {'sse': chart_streams}, counters=('published', 'polls')
+))
+
+
+def fetch_transactions(user_id, token, window=None, txn_type=None, daily=False, rows=False):
+    """
+    Returns the user's transactions: MonthlyBuckets (DailyBuckets if `daily`)
+    when streaming ingestion is on, otherwise a list (or a TransactionFrame
+    when the NumPy engine is on). Raises TransactionServiceError if they could not be fetched; the
+    blueprint's error handler turns that into a 502/503.
+    
+    :param window: (start_m, start_y, end_m, end_y) pushed down to the upstream
+    :param txn_type: 'spent' or 'receive' when the chart needs only one type
+    :param daily: True for day and week charts, which need per-day data
+    :param rows: True for a plain list of the transactions whatever the
+        engine (distribution charts, and mode=approx charts without a
+        monthly source, sample or sketch rows; see approx_rows)
+    
+    Results are cached per (userId, auth identity, window, type). A request
+    for one type also accepts a cached entry for the same window with both
+    types, so the charts of one dashboard share a single upstream call.
+    With COALESCE_FETCHES on, both types are always fetched and concurrent
+    misses for the same (userId, auth identity, window) share one fetch.
+
+    With PREFIX_INDEX on, monthly (or coarser) charts of any window are
+    answered from the user's PrefixIndex by fetch_prefix_index(). Otherwise,
+    with a snapshot store configured, valid windows of such charts are
+    answered as MonthlyBuckets by fetch_snapshot(); otherwise, with a rollup
+    store configured, by fetch_rollups().
+
+    Timed as the "fetch" stage (upstream decoding is also timed as "decode").
+    """
+    with instrumentation.stage('fetch'):
+        transactions = _fetch_transactions(user_id, token, window, txn_type, daily, rows)
+    observe_workload(transactions, window)
+    return transactions
+
+
+def has_monthly_source(window):
+    """
+    True if monthly (or coarser) charts of `window` are answered from
+    pre-aggregated data - the prefix index, a snapshot or rollups - rather
+    than from fetched transactions (see _fetch_transactions).
+    """
+    if PREFIX_INDEX:
+        return True
+    valid = window is not None and is_valid_window(window)
+    return valid and (snapshot_store is not None or rollup_store is not None)
+
+
+def approx_rows(mode, window, daily=False):
+    """
+    The `rows` argument of fetch_transactions for a chart of `mode`: an
+    approximate chart samples plain rows, unless a monthly source answers
+    its window; that is exact and cheaper than any sample, so heavy users
+    get the same fast path as in exact mode.
+    """
+    return mode == 'approx' and (daily or not has_monthly_source(window))
+
+
+def _fetch_transactions(user_id, token, window, txn_type, daily, rows=False):
+    monthly = not (daily or rows)
+    if monthly and PREFIX_INDEX:
+        return fetch_prefix_index(user_id, token)
+    if monthly and snapshot_store is not None and window is not None and is_valid_window(window):
+        return fetch_snapshot(user_id, token, window)
+    if monthly and rollup_store is not None and window is not None and is_valid_window(window):
+        return fetch_rollups(user_id, token, window)
+
+    if not PUSH_DOWN_FILTERS:
+        window, txn_type = None, None
+    elif COALESCE_FETCHES:
+        # Line, pie and bar charts of one window differ only in type.
+        txn_type = None
+
+    # Streamed records are bucketed as they arrive, so day/week charts need
+    # their own (per-day) cache entries; lists and frames serve any chart.
+    # Rows are cached apart from buckets and frames.
+    if rows:
+        detail = ('rows',) if STREAM_TRANSACTIONS or USE_NUMPY_ENGINE else ()
+    else:
+        detail = ('day',) if daily and STREAM_TRANSACTIONS else ()
+    cache_key = transaction_cache.make_key(user_id, token, (window, txn_type) + detail)
+    transactions = transaction_cache.get(cache_key)
+    if transactions is None and txn_type is not None:
+        transactions = transaction_cache.get(transaction_cache.make_key(user_id, token, (window, None) + detail))
+    if transactions is not None:
+        return transactions
+
+    def load():
+        if STREAM_TRANSACTIONS and not rows:
+            # Records go straight into month (or day)/category buckets as they are parsed.
+            bucket = bucket_days if daily else bucket_transactions
+            return bucket(transaction_client.iter_transactions(user_id, token, window, txn_type))
+        previous = revalidation_cache.get(cache_key)
+        transactions = transaction_client.get_transactions(
+            user_id, token, window, txn_type, etag=getattr(previous, 'etag', None)
+        )
+        if transactions is None:
+            # 304: the frame/list built last time is still current
+            return previous
+        if USE_NUMPY_ENGINE and not rows:
+            transactions = to_frame(transactions)
+        if transactions.etag:
+            revalidation_cache.set(cache_key, transactions)
+        return transactions
+
+    return _load_once(cache_key, load)
+
+
+def observe_workload(transactions, window):
+    """
+    Records the transaction count (unknown for Monthly/DailyBuckets and
+    prefix indexes) and the month count of a chart request in the workload
+    histograms.
+    """
+    if not instrumentation.enabled:
+        return
+    count = None if isinstance(transactions, (MonthlyBuckets, DailyBuckets, PrefixIndex)) else len(transactions)
+    months = len(month_key_range(*window)) if window is not None and is_valid_window(window) else None
+    instrumentation.observe_workload(count, months)
+
+
+def fetch_rollups(user_id, token, window):
+    """
+    MonthlyBuckets (both types) for `window`: closed months come from the
+    rollup store, and only missing or still-open months are fetched.
+    """
+    cache_key = transaction_cache.make_key(user_id, token, (window, None))
+    buckets = transaction_cache.get(cache_key)
+    if buckets is not None:
+        return buckets
+
+    def fetch(sub_window):
+        pushed = sub_window if PUSH_DOWN_FILTERS else None
+        if STREAM_TRANSACTIONS:
+            return transaction_client.iter_transactions(user_id, token, pushed)
+        return transaction_client.get_transactions(user_id, token, pushed)
+
+    return _load_once(
+        cache_key, lambda: rollup_buckets(rollup_store, rollup_owner(user_id, token), window, fetch)
+    )
+
+
+def fetch_prefix_index(user_id, token):
+    """
+    The user's PrefixIndex over their whole history (both types), built from
+    one upstream fetch and cached like any transaction set, so dragging a
+    date-range slider costs no upstream call and O(categories) per pie.
+    """
+    cache_key = transaction_cache.make_key(user_id, token, ('prefix',))
+    index = transaction_cache.get(cache_key)
+    if index is not None:
+        return index
+
+    def load():
+        if STREAM_TRANSACTIONS:
+            buckets = bucket_transactions(transaction_client.iter_transactions(user_id, token))
+        else:
+            buckets = bucket_transactions(transaction_client.get_transactions(user_id, token))
+        index = PrefixIndex.from_buckets(buckets)
+        index.version = data_version(buckets)
+        return index
+
+    return _load_once(cache_key, load)
+
+
+def fetch_snapshot(user_id, token, window):
+    """
+    MonthlyBuckets (both types) for `window`, summed from the user's local
+    snapshot. The snapshot is synced first when it is older than
+    SNAPSHOT_MAX_AGE seconds; only months since the last sync are fetched.
+    """
+    owner = rollup_owner(user_id, token)
+
+    def fetch(sync_window):
+        pushed = sync_window if PUSH_DOWN_FILTERS else None
+        if STREAM_TRANSACTIONS:
+            return transaction_client.iter_transactions(user_id, token, pushed)
+        return transaction_client.get_transactions(user_id, token, pushed)
+
+    def sync():
+        # plans inside the flight, so a caller arriving just after a sync
+        # sees the snapshot as fresh instead of replaying it
+        return sync_snapshot(snapshot_store, owner, fetch, SNAPSHOT_MAX_AGE, current_month_key())
+
+    if COALESCE_FETCHES:
+        transaction_flights.do(('snapshot',) + owner, sync)
+    else:
+        sync()
+    return snapshot_store.buckets(owner, window)
+
+
+def _load_once(cache_key, load):
+    """
+    Runs load() for a cache miss and caches its result. With COALESCE_FETCHES
+    on, concurrent misses for the same key wait for a single load() instead.
+    """
+    def load_and_cache():
+        value = transaction_cache.get(cache_key)  # filled while we were queued?
+        if value is None:
+            value = load()
+            transaction_cache.set(cache_key, value)
+        return value
+
+    if COALESCE_FETCHES:
+        return transaction_flights.do(cache_key, load_and_cache)
+    return load_and_cache()
+
+
+def invalidate_rollups(user_id, month_keys=None):
+    """
+    Invalidation hook for changed history: drops the user's rollups (only
+    `month_keys` if given), snapshot and cached transactions, so the next
+    chart request re-aggregates from the Transaction Service.
+    """
+    if rollup_store is not None:
+        rollup_store.invalidate(user_id, month_keys)
+    if snapshot_store is not None:
+        # a snapshot only re-fetches recent months, so back-dated changes need a full sync
+        snapshot_store.invalidate(user_id)
+    transaction_cache.invalidate_user(user_id)
+    revalidation_cache.invalidate_user(user_id)
+    for hook in invalidation_hooks:
+        hook(user_id, month_keys)
+
+
+def chart_response(transactions, chart, build):
+    """
+    Returns jsonify(build()) with ETag and Cache-Control headers, or an empty
+    304 Not Modified - without building the chart - when the request's
+    If-None-Match still matches. An approximate chart whose scan was cut by
+    its deadline gets no ETag: the same data and query could give another
+    sample, so it must not validate (or be validated by) another response.
+
+    :param transactions: what fetch_transactions() returned
+    :param chart: route of the chart, e.g. '/line'
+    """
+    etag = None
+    version = data_version(transactions) if CHART_ETAGS else None
+    if version is not None:
+        etag = chart_etag(version, chart, request.args.items(multi=True))
+
+    if etag is not None and etag_matches(request.headers.get('If-None-Match'), etag):
+        response = current_app.response_class(status=304)
+    else:
+        with instrumentation.stage('aggregate'):
+            data = build()
+        with instrumentation.stage('serialize'):
+            response = jsonify(data)
+        if is_truncated(data):
+            etag = None
+    if etag is not None:
+        response.headers['ETag'] = etag
+    if CHART_CACHE_CONTROL:
+        response.headers['Cache-Control'] = CHART_CACHE_CONTROL
+    return response
+
+
+def approx_options(transactions):
+    """
+    Keyword arguments of the approx_* chart functions: APPROX_SAMPLE_SIZE,
+    a seed tied to the data version (so an ETag always names the same
+    sample) and a deadline APPROX_TIME_BUDGET milliseconds from now. They
+    bound the aggregation only; `transactions` were fetched in full.
+    """
+    return {
+        "sample_size": APPROX_SAMPLE_SIZE,
+        "seed": data_version(transactions),
+        "deadline": time.monotonic() + APPROX_TIME_BUDGET / 1000 if APPROX_TIME_BUDGET > 0 else None
+    }
+
+
+class InvalidChartRequest(ValueError):
+    """Raised by the *_request parsers for a bad query string (a 400)."""
+
+
+class ChartRequest:
+    """
+    A parsed chart query, shared by the Flask views and the async handlers:
+    what to fetch (user, window, type, per-day data, plain rows) and how to
+    build the chart from what was fetched.
+
+    :param path: route of the chart, e.g. '/line' (for its ETag)
+    :param build: build(transactions) => the chart payload
+    """
+
+    def __init__(self, path, user_id, window, build, txn_type=None, daily=False, rows=False):
+        self.path = path
+        self.user_id = user_id
+        self.window = window
+        self.build = build
+        self.txn_type = txn_type
+        self.daily = daily
+        self.rows = rows
+
+
+def _range_args(args, missing_message, *required):
+    """
+    userId, startMonth, endMonth and the `required` params of a query
+    (anything with .get/.getlist, e.g. request.args); raises
+    InvalidChartRequest(missing_message) if one is missing.
+    """
+    values = [args.get(name) for name in ('userId', 'startMonth', 'endMonth') + required]
+    if not all(values):
+        raise InvalidChartRequest(missing_message)
+    return values
+
+
+def _window(start_month_str, end_month_str):
+    start_m, start_y = parse_month_year(start_month_str)
+    end_m, end_y = parse_month_year(end_month_str)
+    return (start_m, start_y, end_m, end_y)
+
+
+def _granularity_arg(args, allowed=GRANULARITIES):
+    granularity = args.get('granularity', 'month')
+    if granularity not in allowed:
+        raise InvalidChartRequest(f"Invalid granularity, expected one of {', '.join(allowed)}.")
+    return granularity
+
+
+def _mode_arg(args):
+    mode = args.get('mode', 'exact')
+    if mode not in MODES:
+        raise InvalidChartRequest(f"Invalid mode, expected one of {', '.join(MODES)}.")
+    return mode
+
+
+def line_request(args):
+    """
+    Parses a /line query (see get_line_chart).
+    """
+    user_id, start, end = _range_args(args, "Missing required parameters (userId, startMonth, endMonth).")
+    granularity = _granularity_arg(args)
+    mode = _mode_arg(args)
+    window = _window(start, end)
+
+    def build(transactions):
+        if mode == 'approx':
+            return approx_line_data(transactions, *window, granularity, **approx_options(transactions))
+        return compute_line_data(transactions, *window, granularity)
+
+    daily = granularity in DAY_GRANULARITIES
+    return ChartRequest('/line', user_id, window, build, daily=daily, rows=approx_rows(mode, window, daily))
+
+
+def pie_request(args, expense=True):
+    """
+    Parses a /pie/expense (or, with expense=False, /pie/income) query.
+    """
+    user_id, start, end = _range_args(args, "Missing required params (userId, startMonth, endMonth).")
+    mode = _mode_arg(args)
+    window = _window(start, end)
+    categories = EXPENSE_CATEGORIES if expense else INCOME_CATEGORIES
+
+    def build(transactions):
+        if mode == 'approx':
+            return approx_pie_data(transactions, *window, categories, expense=expense,
+                                   **approx_options(transactions))
+        return compute_pie_data_range(transactions, *window, categories, expense=expense)
+
+    return ChartRequest('/pie/expense' if expense else '/pie/income', user_id, window, build,
+                        'spent' if expense else 'receive', rows=approx_rows(mode, window))
+
+
+def income_pie_request(args):
+    return pie_request(args, expense=False)
+
+
+def bar_request(args):
+    """
+    Parses a /bar query (see get_bar_chart).
+    """
+    user_id, start, end, chart_type, category = _range_args(args, "Missing required parameters.", 'type', 'category')
+    granularity = _granularity_arg(args)
+    mode = _mode_arg(args)
+    window = _window(start, end)
+
+    def build(transactions):
+        if mode == 'approx':
+            return approx_bar_data(transactions, *window, chart_type, category, granularity,
+                                   **approx_options(transactions))
+        return compute_bar_data(transactions, *window, chart_type, category, granularity)
+
+    daily = granularity in DAY_GRANULARITIES
+    return ChartRequest('/bar', user_id, window, build,
+                        'spent' if chart_type.lower() == 'expense' else 'receive',
+                        daily=daily, rows=approx_rows(mode, window, daily))
+
+
+def distribution_request(args):
+    """
+    Parses a /distribution query (see get_distribution_chart).
+    """
+    user_id, start, end = _range_args(args, "Missing required parameters (userId, startMonth, endMonth).")
+    chart_type = args.get('type', 'Expense')
+    if chart_type.lower() not in ('expense', 'income'):
+        raise InvalidChartRequest("Invalid type, expected Expense or Income.")
+    granularity = _granularity_arg(args, ('month', 'quarter', 'year'))
+    mode = _mode_arg(args)
+    window = _window(start, end)
+    txn_type = 'spent' if chart_type.lower() == 'expense' else 'receive'
+
+    def build(transactions):
+        return distribution_data(
+            transactions, *window, txn_type, granularity, SKETCH_RELATIVE_ACCURACY,
+            **(approx_options(transactions) if mode == 'approx' else {})
+        )
+
+    return ChartRequest('/distribution', user_id, window, build, txn_type, rows=True)
+
+
+def dashboard_request(args):
+    """
+    Parses a /dashboard query (see get_dashboard).
+    """
+    user_id, start, end = _range_args(args, "Missing required parameters (userId, startMonth, endMonth).")
+    bar_specs = []
+    for spec in args.getlist('bar'):
+        chart_type, _, category = spec.partition(':')
+        if chart_type.lower() not in ("income", "expense") or not category:
+            raise InvalidChartRequest(f"Invalid bar spec '{spec}', expected <Income|Expense>:<category>.")
+        bar_specs.append((chart_type, category))
+    window = _window(start, end)
+
+    def build(transactions):
+        return compute_dashboard_data(transactions, *window, EXPENSE_CATEGORIES, INCOME_CATEGORIES, bar_specs)
+
+    return ChartRequest('/dashboard', user_id, window, build)
+
+
+def serve_chart(parse):
+    """
+    Answers the current request with the chart parse(request.args) describes.
+    """
+    try:
+        chart = parse(request.args)
+    except InvalidChartRequest as error:
+        return jsonify({"error": str(error)}), 400
+    transactions = fetch_transactions(
+        chart.user_id, request.headers.get('Authorization'), chart.window, chart.txn_type,
+        daily=chart.daily, rows=chart.rows
+    )
+    return chart_response(transactions, chart.path, lambda: chart.build(transactions))
+
+
+@analytics_blueprint.before_request
+def start_request_timer():
+    g.request_timer = instrumentation.start_request()
+
+
+@analytics_blueprint.after_request
+def finish_request_timer(response):
+    """
+    Records the request in the metrics and, with SERVER_TIMING on, reports
+    its stage timings in a Server-Timing header. Streamed (batch) responses
+    are recorded when their headers are sent.
+    """
+    timings = instrumentation.finish_request(g.pop('request_timer', None), request.endpoint, response.status_code)
+    if SERVER_TIMING and timings:
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
+
+
+@analytics_blueprint.after_request
+def compress_response(response):
+    """
+    Compresses JSON / NDJSON responses with the client's preferred encoding
+    among RESPONSE_COMPRESSION. Bodies under COMPRESSION_MIN_SIZE bytes are
+    sent as is; streamed responses (batch) are compressed chunk by chunk.
+    """
+    if not compression_encodings or not is_compressible(response.mimetype) \
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings, compression_encodings)
+    if encoding is None:
+        return response
+
+    level = BROTLI_QUALITY if encoding == 'br' else GZIP_LEVEL
+    if response.is_streamed:
+        response.response = iter_compress(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        with instrumentation.stage('compress'):
+            response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weak_etag(response.headers['ETag'])
+    return response
+
+
+def metrics():
+    """
+    GET /metrics
+    Request counters, per-stage latency and workload histograms, and cache /
+    fetch-coalescing counters in the Prometheus text format.
+    """
+    if not instrumentation.enabled:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(instrumentation.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def liveness():
+    """
+    GET /healthz
+    200 as long as the process can serve requests.
+    """
+    return jsonify({"status": "ok"})
+
+
+def readiness():
+    """
+    GET /readyz
+    200 when chart requests can be served, 503 while the worker is warming up
+    or the circuit breaker to the Transaction Service is open (chart endpoints
+    would answer 503 anyway).
+    """
+    circuit = transaction_client.breaker.state
+    if not warmed_up.is_set():
+        return jsonify({"status": "warming up", "transactionService": circuit}), 503
+    ready = circuit != CircuitBreaker.OPEN
+    return jsonify({"status": "ok" if ready else "unavailable", "transactionService": circuit}), \
+        200 if ready else 503
+
+
+def prime_engines():
+    """
+    Runs a sample through the engines this process is configured with, so
+    their lazy imports and first-call set-up (NumPy, the JSON codec,
+    compressors) happen before the first real request.
+    """
+    sample = [
+        {"date": "2024-01-05", "type": "spent", "amount": 1.5, "category": "Groceries"},
+        {"date": "2024-01-06", "type": "receive", "amount": 2.0, "category": "Salary"}
+    ]
+    transactions = to_frame(sample) if USE_NUMPY_ENGINE else sample
+    body = json_codec.dumps(compute_dashboard_data(
+        transactions, 1, 2024, 1, 2024, EXPENSE_CATEGORIES, INCOME_CATEGORIES, [("Expense", "Groceries")]
+    ))
+    json_codec.loads(body)
+    for encoding in compression_encodings:
+        compress(body, encoding, BROTLI_QUALITY if encoding == 'br' else GZIP_LEVEL)
+
+
+def warm_up():
+    """
+    Primes the engines and opens an upstream connection, then marks the
+    process ready. Never raises: a failed warm-up only costs the first
+    requests the time it would have saved.
+    """
+    try:
+        prime_engines()
+        transaction_client.warm_up()
+    except Exception:
+        logger.exception("Warm-up failed")
+    finally:
+        warmed_up.set()
+
+
+def start_warm_up():
+    """
+    Runs warm_up() in a background thread; /readyz answers 503 until it is
+    done.
+    """
+    warmed_up.clear()
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def after_fork():
+    """
+    Run in each worker forked from a preloaded server process: connections
+    must not be shared with the parent, so pooled upstream connections are
+    dropped and the rollup and snapshot stores reconnect. With WARM_UP on,
+    the worker then warms up before reporting ready.
+    """
+    transaction_client.session.close()
+    if rollup_store is not None:
+        rollup_store.reopen()
+    if snapshot_store is not None:
+        snapshot_store.reopen()
+    if WARM_UP:
+        start_warm_up()
+
+
+@analytics_blueprint.errorhandler(TransactionServiceError)
+def handle_transaction_service_error(error):
+    return jsonify({"error": str(error)}), error.status_code
+
 
 @analytics_blueprint.route('/line', methods=['GET'])
 def get_line_chart():
@@ -23,39 +778,14 @@ def get_line_chart():
     - userId (int)
     - startMonth (str) in MM-YYYY
     - endMonth (str) in MM-YYYY
+    - granularity (str, optional) => "day", "week", "month" (default), "quarter" or "year"
+    - mode (str, optional) => "exact" (default) or "approx": estimated from a
+      sample, with "incomeError"/"expenseError" (95% half-widths) and "approx"
     
     Forward the Authorization header to the Transaction microservice
     if present.
     """
-    user_id = request.args.get('userId')
-    start_month_str = request.args.get('startMonth')
-    end_month_str = request.args.get('endMonth')
-
-    if not (user_id and start_month_str and end_month_str):
-        return jsonify({"error": "Missing required parameters (userId, startMonth, endMonth)."}), 400
-
-    # Grab the Authorization token from incoming request (if any)
-    token = request.headers.get('Authorization')
-    headers = {}
-    if token:
-        headers["Authorization"] = token
-
-    # Fetch transactions
-    resp = requests.get(
-        f"{TRANSACTION_SERVICE_URL}/transactions",
-        params={"userId": user_id},
-        headers=headers
-    )
-    if resp.status_code != 200:
-        logger.error(f"Transaction Service responded with status {resp.status_code}")
-        return jsonify({"error": "Unable to fetch transactions from Transaction Service"}), 502
-
-    transactions = resp.json()
-    start_m, start_y = parse_month_year(start_month_str)
-    end_m, end_y = parse_month_year(end_month_str)
-
-    data = compute_line_data(transactions, start_m, start_y, end_m, end_y)
-    return jsonify(data), 200
+    return serve_chart(line_request)
 
 
 @analytics_blueprint.route('/pie/expense', methods=['GET'])
@@ -64,49 +794,19 @@ def get_expense_pie_range():
     GET /analytics/pie/expense?userId=1&startMonth=01-2024&endMonth=03-2024
     Returns the total expense breakdown by category from startMonth to endMonth.
     
-    categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+    categories = the taxonomy's expense categories (TAXONOMY_PATH), by default
+    ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
     
     Query Params:
     - userId (int)
     - startMonth (str) in MM-YYYY
     - endMonth (str) in MM-YYYY
+    - mode (str, optional) => "exact" (default) or "approx": estimated from a
+      sample, with "error" (95% half-widths) and "approx"
     
     Forward the Authorization header to the Transaction microservice if present.
     """
-    user_id = request.args.get('userId')
-    start_month_str = request.args.get('startMonth')
-    end_month_str = request.args.get('endMonth')
-
-    if not (user_id and start_month_str and end_month_str):
-        return jsonify({"error": "Missing required params (userId, startMonth, endMonth)."}), 400
-
-    # Grab the Authorization token
-    token = request.headers.get('Authorization')
-    headers = {}
-    if token:
-        headers["Authorization"] = token
-
-    # Fetch all transactions for the user
-    resp = requests.get(
-        f"{TRANSACTION_SERVICE_URL}/transactions",
-        params={"userId": user_id},
-        headers=headers
-    )
-    if resp.status_code != 200:
-        logger.error(f"Transaction Service responded with status {resp.status_code}")
-        return jsonify({"error": "Unable to fetch transactions from Transaction Service"}), 502
-
-    transactions = resp.json()
-    start_m, start_y = parse_month_year(start_month_str)
-    end_m, end_y = parse_month_year(end_month_str)
-
-    categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
-    
-    result = compute_pie_data_range(
-        transactions, start_m, start_y, end_m, end_y,
-        categories, expense=True
-    )
-    return jsonify(result), 200
+    return serve_chart(pie_request)
 
 
 @analytics_blueprint.route('/pie/income', methods=['GET'])
@@ -115,49 +815,19 @@ def get_income_pie_range():
     GET /analytics/pie/income?userId=1&startMonth=01-2024&endMonth=03-2024
     Returns the total income breakdown by category from startMonth to endMonth.
     
-    categories = ["Salary", "Investment", "Gift", "Refund", "Other"]
+    categories = the taxonomy's income categories (TAXONOMY_PATH), by default
+    ["Salary", "Investments", "Gifts", "Refunds", "Other"]
     
     Query Params:
     - userId (int)
     - startMonth (str) in MM-YYYY
     - endMonth (str) in MM-YYYY
+    - mode (str, optional) => "exact" (default) or "approx": estimated from a
+      sample, with "error" (95% half-widths) and "approx"
     
     Forward the Authorization header to the Transaction microservice if present.
     """
-    user_id = request.args.get('userId')
-    start_month_str = request.args.get('startMonth')
-    end_month_str = request.args.get('endMonth')
-
-    if not (user_id and start_month_str and end_month_str):
-        return jsonify({"error": "Missing required params (userId, startMonth, endMonth)."}), 400
-
-    # Grab the Authorization token
-    token = request.headers.get('Authorization')
-    headers = {}
-    if token:
-        headers["Authorization"] = token
-
-    # Fetch all transactions for the user
-    resp = requests.get(
-        f"{TRANSACTION_SERVICE_URL}/transactions",
-        params={"userId": user_id},
-        headers=headers
-    )
-    if resp.status_code != 200:
-        logger.error(f"Transaction Service responded with status {resp.status_code}")
-        return jsonify({"error": "Unable to fetch transactions from Transaction Service"}), 502
-
-    transactions = resp.json()
-    start_m, start_y = parse_month_year(start_month_str)
-    end_m, end_y = parse_month_year(end_month_str)
-
-    categories = ["Salary", "Investments", "Gifts", "Refunds", "Other"]
-    
-    result = compute_pie_data_range(
-        transactions, start_m, start_y, end_m, end_y,
-        categories, expense=False
-    )
-    return jsonify(result), 200
+    return serve_chart(income_pie_request)
 
 
 @analytics_blueprint.route('/bar', methods=['GET'])
@@ -167,8 +837,9 @@ def get_bar_chart():
     Returns monthly totals for a single category in the selected range.
     
     type = "Income" or "Expense"
-    category (Expense) could be ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
-    category (Income) could be ["Salary", "Investment", "Gift", "Refund", "Other"]
+    category = any category or alias the taxonomy (TAXONOMY_PATH) resolves, by default
+    (Expense) ["Rent", "Groceries", "Utilities", "Entertainment", "Other"] or
+    (Income) ["Salary", "Investments", "Gifts", "Refunds", "Other"]
     
     Query Params:
     - userId (int)
@@ -176,37 +847,299 @@ def get_bar_chart():
     - endMonth (str) in MM-YYYY
     - type (str) => "Income" or "Expense"
     - category (str)
+    - granularity (str, optional) => "day", "week", "month" (default), "quarter" or "year"
+    - mode (str, optional) => "exact" (default) or "approx": estimated from a
+      sample, with "error" (95% half-widths) and "approx"
     
     Forward the Authorization header to the Transaction microservice if present.
     """
-    user_id = request.args.get('userId')
-    start_month_str = request.args.get('startMonth')
-    end_month_str = request.args.get('endMonth')
-    chart_type = request.args.get('type')       # "Income" or "Expense"
-    category = request.args.get('category')
+    return serve_chart(bar_request)
+
 
-    if not all([user_id, start_month_str, end_month_str, chart_type, category]):
-        return jsonify({"error": "Missing required parameters."}), 400
+@analytics_blueprint.route('/distribution', methods=['GET'])
+def get_distribution_chart():
+    """
+    GET /analytics/distribution?userId=1&startMonth=01-2023&endMonth=12-2023&type=Expense
+    Returns the median and 90th percentile transaction amount (and the
+    number of transactions) per month, from quantile sketches accurate to
+    SKETCH_RELATIVE_ACCURACY.
 
-    # Grab the Authorization token
+    Query Params:
+    - userId (int)
+    - startMonth (str) in MM-YYYY
+    - endMonth (str) in MM-YYYY
+    - type (str, optional) => "Expense" (default) or "Income"
+    - granularity (str, optional) => "month" (default), "quarter" or "year"
+    - mode (str, optional) => "exact" (default) or "approx": sketched from a
+      sample, with "approx"
+
+    Forward the Authorization header to the Transaction microservice if present.
+    """
+    return serve_chart(distribution_request)
+
+
+@analytics_blueprint.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """
+    GET /analytics/dashboard?userId=1&startMonth=2023-01&endMonth=2023-03&bar=Expense:Groceries&bar=Income:Salary
+    Returns the line chart, both pie charts and any requested bar series in
+    one response, from a single upstream fetch and a single aggregation pass.
+    
+    Query Params:
+    - userId (int)
+    - startMonth (str) in MM-YYYY
+    - endMonth (str) in MM-YYYY
+    - bar (str, optional, repeatable) => "<Income|Expense>:<category>"
+    
+    Forward the Authorization header to the Transaction microservice if present.
+    """
+    return serve_chart(dashboard_request)
+
+
+def _parse_chart_spec(spec):
+    """
+    "line" / "pie/expense" / "pie/income", or {"chart": "bar", "type":
+    "Expense", "category": "Rent"} => (chart, chart_type, category).
+    Raises ValueError.
+    """
+    if isinstance(spec, str):
+        spec = {"chart": spec}
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid chart spec {spec!r}.")
+
+    chart = spec.get("chart")
+    if chart in ("line", "pie/expense", "pie/income"):
+        return (chart, None, None)
+    if chart == "bar":
+        chart_type, category = spec.get("type"), spec.get("category")
+        if not isinstance(chart_type, str) or chart_type.lower() not in ("income", "expense") or not category:
+            raise ValueError("Bar charts need a type (Income|Expense) and a category.")
+        return (chart, chart_type, category)
+    raise ValueError(f"Unknown chart {chart!r}, expected line, pie/expense, pie/income or bar.")
+
+
+@analytics_blueprint.route('/batch', methods=['POST'])
+def post_batch():
+    """
+    POST /analytics/batch
+    Computes the same charts for many users and streams one NDJSON line per
+    user as soon as it is ready (in completion order).
+    
+    JSON body:
+    {
+      "userIds": [1, 2, 3],
+      "startMonth": "2023-01",
+      "endMonth": "2023-12",
+      "charts": ["line", "pie/expense", "pie/income",
+                 {"chart": "bar", "type": "Expense", "category": "Rent"}]
+    }
+    
+    Response lines:
+    {"userId": 1, "charts": [{...line...}, {...pie...}, ...]}
+    {"userId": 2, "error": "Unable to fetch transactions from Transaction Service", "status": 502}
+    
+    Upstream fetches run on BATCH_FETCH_WORKERS threads; with BATCH_PROCESSES
+    set, the aggregations run on a process pool. The Authorization header is
+    forwarded for every user.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object body."}), 400
+
+    user_ids = body.get('userIds')
+    start_month_str = body.get('startMonth')
+    end_month_str = body.get('endMonth')
+    chart_specs = body.get('charts')
+    if not (user_ids and start_month_str and end_month_str and chart_specs) \
+            or not isinstance(user_ids, list) or not isinstance(chart_specs, list):
+        return jsonify({"error": "Missing required fields (userIds, startMonth, endMonth, charts)."}), 400
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({"error": f"At most {BATCH_MAX_USERS} userIds per batch."}), 400
+    try:
+        chart_specs = [_parse_chart_spec(spec) for spec in chart_specs]
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    start_m, start_y = parse_month_year(str(start_month_str))
+    end_m, end_y = parse_month_year(str(end_month_str))
+    window = (start_m, start_y, end_m, end_y)
     token = request.headers.get('Authorization')
-    headers = {}
-    if token:
-        headers["Authorization"] = token
-
-    # Fetch transactions
-    resp = requests.get(
-        f"{TRANSACTION_SERVICE_URL}/transactions",
-        params={"userId": user_id},
-        headers=headers
-    )
-    if resp.status_code != 200:
-        logger.error(f"Transaction Service responded with status {resp.status_code}")
-        return jsonify({"error": "Unable to fetch transactions from Transaction Service"}), 502
 
-    transactions = resp.json()
-    start_m, start_y = parse_month_year(start_month_str)
-    end_m, end_y = parse_month_year(end_month_str)
+    def charts_for(user_id):
+        transactions = fetch_transactions(user_id, token, window)
+        args = (transactions, *window, chart_specs, EXPENSE_CATEGORIES, INCOME_CATEGORIES)
+        if BATCH_PROCESSES > 0:
+            pool = process_pool(BATCH_PROCESSES, set_taxonomy, (taxonomy,))
+            return pool.submit(compute_charts, *args).result()
+        return compute_charts(*args)
+
+    def generate():
+        for user_id, charts, error in fan_out(user_ids, charts_for, BATCH_FETCH_WORKERS):
+            if error is None:
+                line = {"userId": user_id, "charts": charts}
+            elif isinstance(error, TransactionServiceError):
+                line = {"userId": user_id, "error": str(error), "status": error.status_code}
+            else:
+                logger.error(f"Batch aggregation failed for user {user_id}: {error!r}")
+                line = {"userId": user_id, "error": "Internal server error.", "status": 500}
+            yield json_codec.dumps(line) + b"\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def _parse_stream_chart(name):
+    """
+    "line" / "pie/expense" / "pie/income" / "bar:Expense:Rent" => a
+    _parse_chart_spec() spec.
+    """
+    chart, _, bar = name.strip().partition(':')
+    if chart == "bar":
+        chart_type, _, category = bar.partition(':')
+        return {"chart": chart, "type": chart_type, "category": category}
+    return chart
+
+
+def stream_request(args):
+    """
+    Parses a /stream query (see get_chart_stream) into (user_id, window,
+    chart specs); shared with the async handler.
+    """
+    user_id, start, end = _range_args(args, "Missing required parameters (userId, startMonth, endMonth).")
+    charts = args.get('charts', 'line,pie/expense,pie/income')
+    try:
+        chart_specs = [_parse_chart_spec(_parse_stream_chart(name)) for name in charts.split(',')]
+    except ValueError as error:
+        raise InvalidChartRequest(str(error))
+    return user_id, _window(start, end), chart_specs
+
+
+SSE_KEEPALIVE = b": keepalive\n\n"
+
+
+def sse_event(name, data):
+    """
+    One Server-Sent Event: `name` and its JSON `data`.
+    """
+    return b"event: " + name.encode('ascii') + b"\ndata: " + json_codec.dumps(data) + b"\n\n"
+
+
+@analytics_blueprint.route('/stream', methods=['GET'])
+def get_chart_stream():
+    """
+    GET /analytics/stream?userId=1&startMonth=2023-01&endMonth=2023-12&charts=line,pie/expense
+    Server-Sent Events stream of the user's charts: a "snapshot" event with
+    every chart, then a "delta" event with the changed points whenever new
+    transactions arrive (through /analytics/ingest, or by polling the
+    user's open months every STREAM_POLL_INTERVAL seconds).
+    
+    Query Params:
+    - userId (int)
+    - startMonth (str) in MM-YYYY
+    - endMonth (str) in MM-YYYY
+    - charts (str, optional) => comma-separated "line", "pie/expense", "pie/income"
+      or "bar:<Income|Expense>:<category>" (default: "line,pie/expense,pie/income")
+    
+    Events:
+    event: snapshot
+    data: {"charts": [{...line...}, {...pie...}, ...]}
+    
+    event: delta
+    data: {"charts": [{"index": 0, "changes": {"expenseData": [[2, 70.0]]}}]}
+    
+    "index" is the chart's position in `charts`, and each change an
+    [index, value] pair into one of its series. Comment lines are sent every
+    STREAM_HEARTBEAT seconds to keep idle connections open. The
+    Authorization header is forwarded to the Transaction Service.
+    
+    Each open stream holds a worker thread; the ASGI app serves the same
+    stream without one (async_routes.get_chart_stream).
+    """
+    if chart_streams.max_subscriptions <= 0:
+        # a stream holds its thread until the client leaves: with one thread per worker it would block it
+        return jsonify({"error": "Streams are not served by this worker (STREAM_MAX_SUBSCRIPTIONS is 0); "
+                                 "use the ASGI app or a threaded worker."}), 503
+    try:
+        user_id, window, chart_specs = stream_request(request.args)
+    except InvalidChartRequest as error:
+        return jsonify({"error": str(error)}), 400
+    token = request.headers.get('Authorization')
+
+    def fetch(window):
+        pushed = window if PUSH_DOWN_FILTERS else None
+        if STREAM_TRANSACTIONS:
+            return transaction_client.iter_transactions(user_id, token, pushed)
+        return transaction_client.get_transactions(user_id, token, pushed)
+
+    try:
+        subscription = chart_streams.subscribe(
+            rollup_owner(user_id, token), fetch, window, chart_specs, EXPENSE_CATEGORIES, INCOME_CATEGORIES,
+            current_month_key()
+        )
+    except StreamLimitExceeded as error:
+        return jsonify({"error": str(error)}), 503
+
+    def generate():
+        while True:
+            event = subscription.next_event(STREAM_HEARTBEAT)
+            if event is not None:
+                yield sse_event(*event)
+                continue
+            yield SSE_KEEPALIVE
+            if STREAM_POLL_INTERVAL > 0:
+                try:
+                    chart_streams.poll(subscription.feed, STREAM_POLL_INTERVAL, current_month_key())
+                except TransactionServiceError as error:
+                    logger.warning(f"Stream poll failed for user {user_id}: {error}")
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    # also runs when the client disconnects before the first event
+    response.call_on_close(lambda: chart_streams.unsubscribe(subscription))
+    return response
+
+
+@analytics_blueprint.route('/ingest', methods=['POST'])
+def post_ingest():
+    """
+    POST /analytics/ingest
+    Webhook for new transactions: updates the user's open chart streams and
+    invalidates their cached data (see invalidate_rollups). Requires the
+    X-Ingest-Secret header to match INGEST_SECRET; disabled (404) without one.
+    
+    JSON body:
+    {"userId": 7, "transactions": [{"date": "2024-01-05", "type": "spent", "amount": 20, "category": "Rent"}]}
+    
+    Without "transactions", the user's data is taken as changed in unknown
+    ways: their streams re-fetch the whole history.
+    
+    Response:
+    {"userId": 7, "months": 1, "streams": 2}
+    "months" is the number of months touched (null for a re-fetch), "streams"
+    the number of streams that were sent a delta.
+    """
+    if not INGEST_SECRET:
+        return jsonify({"error": "Ingest is disabled."}), 404
+    secret = request.headers.get('X-Ingest-Secret', '')
+    if not hmac.compare_digest(secret.encode('utf-8'), INGEST_SECRET.encode('utf-8')):
+        return jsonify({"error": "Invalid ingest secret."}), 403
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not body.get('userId'):
+        return jsonify({"error": "Missing required fields (userId)."}), 400
+    user_id = body['userId']
+    transactions = body.get('transactions')
+
+    if transactions is None:
+        invalidate_rollups(user_id)
+        return jsonify({"userId": user_id, "months": None, "streams": chart_streams.reload(user_id)})
 
-    data = compute_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category)
-    return jsonify(data), 200
\ No newline at end of file
+    if not isinstance(transactions, list):
+        return jsonify({"error": "Expected a list of transactions."}), 400
+    try:
+        buckets = bucket_transactions(transactions)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return jsonify({"error": "Invalid transactions."}), 400
+    month_keys = sorted({yyyy * 12 + mm for (yyyy, mm, _, _) in buckets if mm})
+    invalidate_rollups(user_id, month_keys)
+    return jsonify({"userId": user_id, "months": len(month_keys), "streams": chart_streams.ingest(user_id, buckets)})
@@ -0,0 +1,449 @@
+"""
+Async variants of the analytics chart endpoints, served by src/asgi.py.
+
+Each handler takes the parsed query string (dict of lists) and the request
+headers (lower-cased names), awaits the upstream fetch without blocking the
+event loop, and returns (payload, status) like the Flask handlers do, or
+(payload, status, response_headers); payload is None for a 304.
+
+Queries are parsed and charts built by the same *_request functions as the
+Flask views (analytics_routes), so the two apps cannot drift apart; only
+fetching differs. /stream returns an EventStream as its payload, which the
+ASGI app sends as Server-Sent Events. Aggregation, frame building and SQLite store calls run
+in worker threads (asyncio.to_thread) rather than on the event loop.
+"""
+import asyncio
+import logging
+from ..config import (
+    TRANSACTION_SERVICE_URL,
+    USE_NUMPY_ENGINE,
+    TRANSACTION_CACHE_TTL,
+    TRANSACTION_CACHE_MAX_ENTRIES,
+    TRANSACTION_CACHE_MAX_BYTES,
+    ASYNC_TRANSACTION_SERVICE_POOL_SIZE,
+    TRANSACTION_SERVICE_CONNECT_TIMEOUT,
+    TRANSACTION_SERVICE_READ_TIMEOUT,
+    TRANSACTION_SERVICE_MAX_RETRIES,
+    TRANSACTION_SERVICE_BACKOFF,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_RESET_TIMEOUT,
+    PUSH_DOWN_FILTERS,
+    TRANSACTION_SERVICE_PAGE_SIZE,
+    TRANSACTION_SERVICE_PAGE_CONCURRENCY,
+    TRANSACTION_SERVICE_MAX_PAGES,
+    COALESCE_FETCHES,
+    CHART_ETAGS,
+    CHART_CACHE_CONTROL,
+    CONDITIONAL_UPSTREAM,
+    UPSTREAM_REVALIDATION_TTL,
+    SNAPSHOT_MAX_AGE,
+    PREFIX_INDEX,
+    STREAM_HEARTBEAT,
+    STREAM_POLL_INTERVAL,
+    ASYNC_STREAM_MAX_SUBSCRIPTIONS,
+    STREAM_MAX_PENDING
+)
+from werkzeug.datastructures import MultiDict
+
+from ..services.async_transaction_client import AsyncTransactionClient
+from ..services.transaction_client import CircuitBreaker, TransactionServiceError, is_valid_window
+from ..utils.frame import to_frame
+from ..utils.cache import TransactionCache
+from ..utils.prefix_index import PrefixIndex
+from ..utils.rollups import assemble_rollup, current_month_key, plan_rollup, rollup_owner
+from ..utils.singleflight import AsyncSingleFlight
+from ..utils.http_cache import chart_etag, data_version, etag_matches
+from ..utils.metrics import instrumentation, stats_collector
+from ..utils.aggregator import bucket_transactions
+from ..utils.approx import is_truncated
+from ..utils.chart_stream import ChartStreams, StreamLimitExceeded
+from .analytics_routes import (
+    EXPENSE_CATEGORIES,
+    INCOME_CATEGORIES,
+    SSE_KEEPALIVE,
+    InvalidChartRequest,
+    bar_request,
+    dashboard_request,
+    distribution_request,
+    income_pie_request,
+    invalidation_hooks,
+    json_codec,
+    line_request,
+    observe_workload,
+    pie_request,
+    prime_engines,
+    rollup_store,
+    snapshot_store,
+    sse_event,
+    stream_request,
+    upstream_encoding
+)
+
+logger = logging.getLogger(__name__)
+
+async_transaction_client = AsyncTransactionClient(
+    TRANSACTION_SERVICE_URL,
+    pool_size=ASYNC_TRANSACTION_SERVICE_POOL_SIZE,
+    connect_timeout=TRANSACTION_SERVICE_CONNECT_TIMEOUT,
+    read_timeout=TRANSACTION_SERVICE_READ_TIMEOUT,
+    max_retries=TRANSACTION_SERVICE_MAX_RETRIES,
+    backoff_factor=TRANSACTION_SERVICE_BACKOFF,
+    breaker=CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT),
+    page_size=TRANSACTION_SERVICE_PAGE_SIZE,
+    page_concurrency=TRANSACTION_SERVICE_PAGE_CONCURRENCY,
+    max_pages=TRANSACTION_SERVICE_MAX_PAGES,
+    json_codec=json_codec,
+    accept_encoding=upstream_encoding
+)
+
+async_transaction_cache = TransactionCache(
+    ttl=TRANSACTION_CACHE_TTL,
+    max_entries=TRANSACTION_CACHE_MAX_ENTRIES,
+    max_bytes=TRANSACTION_CACHE_MAX_BYTES
+)
+
+async_revalidation_cache = TransactionCache(
+    ttl=UPSTREAM_REVALIDATION_TTL if CONDITIONAL_UPSTREAM else 0,
+    max_entries=TRANSACTION_CACHE_MAX_ENTRIES,
+    max_bytes=TRANSACTION_CACHE_MAX_BYTES
+)
+
+async_transaction_flights = AsyncSingleFlight()
+
+# Open /analytics/stream subscriptions of this process; each waits on its own asyncio queue, not a thread.
+async_chart_streams = ChartStreams(ASYNC_STREAM_MAX_SUBSCRIPTIONS, STREAM_MAX_PENDING)
+
+
+def _invalidate_user(user_id, month_keys):
+    async_transaction_cache.invalidate_user(user_id)
+    async_revalidation_cache.invalidate_user(user_id)
+
+
+invalidation_hooks.append(_invalidate_user)
+
+instrumentation.add_collector(stats_collector(
+    'analytics_cache', 'cache',
+    {'async_transactions': async_transaction_cache, 'async_revalidation': async_revalidation_cache},
+    counters=('hits', 'misses', 'evictions', 'expirations')
+))
+instrumentation.add_collector(stats_collector(
+    'analytics_fetch_flights', 'client', {'async': async_transaction_flights}, counters=('executions', 'coalesced')
+))
+instrumentation.add_collector(stats_collector(
+    'analytics_streams', 'transport', {'async_sse': async_chart_streams}, counters=('published', 'polls')
+))
+
+
+def _first(args, name):
+    values = args.get(name)
+    return values[0] if values else None
+
+
+async def fetch_transactions_async(user_id, token, window=None, txn_type=None, daily=False, rows=False):
+    """
+    Async fetch_transactions: filters pushed down and cached the same way,
+    raises TransactionServiceError on upstream failure.
+    """
+    monthly = not (daily or rows)
+    if monthly and PREFIX_INDEX:
+        return await fetch_prefix_index_async(user_id, token)
+    if monthly and snapshot_store is not None and window is not None and is_valid_window(window):
+        return await fetch_snapshot_async(user_id, token, window)
+    if monthly and rollup_store is not None and window is not None and is_valid_window(window):
+        return await fetch_rollups_async(user_id, token, window)
+
+    if not PUSH_DOWN_FILTERS:
+        window, txn_type = None, None
+    elif COALESCE_FETCHES:
+        txn_type = None
+
+    detail = ('rows',) if rows and USE_NUMPY_ENGINE else ()
+    cache_key = async_transaction_cache.make_key(user_id, token, (window, txn_type) + detail)
+    transactions = async_transaction_cache.get(cache_key)
+    if transactions is None and txn_type is not None:
+        transactions = async_transaction_cache.get(
+            async_transaction_cache.make_key(user_id, token, (window, None) + detail)
+        )
+    if transactions is not None:
+        return transactions
+
+    async def load():
+        previous = async_revalidation_cache.get(cache_key)
+        transactions = await async_transaction_client.get_transactions(
+            user_id, token, window, txn_type, etag=getattr(previous, 'etag', None)
+        )
+        if transactions is None:
+            return previous
+        if USE_NUMPY_ENGINE and not rows:
+            transactions = await asyncio.to_thread(to_frame, transactions)
+        if transactions.etag:
+            async_revalidation_cache.set(cache_key, transactions)
+        return transactions
+
+    return await _load_once(cache_key, load)
+
+
+async def fetch_rollups_async(user_id, token, window):
+    """
+    Async fetch_rollups. The store calls (and the bucketing of fetched
+    months) run in a worker thread; the upstream fetch is awaited.
+    """
+    cache_key = async_transaction_cache.make_key(user_id, token, (window, None))
+    buckets = async_transaction_cache.get(cache_key)
+    if buckets is not None:
+        return buckets
+
+    async def load():
+        owner = rollup_owner(user_id, token)
+        current_key = current_month_key()
+        fetch_window = await asyncio.to_thread(plan_rollup, rollup_store, owner, window, current_key)
+        transactions = ()
+        if fetch_window is not None:
+            pushed = fetch_window if PUSH_DOWN_FILTERS else None
+            transactions = await async_transaction_client.get_transactions(user_id, token, pushed)
+        return await asyncio.to_thread(
+            assemble_rollup, rollup_store, owner, window, current_key, fetch_window, transactions
+        )
+
+    return await _load_once(cache_key, load)
+
+
+def _build_prefix_index(transactions):
+    buckets = bucket_transactions(transactions)
+    index = PrefixIndex.from_buckets(buckets)
+    index.version = data_version(buckets)
+    return index
+
+
+async def fetch_prefix_index_async(user_id, token):
+    """
+    Async fetch_prefix_index: the user's PrefixIndex, built (in a worker
+    thread) from one full-history fetch and cached.
+    """
+    cache_key = async_transaction_cache.make_key(user_id, token, ('prefix',))
+    index = async_transaction_cache.get(cache_key)
+    if index is not None:
+        return index
+
+    async def load():
+        transactions = await async_transaction_client.get_transactions(user_id, token)
+        return await asyncio.to_thread(_build_prefix_index, transactions)
+
+    return await _load_once(cache_key, load)
+
+
+async def fetch_snapshot_async(user_id, token, window):
+    """
+    Async fetch_snapshot. The SQLite calls (planning, writing a sync, the
+    GROUP BY query) run in worker threads.
+    """
+    owner = rollup_owner(user_id, token)
+
+    async def sync():
+        current_key = current_month_key()
+        plan = await asyncio.to_thread(snapshot_store.plan_sync, owner, current_key, SNAPSHOT_MAX_AGE)
+        if plan is None:
+            return False
+        pushed = plan.window if PUSH_DOWN_FILTERS else None
+        transactions = await async_transaction_client.get_transactions(user_id, token, pushed)
+        await asyncio.to_thread(snapshot_store.apply_sync, owner, plan, transactions, current_key)
+        return True
+
+    if COALESCE_FETCHES:
+        await async_transaction_flights.do(('snapshot',) + owner, sync)
+    else:
+        await sync()
+    return await asyncio.to_thread(snapshot_store.buckets, owner, window)
+
+
+async def warm_up_async(client=None):
+    """
+    Async counterpart of analytics_routes.warm_up(), awaited before the ASGI
+    server starts accepting requests. Never raises.
+    """
+    try:
+        await asyncio.to_thread(prime_engines)
+        await (client or async_transaction_client).warm_up()
+    except Exception:
+        logger.exception("Warm-up failed")
+
+
+async def _load_once(cache_key, load):
+    """
+    Async counterpart of analytics_routes._load_once.
+    """
+    async def load_and_cache():
+        value = async_transaction_cache.get(cache_key)
+        if value is None:
+            value = await load()
+            async_transaction_cache.set(cache_key, value)
+        return value
+
+    if COALESCE_FETCHES:
+        return await async_transaction_flights.do(cache_key, load_and_cache)
+    return await load_and_cache()
+
+
+async def _chart_result(transactions, chart, args, headers, build):
+    """
+    Async chart_response: (payload, status, headers) with ETag and
+    Cache-Control, or (None, 304, headers) without calling build(). The
+    aggregation runs in a worker thread, off the event loop. Truncated
+    approximate charts get no ETag, as in chart_response.
+    """
+    response_headers = {}
+    version = data_version(transactions) if CHART_ETAGS else None
+    if version is not None:
+        etag = chart_etag(version, chart, ((k, v) for k, values in args.items() for v in values))
+        response_headers['ETag'] = etag
+    if CHART_CACHE_CONTROL:
+        response_headers['Cache-Control'] = CHART_CACHE_CONTROL
+
+    if version is not None and etag_matches(headers.get('if-none-match'), etag):
+        return None, 304, response_headers
+
+    def aggregate():
+        with instrumentation.stage('aggregate'):
+            return build()
+
+    data = await asyncio.to_thread(aggregate)
+    if is_truncated(data):
+        response_headers.pop('ETag', None)
+    return data, 200, response_headers
+
+
+async def _serve_chart(parse, args, headers):
+    """
+    Async serve_chart: parses the query with the Flask route's parser, awaits
+    the fetch and builds the chart the same way.
+    """
+    try:
+        chart = parse(MultiDict(args))
+    except InvalidChartRequest as error:
+        return {"error": str(error)}, 400
+    try:
+        with instrumentation.stage('fetch'):
+            transactions = await fetch_transactions_async(
+                chart.user_id, headers.get('authorization'), chart.window, chart.txn_type, chart.daily, chart.rows
+            )
+    except TransactionServiceError as error:
+        return {"error": str(error)}, error.status_code
+    observe_workload(transactions, chart.window)
+    return await _chart_result(transactions, chart.path, args, headers, lambda: chart.build(transactions))
+
+
+async def get_line_chart(args, headers):
+    """
+    GET /analytics/line (async). Same parameters and response as the Flask route.
+    """
+    return await _serve_chart(line_request, args, headers)
+
+
+async def get_expense_pie_range(args, headers):
+    """
+    GET /analytics/pie/expense (async).
+    """
+    return await _serve_chart(pie_request, args, headers)
+
+
+async def get_income_pie_range(args, headers):
+    """
+    GET /analytics/pie/income (async).
+    """
+    return await _serve_chart(income_pie_request, args, headers)
+
+
+async def get_bar_chart(args, headers):
+    """
+    GET /analytics/bar (async).
+    """
+    return await _serve_chart(bar_request, args, headers)
+
+
+async def get_distribution_chart(args, headers):
+    """
+    GET /analytics/distribution (async).
+    """
+    return await _serve_chart(distribution_request, args, headers)
+
+
+async def get_dashboard(args, headers):
+    """
+    GET /analytics/dashboard (async).
+    """
+    return await _serve_chart(dashboard_request, args, headers)
+
+
+class EventStream:
+    """
+    The Server-Sent Events body of an async /stream: iterating yields the
+    encoded events of `subscription` (a keep-alive, and a poll of its feed,
+    every STREAM_HEARTBEAT idle seconds). The ASGI app calls aclose() when
+    the response ends, which closes the subscription.
+    """
+
+    def __init__(self, subscription, user_id):
+        self.subscription = subscription
+        self.user_id = user_id
+
+    async def __aiter__(self):
+        while True:
+            event = await self.subscription.next_event_async(STREAM_HEARTBEAT)
+            if event is not None:
+                yield sse_event(*event)
+                continue
+            yield SSE_KEEPALIVE
+            if STREAM_POLL_INTERVAL > 0:
+                try:
+                    await asyncio.to_thread(
+                        async_chart_streams.poll, self.subscription.feed, STREAM_POLL_INTERVAL, current_month_key()
+                    )
+                except TransactionServiceError as error:
+                    logger.warning(f"Stream poll failed for user {self.user_id}: {error}")
+
+    async def aclose(self):
+        async_chart_streams.unsubscribe(self.subscription)
+
+
+async def get_chart_stream(args, headers):
+    """
+    GET /analytics/stream (async). Same parameters and events as the Flask
+    route, but an open stream waits on an asyncio queue instead of holding
+    a thread; feeds are fetched and polled in worker threads through the
+    async client. Only polling updates these streams: /analytics/ingest is
+    served by the Flask app, in another process.
+    """
+    try:
+        user_id, window, chart_specs = stream_request(MultiDict(args))
+    except InvalidChartRequest as error:
+        return {"error": str(error)}, 400
+    token = headers.get('authorization')
+    loop = asyncio.get_running_loop()
+
+    def fetch(window):
+        # runs in a worker thread (subscribe, poll): hand the request to the loop's client
+        pushed = window if PUSH_DOWN_FILTERS else None
+        request = async_transaction_client.get_transactions(user_id, token, pushed)
+        return asyncio.run_coroutine_threadsafe(request, loop).result()
+
+    try:
+        subscription = await asyncio.to_thread(
+            async_chart_streams.subscribe, rollup_owner(user_id, token), fetch, window, chart_specs,
+            EXPENSE_CATEGORIES, INCOME_CATEGORIES, current_month_key(), loop
+        )
+    except StreamLimitExceeded as error:
+        return {"error": str(error)}, 503
+    except TransactionServiceError as error:
+        return {"error": str(error)}, error.status_code
+    return EventStream(subscription, user_id), 200, {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+ASYNC_ROUTES = {
+    '/line': get_line_chart,
+    '/pie/expense': get_expense_pie_range,
+    '/pie/income': get_income_pie_range,
+    '/bar': get_bar_chart,
+    '/distribution': get_distribution_chart,
+    '/dashboard': get_dashboard,
+    '/stream': get_chart_stream
+}
@@ -0,0 +1,3 @@
+"""
+Init file for services package in Analytics microservice.
+"""
@@ -0,0 +1,210 @@
+"""
+Non-blocking counterpart of TransactionClient, used by the ASGI app.
+
+Same contract as the sync client: pooled keep-alive connections, connect/read
+timeouts, bounded retries with backoff on GETs, and a circuit breaker. Errors
+are raised as TransactionServiceError.
+"""
+import asyncio
+import logging
+
+import aiohttp
+
+from ..utils.http_cache import content_version
+from ..utils.json_codec import make_codec
+from ..utils.metrics import instrumentation
+from .transaction_client import (
+    CircuitBreaker,
+    TransactionClient,
+    TransactionList,
+    TransactionServiceError,
+    check_page_count,
+    filter_transactions,
+    parse_page,
+    repeats_page,
+    window_params
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTransactionClient:
+    """
+    :param base_url: TRANSACTION_SERVICE_URL
+    :param pool_size: maximum concurrent keep-alive connections to the upstream
+    :param connect_timeout, read_timeout: seconds
+    :param max_retries: extra attempts on connection errors or 502/503/504
+    :param backoff_factor: sleeps backoff_factor * 2 ** (attempt - 1) between retries
+    :param breaker: CircuitBreaker shared by every call
+    :param page_size: records requested per page (0 => do not paginate)
+    :param page_concurrency: pages fetched concurrently once the page count is known
+    :param max_pages: pages walked at most per fetch (see check_page_count)
+    :param json_codec: JSONCodec for response bodies (default: make_codec())
+    :param accept_encoding: Accept-Encoding sent upstream (None => the aiohttp default)
+    """
+
+    RETRY_STATUSES = TransactionClient.RETRY_STATUSES
+
+    def __init__(self, base_url, pool_size=100, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_factor=0.2, breaker=None, page_size=0, page_concurrency=4,
+                 json_codec=None, accept_encoding=None, max_pages=1000):
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.page_concurrency = max(1, page_concurrency)
+        self.max_pages = max_pages
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self.json_codec = json_codec or make_codec()
+        self.accept_encoding = accept_encoding
+        self._session = None
+
+    @property
+    def session(self):
+        # Created lazily so it binds to the event loop that serves requests.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+                headers={'Accept-Encoding': self.accept_encoding} if self.accept_encoding else None
+            )
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_transactions(self, user_id, token=None, window=None, txn_type=None, etag=None):
+        """
+        Returns the decoded transactions for `user_id` as a TransactionList,
+        forwarding the Authorization token if given. Raises
+        TransactionServiceError.
+
+        Window/type filters, pagination and conditional requests (`etag`,
+        None on 304) behave like TransactionClient.get_transactions.
+        """
+        headers = {}
+        if token:
+            headers["Authorization"] = token
+        params = {"userId": str(user_id)}
+        params.update({k: str(v) for k, v in window_params(window, txn_type).items()})
+
+        if not self.page_size:
+            if etag:
+                headers["If-None-Match"] = etag
+            records, _, body, etag = await self._get_page(params, headers)
+            if records is None:
+                return None
+            return TransactionList(
+                filter_transactions(records, window, txn_type), etag or content_version(body), etag
+            )
+
+        def page_params(page):
+            return dict(params, page=str(page), pageSize=str(self.page_size))
+
+        records, total_pages, body, _ = await self._get_page(page_params(1), headers)
+        pages, bodies = [records], [body]
+        if total_pages is None:
+            page = 1
+            while len(records) >= self.page_size:
+                page += 1
+                check_page_count(page, self.max_pages)
+                records, _, body, _ = await self._get_page(page_params(page), headers)
+                if repeats_page(records, body, pages, bodies):
+                    break
+                pages.append(records)
+                bodies.append(body)
+        elif total_pages > 1:
+            check_page_count(total_pages, self.max_pages)
+            semaphore = asyncio.Semaphore(self.page_concurrency)
+
+            async def fetch(page):
+                async with semaphore:
+                    return await self._get_page(page_params(page), headers)
+
+            for records, _, body, _ in await asyncio.gather(*(fetch(p) for p in range(2, total_pages + 1))):
+                pages.append(records)
+                bodies.append(body)
+
+        return TransactionList(
+            (t for page in pages for t in filter_transactions(page, window, txn_type)),
+            content_version(*bodies)
+        )
+
+    async def _get_page(self, params, headers):
+        """
+        Returns (records, total_pages, raw body, upstream ETag); records is
+        None on 304 Not Modified.
+        """
+        status, body, etag = await self._get("/transactions", params=params, headers=headers)
+        if status == 304:
+            return None, None, body, etag
+        try:
+            # decoding a large page is CPU work: keep it off the event loop
+            records, total_pages = await asyncio.to_thread(self._decode, body)
+        except ValueError:
+            logger.error("Transaction Service returned an unexpected body")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+        return records, total_pages, body, etag
+
+    def _decode(self, body):
+        with instrumentation.stage('decode'):
+            return parse_page(self.json_codec.loads(body))
+
+    async def warm_up(self):
+        """
+        Async TransactionClient.warm_up: creates the session on the running
+        loop and opens one pooled connection. Never raises.
+        """
+        try:
+            async with self.session.head(self.base_url):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            logger.warning(f"Transaction Service warm-up failed: {exc!r}")
+
+    async def _get(self, path, params=None, headers=None):
+        """
+        Returns (status, raw body, ETag header) of a 200 or 304 response.
+        """
+        if not self.breaker.allow_request():
+            raise TransactionServiceError(
+                "Transaction Service is unavailable, please retry later", status_code=503
+            )
+
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            status, body, etag, error = None, b'', None, None
+            try:
+                async with self.session.get(url, params=params, headers=headers) as resp:
+                    status = resp.status
+                    etag = resp.headers.get('ETag')
+                    if status == 200:
+                        body = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                error = exc
+
+            retryable = error is not None or status in self.RETRY_STATUSES
+            if not retryable or attempt >= self.max_retries:
+                break
+            attempt += 1
+            await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+
+        if error is not None:
+            self.breaker.record_failure()
+            logger.error(f"Transaction Service request failed: {error!r}")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+
+        if status not in (200, 304):
+            if status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            logger.error(f"Transaction Service responded with status {status}")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+
+        self.breaker.record_success()
+        return status, body, etag
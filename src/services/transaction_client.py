@@ -0,0 +1,388 @@
+"""
+HTTP client for the Transaction Management microservice.
+
+All routes share one TransactionClient, which keeps a pooled keep-alive
+requests.Session, applies connect/read timeouts, retries idempotent GETs
+with backoff, and trips a circuit breaker when the upstream keeps failing.
+"""
+import calendar
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..utils.date_utils import date_month_key, month_key, month_key_range
+from ..utils.http_cache import content_version
+from ..utils.json_codec import make_codec
+from ..utils.json_stream import iter_json_array
+from ..utils.metrics import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionServiceError(Exception):
+    """
+    Raised when transactions could not be fetched.
+    `status_code` is what the analytics endpoint should answer with:
+    502 for a failed/invalid upstream response, 503 while the circuit is open.
+    """
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+    def reset(self):
+        self.record_success()
+
+
+class TransactionList(list):
+    """
+    Transactions returned by get_transactions().
+
+    - version: identifies the payload (upstream ETag, else a hash of the body)
+    - etag: the upstream ETag, if any; pass it back as `etag=` to revalidate
+    """
+
+    def __init__(self, records=(), version=None, etag=None):
+        super().__init__(records)
+        self.version = version
+        self.etag = etag
+
+
+def window_params(window, txn_type=None):
+    """
+    Query parameters that push a (start_m, start_y, end_m, end_y) window and a
+    transaction type ('spent'/'receive') down to the Transaction Service.
+    Invalid windows are not pushed down (the caller filters client-side).
+    """
+    params = {}
+    if window is not None and is_valid_window(window):
+        start_m, start_y, end_m, end_y = window
+        last_day = calendar.monthrange(end_y, end_m)[1]
+        params["startDate"] = f"{start_y:04d}-{start_m:02d}-01"
+        params["endDate"] = f"{end_y:04d}-{end_m:02d}-{last_day:02d}"
+    if txn_type:
+        params["type"] = txn_type
+    return params
+
+
+def is_valid_window(window):
+    start_m, start_y, end_m, end_y = window
+    return (1 <= start_m <= 12 and 1 <= end_m <= 12 and start_y > 0
+            and month_key(start_m, start_y) <= month_key(end_m, end_y))
+
+
+def filter_transactions(transactions, window=None, txn_type=None):
+    """
+    Client-side fallback for upstreams that ignore the pushed-down filters:
+    yields only transactions inside `window` (and of `txn_type`, if given).
+    """
+    keys = month_key_range(*window) if window is not None and is_valid_window(window) else None
+
+    for t in transactions:
+        if txn_type and t.get('type') != txn_type:
+            continue
+        if keys is not None and date_month_key(t.get('date', '01-01-1970')) not in keys:
+            continue
+        yield t
+
+
+def parse_page(body):
+    """
+    Splits one upstream response into (records, total_pages).
+
+    Accepts a bare JSON array (unpaginated upstream => total_pages 1) or an
+    envelope like {"data": [...], "page": 1, "totalPages": 4}; "transactions"
+    is accepted in place of "data". total_pages is None when the envelope does
+    not say, in which case pages are walked until a short page comes back.
+
+    Raises ValueError for anything else, a non-integer totalPages included.
+    """
+    if isinstance(body, list):
+        return body, 1
+    if isinstance(body, dict):
+        records = body.get('data', body.get('transactions'))
+        if isinstance(records, list):
+            total = body.get('totalPages')
+            if total is None:
+                return records, None
+            if isinstance(total, str) and total.strip().isdigit() or isinstance(total, float) and total.is_integer():
+                total = int(total)
+            if isinstance(total, int) and not isinstance(total, bool):
+                return records, total
+    raise ValueError("Unexpected Transaction Service payload")
+
+
+def check_page_count(pages, max_pages):
+    """
+    Raises TransactionServiceError if walking `pages` pages would exceed
+    `max_pages`: a history that long (or an upstream that never returns a
+    short page) fails instead of being fetched without end.
+    """
+    if pages > max_pages:
+        logger.error(f"Transaction Service pagination exceeded {max_pages} pages")
+        raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+
+
+def repeats_page(records, body, pages, bodies):
+    """
+    True if a page fetched while walking without a total is the previous
+    page again (same body or same records): the upstream ignores `page`,
+    and walking on would never end.
+    """
+    return body == bodies[-1] or records == pages[-1]
+
+
+class TransactionClient:
+    """
+    :param base_url: TRANSACTION_SERVICE_URL
+    :param pool_size: keep-alive connections kept per upstream host
+    :param connect_timeout, read_timeout: seconds, passed to requests
+    :param max_retries: extra attempts for GETs failing with a connection
+        error or a 502/503/504
+    :param backoff_factor: urllib3 exponential backoff between retries
+    :param breaker: CircuitBreaker shared by every call
+    :param page_size: records requested per page (0 => do not paginate)
+    :param page_concurrency: pages fetched in parallel once the page count is known
+    :param max_pages: pages walked at most per fetch (see check_page_count)
+    :param json_codec: JSONCodec for response bodies (default: make_codec())
+    :param accept_encoding: Accept-Encoding sent upstream, e.g. 'gzip, deflate'
+        or 'identity' (None => the requests default); encoded bodies are
+        decoded transparently, also when streaming
+    """
+
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_factor=0.2, breaker=None, page_size=0, page_concurrency=4,
+                 json_codec=None, accept_encoding=None, max_pages=1000):
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.page_concurrency = max(1, page_concurrency)
+        self.max_pages = max_pages
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self.json_codec = json_codec or make_codec()
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if accept_encoding:
+            self.session.headers['Accept-Encoding'] = accept_encoding
+
+    def get_transactions(self, user_id, token=None, window=None, txn_type=None, etag=None):
+        """
+        Returns the decoded transactions for `user_id` as a TransactionList,
+        forwarding the Authorization token if given. Raises
+        TransactionServiceError.
+
+        :param window: optional (start_m, start_y, end_m, end_y), pushed down
+            as startDate/endDate
+        :param txn_type: optional 'spent' or 'receive', pushed down as type
+        :param etag: ETag of a previous result; sent as If-None-Match, and
+            None is returned if the upstream answers 304 Not Modified
+
+        Paginated responses are walked (pages 2..N in parallel when the total
+        is known; conditional requests are not used for them; without a
+        total, until a short or repeated page, at most max_pages), and the
+        filters are re-applied client-side in case the upstream ignored them.
+        """
+        headers = {}
+        if token:
+            headers["Authorization"] = token
+        params = {"userId": user_id}
+        params.update(window_params(window, txn_type))
+
+        if not self.page_size:
+            if etag:
+                headers["If-None-Match"] = etag
+            records, _, body, etag = self._get_page(params, headers)
+            if records is None:
+                return None
+            return TransactionList(
+                filter_transactions(records, window, txn_type), etag or content_version(body), etag
+            )
+
+        records, total_pages, body, _ = self._get_page(dict(params, page=1, pageSize=self.page_size), headers)
+        pages, bodies = [records], [body]
+        if total_pages is None:
+            page = 1
+            while len(records) >= self.page_size:
+                page += 1
+                check_page_count(page, self.max_pages)
+                records, _, body, _ = self._get_page(dict(params, page=page, pageSize=self.page_size), headers)
+                if repeats_page(records, body, pages, bodies):
+                    break
+                pages.append(records)
+                bodies.append(body)
+        elif total_pages > 1:
+            check_page_count(total_pages, self.max_pages)
+            def fetch(page):
+                return self._get_page(dict(params, page=page, pageSize=self.page_size), headers)
+
+            with ThreadPoolExecutor(max_workers=min(self.page_concurrency, total_pages - 1)) as pool:
+                for records, _, body, _ in pool.map(fetch, range(2, total_pages + 1)):
+                    pages.append(records)
+                    bodies.append(body)
+
+        return TransactionList(
+            (t for page in pages for t in filter_transactions(page, window, txn_type)),
+            content_version(*bodies)
+        )
+
+    def _get_page(self, params, headers):
+        """
+        Returns (records, total_pages, raw body, upstream ETag); records is
+        None on 304 Not Modified.
+        """
+        resp = self._get("/transactions", params=params, headers=headers)
+        etag = resp.headers.get('ETag')
+        if resp.status_code == 304:
+            return None, None, b'', etag
+        try:
+            with instrumentation.stage('decode'):
+                records, total_pages = parse_page(resp.json(cls=self.json_codec.decoder_class))
+        except ValueError:
+            logger.error("Transaction Service returned an unexpected body")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+        return records, total_pages, resp.content, etag
+
+    def iter_transactions(self, user_id, token=None, window=None, txn_type=None, chunk_size=64 * 1024):
+        """
+        Streams the user's transactions: yields one decoded transaction at a
+        time while the response body is still being read, so memory stays
+        flat regardless of history length. Raises TransactionServiceError,
+        also if the body is cut off or malformed mid-stream.
+
+        Filters are pushed down like in get_transactions; streamed responses
+        are expected to be a single unpaginated array.
+        """
+        headers = {}
+        if token:
+            headers["Authorization"] = token
+        params = {"userId": user_id}
+        params.update(window_params(window, txn_type))
+
+        resp = self._get("/transactions", params=params, headers=headers, stream=True)
+        try:
+            records = iter_json_array(resp.iter_content(chunk_size), resp.encoding or 'utf-8')
+            yield from filter_transactions(records, window, txn_type)
+        except (requests.RequestException, ValueError) as exc:
+            logger.error(f"Transaction Service stream failed: {exc}")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+        finally:
+            resp.close()
+
+    def warm_up(self):
+        """
+        Opens a pooled keep-alive connection to the Transaction Service (DNS,
+        TCP and TLS set-up), so the first chart request does not pay for it.
+        The response is ignored; a failure is logged, not raised, and does
+        not count against the circuit breaker.
+        """
+        try:
+            self.session.head(self.base_url, timeout=self.timeout).close()
+        except requests.RequestException as exc:
+            logger.warning(f"Transaction Service warm-up failed: {exc}")
+
+    def _get(self, path, params=None, headers=None, stream=False):
+        if not self.breaker.allow_request():
+            raise TransactionServiceError(
+                "Transaction Service is unavailable, please retry later", status_code=503
+            )
+
+        try:
+            resp = self.session.get(
+                f"{self.base_url}{path}",
+                params=params,
+                headers=headers,
+                timeout=self.timeout,
+                stream=stream
+            )
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            logger.error(f"Transaction Service request failed: {exc}")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+
+        if resp.status_code not in (200, 304):
+            resp.close()
+            if resp.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            logger.error(f"Transaction Service responded with status {resp.status_code}")
+            raise TransactionServiceError("Unable to fetch transactions from Transaction Service")
+
+        self.breaker.record_success()
+        return resp
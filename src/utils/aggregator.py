@@ -1,6 +1,197 @@
-from .date_utils import parse_full_date, generate_month_range
+from .date_utils import month_from_key, month_key_range, parse_full_date
+from .calendar_index import DAY_GRANULARITIES, bucket_keys, bucket_label, calendar_index, date_ordinal, \
+    month_key_rollup, window_ordinals
+from .frame import TransactionFrame, frame_line_data, frame_pie_data, frame_bar_data
+from .prefix_index import PrefixIndex, prefix_line_data, prefix_pie_data, prefix_bar_data
+from .taxonomy import category_of, get_taxonomy
 
-def compute_line_data(transactions, start_m, start_y, end_m, end_y):
+class MonthlyBuckets(dict):
+    """
+    Output of bucket_transactions: {(year, month, type, category): total}.
+    The compute_* functions accept it in place of a transaction list, so
+    pre-aggregated data (e.g. from a streamed upstream response) can be
+    cached and charted without keeping individual transactions around.
+    """
+
+def bucket_transactions(transactions, start_m=None, start_y=None, end_m=None, end_y=None):
+    """
+    Walks the transactions once and sums amounts per (year, month, type, category).
+
+    :param transactions: iterable of transaction dicts
+    :param start_m, start_y, end_m, end_y: optional window (int); rows outside
+        it are skipped before their amount is read
+    
+    Returns a dict like:
+    {
+      (2023, 11, "spent", "Groceries"): 150.75,
+      (2023, 11, "receive", "Salary"): 2000.0
+    }
+    Categories are canonical taxonomy names (see canonical_buckets), None if
+    missing (see taxonomy.category_of).
+    """
+    window = None
+    if start_m is not None and end_m is not None:
+        window = month_key_range(start_m, start_y, end_m, end_y)
+
+    buckets = MonthlyBuckets()
+    for t in transactions:
+        _, mm, yyyy = parse_full_date(t.get('date', '01-01-1970'))
+        if window is not None and yyyy * 12 + mm not in window:
+            continue
+
+        bucket = (yyyy, mm, t['type'], category_of(t))
+        buckets[bucket] = buckets.get(bucket, 0.0) + float(t['amount'])
+
+    return canonical_buckets(buckets)
+
+def canonical_buckets(buckets):
+    """
+    Renames the categories of Monthly/DailyBuckets (the last key element)
+    to their canonical taxonomy names, merging aliases. Runs once per bucket
+    rather than per transaction; returns `buckets` itself when every
+    category is canonical already.
+    """
+    canonical = get_taxonomy().canonical
+    if all(canonical(key[-1]) == key[-1] for key in buckets):
+        return buckets
+    merged = type(buckets)()
+    for key, amount in buckets.items():
+        key = key[:-1] + (canonical(key[-1]),)
+        merged[key] = merged.get(key, 0.0) + amount
+    return merged
+
+class DailyBuckets(dict):
+    """
+    Output of bucket_days: {(day_ordinal, type, category): total}, see
+    calendar_index. Accepted by the compute_* functions like MonthlyBuckets,
+    at any granularity: weeks are summed from the days, and months (then
+    quarters and years) via monthly().
+    """
+
+    def monthly(self):
+        """
+        The same sums as MonthlyBuckets, without going back to the transactions.
+        """
+        index = calendar_index()
+        buckets = MonthlyBuckets()
+        for (ordinal, t_type, cat), amount in self.items():
+            key = index.bucket(ordinal, 'month')
+            mm, yyyy = month_from_key(key) if key else (0, 0)  # 0: invalid date, as in bucket_transactions
+            bucket = (yyyy, mm, t_type, cat)
+            buckets[bucket] = buckets.get(bucket, 0.0) + amount
+        return buckets
+
+def bucket_days(transactions, start_m=None, start_y=None, end_m=None, end_y=None):
+    """
+    bucket_transactions per day: walks the transactions once and sums amounts
+    per (day ordinal, type, category) into DailyBuckets.
+    """
+    window = None
+    if start_m is not None and end_m is not None:
+        window = window_ordinals(start_m, start_y, end_m, end_y)
+
+    buckets = DailyBuckets()
+    for t in transactions:
+        ordinal = date_ordinal(t.get('date', '01-01-1970'))
+        if window is not None and ordinal not in window:
+            continue
+
+        bucket = (ordinal, t['type'], category_of(t))
+        buckets[bucket] = buckets.get(bucket, 0.0) + float(t['amount'])
+
+    return canonical_buckets(buckets)
+
+def _as_buckets(transactions, start_m, start_y, end_m, end_y, granularity='month'):
+    """
+    DailyBuckets for day and week charts, MonthlyBuckets for the others.
+    Raises ValueError for day/week charts of MonthlyBuckets.
+    """
+    daily = granularity in DAY_GRANULARITIES
+    if isinstance(transactions, DailyBuckets):
+        return transactions if daily else transactions.monthly()
+    if isinstance(transactions, MonthlyBuckets):
+        if daily:
+            raise ValueError(f"'{granularity}' charts need per-day data, not MonthlyBuckets")
+        return transactions
+    if daily:
+        return bucket_days(transactions, start_m, start_y, end_m, end_y)
+    return bucket_transactions(transactions, start_m, start_y, end_m, end_y)
+
+def _bucket_totals(buckets, granularity, txn_type, category=None, match_category=False):
+    """
+    Collapses buckets into {bucket key: total} at `granularity` for one
+    transaction type, optionally restricted to a single category.
+    """
+    if isinstance(buckets, DailyBuckets):
+        index = calendar_index()
+        key_of = lambda ordinal: index.bucket(ordinal, granularity)  # noqa: E731
+        items = ((ordinal, t_type, cat, amount) for (ordinal, t_type, cat), amount in buckets.items())
+    else:
+        key_of = lambda key: month_key_rollup(key, granularity)  # noqa: E731
+        items = ((yyyy * 12 + mm, t_type, cat, amount) for (yyyy, mm, t_type, cat), amount in buckets.items())
+
+    totals = {}
+    for key, t_type, cat, amount in items:
+        if t_type != txn_type:
+            continue
+        if match_category and cat != category:
+            continue
+        key = key_of(key)
+        totals[key] = totals.get(key, 0.0) + amount
+    return totals
+
+def line_from_buckets(buckets, start_m, start_y, end_m, end_y, granularity='month'):
+    """
+    Same shape as compute_line_data, answered from bucket_transactions (or,
+    for day and week charts, bucket_days) output.
+    """
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    income = _bucket_totals(buckets, granularity, 'receive')
+    expense = _bucket_totals(buckets, granularity, 'spent')
+
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "incomeData": [round(income.get(k, 0.0), 2) for k in keys],
+        "expenseData": [round(expense.get(k, 0.0), 2) for k in keys]
+    }
+
+def pie_from_buckets(buckets, start_m, start_y, end_m, end_y, categories, expense=True):
+    """
+    Same shape as compute_pie_data_range, answered from bucket_transactions output.
+    Unknown or missing categories are folded into 'Other' (the taxonomy's
+    `other` category) through the taxonomy's compiled pie slots.
+    """
+    txn_type = 'spent' if expense else 'receive'
+    window = month_key_range(start_m, start_y, end_m, end_y)
+
+    totals = get_taxonomy().pie_totals(categories, (
+        (cat, amount) for (yyyy, mm, t_type, cat), amount in buckets.items()
+        if t_type == txn_type and yyyy * 12 + mm in window
+    ))
+    return {
+        "labels": list(categories),
+        "data": [round(total, 2) for total in totals]
+    }
+
+def bar_from_buckets(buckets, start_m, start_y, end_m, end_y, chart_type, category, granularity='month'):
+    """
+    Same shape as compute_bar_data, answered from bucket_transactions (or,
+    for day and week charts, bucket_days) output. `category` may be any
+    spelling or alias the taxonomy resolves.
+    """
+    is_expense = (chart_type.lower() == "expense")
+    txn_type = 'spent' if is_expense else 'receive'
+
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    category = get_taxonomy().canonical(category)
+    totals = _bucket_totals(buckets, granularity, txn_type, category, match_category=True)
+
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "data": [round(totals.get(k, 0.0), 2) for k in keys]
+    }
+
+def compute_line_data(transactions, start_m, start_y, end_m, end_y, granularity='month'):
     """
     Returns:
     {
@@ -9,41 +200,26 @@ def compute_line_data(transactions, start_m, start_y, end_m, end_y):
       "expenseData": [150.75, 300.0, ...]
     }
     Summarizes total income vs. expenses for each month in the range.
-    """
-    months = generate_month_range(start_m, start_y, end_m, end_y)
-    labels = []
-    income_list = []
-    expense_list = []
-
-    for (m, y) in months:
-        label_str = f"{m:02d}-{y}"
-        labels.append(label_str)
-
-        monthly_income = 0.0
-        monthly_expense = 0.0
-
-        for t in transactions:
-            (dd, mm, yyyy) = parse_full_date(t.get('date', '01-01-1970'))
-            if mm == m and yyyy == y:
-                if t['type'] == 'receive':
-                    monthly_income += float(t['amount'])
-                elif t['type'] == 'spent':
-                    monthly_expense += float(t['amount'])
-        
-        income_list.append(round(monthly_income, 2))
-        expense_list.append(round(monthly_expense, 2))
+    `transactions` may be a list of dicts, MonthlyBuckets, DailyBuckets, a
+    TransactionFrame or a PrefixIndex.
 
-    return {
-        "labels": labels,
-        "incomeData": income_list,
-        "expenseData": expense_list
-    }
+    :param granularity: 'day', 'week', 'month', 'quarter' or 'year' (see
+        calendar_index.bucket_label for the labels); day and week charts
+        need per-day data, i.e. not MonthlyBuckets
+    """
+    if isinstance(transactions, TransactionFrame):
+        return frame_line_data(transactions, start_m, start_y, end_m, end_y, granularity)
+    if isinstance(transactions, PrefixIndex):
+        return prefix_line_data(transactions, start_m, start_y, end_m, end_y, granularity)
+    buckets = _as_buckets(transactions, start_m, start_y, end_m, end_y, granularity)
+    return line_from_buckets(buckets, start_m, start_y, end_m, end_y, granularity)
 
 def compute_pie_data_range(transactions, start_m, start_y, end_m, end_y, categories, expense=True):
     """
     Sums up amounts by category over all months in [startMonth, endMonth].
     
-    :param transactions: list of transaction dicts
+    :param transactions: list of transaction dicts, MonthlyBuckets, a TransactionFrame
+        or a PrefixIndex
     :param start_m, start_y: start month/year (int)
     :param end_m, end_y: end month/year (int)
     :param categories: list of category strings (e.g. ["Rent","Groceries","Utilities","Entertainment","Other"])
@@ -55,43 +231,20 @@ def compute_pie_data_range(transactions, start_m, start_y, end_m, end_y, categor
       "data": [600, 150.75, 120, 80, 0]
     }
     """
-    # Initialize totals for each category
-    totals = {cat: 0.0 for cat in categories}
-
-    # Generate a list of all (month, year) tuples
-    month_tuples = generate_month_range(start_m, start_y, end_m, end_y)
+    if isinstance(transactions, TransactionFrame):
+        return frame_pie_data(transactions, start_m, start_y, end_m, end_y, categories, expense)
+    if isinstance(transactions, PrefixIndex):
+        return prefix_pie_data(transactions, start_m, start_y, end_m, end_y, categories, expense)
+    buckets = _as_buckets(transactions, start_m, start_y, end_m, end_y)
+    return pie_from_buckets(buckets, start_m, start_y, end_m, end_y, categories, expense)
 
-    # Convert transaction data
-    for t in transactions:
-        day, mm, yyyy = parse_full_date(t.get('date', '01-01-1970'))
-
-        # Check if the transaction's month/year is within our range
-        if any((mm == m and yyyy == y) for (m, y) in month_tuples):
-            # Check type
-            if expense and t['type'] == 'spent':
-                cat = t.get('category', 'Other')
-                if cat not in categories:
-                    cat = 'Other'
-                totals[cat] += float(t['amount'])
-            elif not expense and t['type'] == 'receive':
-                cat = t.get('category', 'Other')
-                if cat not in categories:
-                    cat = 'Other'
-                totals[cat] += float(t['amount'])
-
-    # Build the result
-    labels = list(totals.keys())
-    data_values = [round(totals[c], 2) for c in labels]
-
-    return {
-        "labels": labels,
-        "data": data_values
-    }
-
-def compute_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category):
+def compute_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category, granularity='month'):
     """
     chart_type: "Income" or "Expense"
     category: a specific category (e.g. "Groceries" or "Salary")
+    transactions: list of transaction dicts, MonthlyBuckets, DailyBuckets, a TransactionFrame
+        or a PrefixIndex
+    granularity: as for compute_line_data
     
     Returns:
     {
@@ -99,29 +252,81 @@ def compute_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, c
       "data": [100.0, 200.0, ...]
     }
     """
-    is_expense = (chart_type.lower() == "expense")
-    txn_type = 'spent' if is_expense else 'receive'
-
-    months = generate_month_range(start_m, start_y, end_m, end_y)
-    labels = []
-    data_list = []
-
-    for (m, y) in months:
-        label_str = f"{m:02d}-{y}"
-        labels.append(label_str)
+    if isinstance(transactions, TransactionFrame):
+        return frame_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category, granularity)
+    if isinstance(transactions, PrefixIndex):
+        return prefix_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category, granularity)
+    buckets = _as_buckets(transactions, start_m, start_y, end_m, end_y, granularity)
+    return bar_from_buckets(buckets, start_m, start_y, end_m, end_y, chart_type, category, granularity)
 
-        monthly_total = 0.0
-
-        for t in transactions:
-            (dd, mm, yyyy) = parse_full_date(t.get('date', '01-01-1970'))
-            if mm == m and yyyy == y and t['type'] == txn_type:
-                # Only sum if category matches
-                if t.get('category') == category:
-                    monthly_total += float(t['amount'])
+def compute_dashboard_data(transactions, start_m, start_y, end_m, end_y,
+                           expense_categories, income_categories, bar_specs=()):
+    """
+    Computes every dashboard chart from a single aggregation pass.
+    
+    :param transactions: list of transaction dicts, MonthlyBuckets, a TransactionFrame
+        or a PrefixIndex
+    :param expense_categories, income_categories: category lists for the two pies
+    :param bar_specs: iterable of (chart_type, category) pairs, e.g. [("Expense", "Rent")]
+    
+    Returns:
+    {
+      "line": {...compute_line_data...},
+      "expensePie": {...compute_pie_data_range(expense=True)...},
+      "incomePie": {...compute_pie_data_range(expense=False)...},
+      "bars": [{"type": "Expense", "category": "Rent", "labels": [...], "data": [...]}]
+    }
+    """
+    bar_specs = list(bar_specs)
+    line, expense_pie, income_pie, *bars = compute_charts(
+        transactions, start_m, start_y, end_m, end_y,
+        [("line", None, None), ("pie/expense", None, None), ("pie/income", None, None)]
+        + [("bar", chart_type, category) for chart_type, category in bar_specs],
+        expense_categories, income_categories
+    )
+    return {
+        "line": line,
+        "expensePie": expense_pie,
+        "incomePie": income_pie,
+        "bars": [
+            {"type": chart_type, "category": category, **bar}
+            for (chart_type, category), bar in zip(bar_specs, bars)
+        ]
+    }
 
-        data_list.append(round(monthly_total, 2))
+def compute_charts(transactions, start_m, start_y, end_m, end_y, chart_specs,
+                   expense_categories, income_categories):
+    """
+    Computes several charts of one user from a single aggregation pass.
+    
+    :param chart_specs: list of (chart, chart_type, category) tuples, chart being
+        "line", "pie/expense", "pie/income" or "bar" (chart_type/category are
+        only used by "bar", e.g. ("bar", "Expense", "Rent"))
+    
+    Returns the chart dicts in the order of chart_specs, each shaped like the
+    matching compute_* function's result.
+    """
+    if isinstance(transactions, TransactionFrame):
+        source = transactions
+        line, pie, bar = frame_line_data, frame_pie_data, frame_bar_data
+    elif isinstance(transactions, PrefixIndex):
+        source = transactions
+        line, pie, bar = prefix_line_data, prefix_pie_data, prefix_bar_data
+    else:
+        source = _as_buckets(transactions, start_m, start_y, end_m, end_y)
+        line, pie, bar = line_from_buckets, pie_from_buckets, bar_from_buckets
 
-    return {
-        "labels": labels,
-        "data": data_list
-    }
\ No newline at end of file
+    window = (start_m, start_y, end_m, end_y)
+    charts = []
+    for chart, chart_type, category in chart_specs:
+        if chart == "line":
+            charts.append(line(source, *window))
+        elif chart == "pie/expense":
+            charts.append(pie(source, *window, expense_categories, True))
+        elif chart == "pie/income":
+            charts.append(pie(source, *window, income_categories, False))
+        elif chart == "bar":
+            charts.append(bar(source, *window, chart_type, category))
+        else:
+            raise ValueError(f"Unknown chart '{chart}'")
+    return charts
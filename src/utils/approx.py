@@ -0,0 +1,390 @@
+"""
+Approximate charts over a random sample of the transactions, and mergeable
+quantile sketches of transaction amounts.
+
+mode=approx charts aggregate at most `sample_size` rows, drawn uniformly
+without replacement from the N fetched, however long the history is. Only
+the aggregation is bounded: the N rows are still fetched and decoded. The total of
+any chart point (a month, quarter, ... of one type, and category for pies
+and bars) is estimated as N/n times the sample's total, and reported with
+its 95% confidence half-width
+
+    z * N * sqrt((1 - n/N) * s^2 / n)
+
+where s^2 is the sample variance of y_i = amount if row i belongs to the
+point, else 0. Every point is estimated as a domain of the one sample rather
+than as its own stratum: stratum sizes (rows per month) would take a pass
+over every row, which is the cost approx mode avoids. A sample that covers
+all the rows gives the exact totals, with zero error.
+
+Charts asked of pre-aggregated data (MonthlyBuckets from rollups or a
+snapshot, a PrefixIndex, ...) are computed exactly instead: that is cheaper
+than any sample, and they come back in the approximate shape with zero
+errors and "sampled"/"population" None.
+
+`deadline` bounds the scan (not the fetch) in time as well: the sample is drawn in random
+order, so the rows scanned before the deadline are themselves a uniform
+sample, just a smaller one (with wider error bounds). Such a result depends
+on timing, not only on the data: "approx.truncated" flags it (see
+is_truncated()), so it is not cached or validated like a repeatable one.
+
+distribution_data() charts quantiles of the amounts (median and p90 per
+month, ...) from QuantileSketches: one per month, merged into quarters and
+years, so sums-only buckets are not needed and memory does not grow with
+the number of rows.
+"""
+import math
+import random
+import time
+
+from .aggregator import DailyBuckets, MonthlyBuckets, compute_bar_data, compute_line_data, compute_pie_data_range
+from .calendar_index import DAY_GRANULARITIES, bucket_keys, bucket_label, calendar_index, date_ordinal, \
+    month_key_rollup
+from .date_utils import date_month_key, month_key_range
+from .frame import TransactionFrame
+from .prefix_index import PrefixIndex
+from .taxonomy import category_of, get_taxonomy
+
+MODES = ('exact', 'approx')
+
+# z of a two-sided 95% confidence interval
+Z_95 = 1.959963984540054
+
+# Rows scanned between deadline checks
+_DEADLINE_STRIDE = 1024
+
+
+def _cents(value):
+    return round(value, 2) + 0.0
+
+
+def sample_rows(transactions, size, seed=None):
+    """
+    Returns (sample, population): at most `size` rows drawn uniformly
+    without replacement, in random order, and the number of rows. When
+    every row fits, the sample is all of them, still shuffled: upstream
+    order is by date, and a scan cut short by its deadline must not be the
+    earliest months. The draw is deterministic for a given seed (e.g. the
+    data_version() of the transactions) and row count.
+    """
+    rows = list(transactions)
+    population = len(rows)
+    rng = random.Random(0 if seed is None else str(seed))
+    if population <= size:
+        rng.shuffle(rows)
+        return rows, population
+    return [rows[i] for i in rng.sample(range(population), max(size, 2))], population
+
+
+def _scan(sample, deadline):
+    """
+    Yields the sample's rows until `deadline` (a time.monotonic() value)
+    passes; the caller counts the rows it got.
+    """
+    for i, t in enumerate(sample):
+        if deadline is not None and i % _DEADLINE_STRIDE == 0 and i and time.monotonic() >= deadline:
+            return
+        yield t
+
+
+class _Estimates:
+    """
+    Per-key sums and sums of squares of the sampled amounts; see total().
+    """
+
+    def __init__(self):
+        self.sums = {}
+        self.squares = {}
+        self.sampled = 0
+        self.population = 0
+        self.truncated = False
+
+    def add(self, key, amount):
+        self.sums[key] = self.sums.get(key, 0.0) + amount
+        self.squares[key] = self.squares.get(key, 0.0) + amount * amount
+
+    def total(self, key):
+        """
+        (estimate, 95% half-width) of the population total of `key`.
+        """
+        n, population = self.sampled, self.population
+        if not n:
+            return 0.0, 0.0
+        s = self.sums.get(key, 0.0)
+        estimate = population / n * s
+        if n >= population:
+            return estimate, 0.0
+        variance = max(self.squares.get(key, 0.0) - s * s / n, 0.0) / (n - 1)
+        return estimate, Z_95 * population * math.sqrt(variance * (1 - n / population) / n)
+
+    def summary(self):
+        return {"sampled": self.sampled, "population": self.population, "confidence": 0.95,
+                "truncated": self.truncated}
+
+
+def _aggregated(transactions):
+    return isinstance(transactions, (MonthlyBuckets, DailyBuckets, PrefixIndex, TransactionFrame))
+
+
+def _exact(data, *series):
+    """
+    An exact chart payload in the approximate shape: a zero error list
+    next to each (values, errors) pair of `series`.
+    """
+    for values, errors in series:
+        data[errors] = [0.0] * len(data[values])
+    data["approx"] = {"sampled": None, "population": None, "confidence": 0.95, "truncated": False}
+    return data
+
+
+def is_truncated(data):
+    """
+    True if chart payload `data` comes from a scan its deadline cut short,
+    i.e. a rerun on the same data could return other values.
+    """
+    return isinstance(data, dict) and bool(data.get("approx", {}).get("truncated"))
+
+
+def _bucket_of(granularity):
+    if granularity in DAY_GRANULARITIES:
+        index = calendar_index()
+        return lambda t: index.bucket(date_ordinal(t.get('date', '01-01-1970')), granularity)
+    return lambda t: month_key_rollup(date_month_key(t.get('date', '01-01-1970')), granularity)
+
+
+def _estimate(transactions, start_m, start_y, end_m, end_y, key_of, sample_size, seed, deadline):
+    """
+    Scans a sample of the rows inside the window into _Estimates keyed by
+    key_of(row) (rows it maps to None are left out).
+    """
+    sample, population = sample_rows(transactions, sample_size, seed)
+    window = month_key_range(start_m, start_y, end_m, end_y)
+    estimates = _Estimates()
+    estimates.population = population
+    for t in _scan(sample, deadline):
+        estimates.sampled += 1
+        if date_month_key(t.get('date', '01-01-1970')) not in window:
+            continue
+        key = key_of(t)
+        if key is not None:
+            estimates.add(key, float(t['amount']))
+    estimates.truncated = estimates.sampled < len(sample)
+    return estimates
+
+
+def approx_line_data(transactions, start_m, start_y, end_m, end_y, granularity='month',
+                     sample_size=10000, seed=None, deadline=None):
+    """
+    compute_line_data estimated from a sample of a transaction list, plus
+    "incomeError"/"expenseError" (95% half-widths per point) and
+    "approx": {"sampled", "population", "confidence", "truncated"}.
+    """
+    if _aggregated(transactions):
+        return _exact(compute_line_data(transactions, start_m, start_y, end_m, end_y, granularity),
+                      ("incomeData", "incomeError"), ("expenseData", "expenseError"))
+    bucket = _bucket_of(granularity)
+    estimates = _estimate(
+        transactions, start_m, start_y, end_m, end_y,
+        lambda t: (bucket(t), t['type']), sample_size, seed, deadline
+    )
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    income = [estimates.total((k, 'receive')) for k in keys]
+    expense = [estimates.total((k, 'spent')) for k in keys]
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "incomeData": [_cents(v) for v, _ in income],
+        "expenseData": [_cents(v) for v, _ in expense],
+        "incomeError": [_cents(e) for _, e in income],
+        "expenseError": [_cents(e) for _, e in expense],
+        "approx": estimates.summary()
+    }
+
+
+def approx_pie_data(transactions, start_m, start_y, end_m, end_y, categories, expense=True,
+                    sample_size=10000, seed=None, deadline=None):
+    """
+    compute_pie_data_range estimated from a sample of a transaction list,
+    plus "error" (95% half-widths per category) and "approx" (see
+    approx_line_data). Unknown or missing categories are folded into 'Other'.
+    """
+    if _aggregated(transactions):
+        return _exact(compute_pie_data_range(transactions, start_m, start_y, end_m, end_y, categories, expense),
+                      ("data", "error"))
+    taxonomy = get_taxonomy()
+    txn_type = 'spent' if expense else 'receive'
+    estimates = _estimate(
+        transactions, start_m, start_y, end_m, end_y,
+        lambda t: taxonomy.code(category_of(t)) if t['type'] == txn_type else None,
+        sample_size, seed, deadline
+    )
+
+    # the codes are known now; fold them into slots like pie_totals does
+    slots = taxonomy.pie_slots(categories)
+    by_slot = _Estimates()
+    by_slot.sampled, by_slot.population, by_slot.truncated = \
+        estimates.sampled, estimates.population, estimates.truncated
+    for code in estimates.sums:
+        slot = slots[code]
+        if slot < 0:
+            raise KeyError(taxonomy.other)
+        by_slot.sums[slot] = by_slot.sums.get(slot, 0.0) + estimates.sums[code]
+        by_slot.squares[slot] = by_slot.squares.get(slot, 0.0) + estimates.squares[code]
+
+    totals = [by_slot.total(slot) for slot in range(len(categories))]
+    return {
+        "labels": list(categories),
+        "data": [_cents(v) for v, _ in totals],
+        "error": [_cents(e) for _, e in totals],
+        "approx": by_slot.summary()
+    }
+
+
+def approx_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category, granularity='month',
+                    sample_size=10000, seed=None, deadline=None):
+    """
+    compute_bar_data estimated from a sample of a transaction list, plus
+    "error" (95% half-widths per bar) and "approx" (see approx_line_data).
+    """
+    if _aggregated(transactions):
+        return _exact(compute_bar_data(transactions, start_m, start_y, end_m, end_y, chart_type, category, granularity),
+                      ("data", "error"))
+    canonical = get_taxonomy().canonical
+    txn_type = 'spent' if chart_type.lower() == "expense" else 'receive'
+    category = canonical(category)
+    bucket = _bucket_of(granularity)
+    estimates = _estimate(
+        transactions, start_m, start_y, end_m, end_y,
+        lambda t: bucket(t) if t['type'] == txn_type and canonical(category_of(t)) == category else None,
+        sample_size, seed, deadline
+    )
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    totals = [estimates.total(k) for k in keys]
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "data": [_cents(v) for v, _ in totals],
+        "error": [_cents(e) for _, e in totals],
+        "approx": estimates.summary()
+    }
+
+
+class QuantileSketch:
+    """
+    Mergeable sketch of the distribution of non-negative amounts (DDSketch
+    style): values fall into logarithmic bins gamma^(i-1) < v <= gamma^i, so
+    quantile() is within `relative_accuracy` of the true value of that rank.
+    Memory grows with log(max / min), not with the number of values.
+    Values <= 0 are counted in a separate zero bin.
+
+    :param relative_accuracy: e.g. 0.01 => quantiles within 1%
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        if value > 0:
+            i = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[i] = self.bins.get(i, 0) + 1
+        else:
+            self.zeros += 1
+        self.count += 1
+
+    def merge(self, other):
+        """
+        Adds the values of `other` (same relative_accuracy) to this sketch.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches of different relative accuracy")
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """
+        The value of rank q * (count - 1), or None for an empty sketch.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+# Series of distribution_data: (name, quantile)
+QUANTILES = (('median', 0.5), ('p90', 0.9))
+
+
+def distribution_data(transactions, start_m, start_y, end_m, end_y, txn_type='spent', granularity='month',
+                      relative_accuracy=0.01, sample_size=None, seed=None, deadline=None):
+    """
+    Returns:
+    {
+      "labels": ["01-2023", "02-2023", ...],
+      "median": [42.0, 39.9, ...],
+      "p90": [310.5, 290.0, ...],
+      "count": [120, 98, ...],
+      "relativeAccuracy": 0.01
+    }
+    Quantiles of the amounts of one transaction type per month, quarter or
+    year (None where there are no transactions). With `sample_size`, they
+    are estimated from a sample and "count" is scaled up to the population
+    (see approx_line_data for "approx"); quantiles need no scaling.
+
+    Raises ValueError for day and week granularity.
+    """
+    if granularity in DAY_GRANULARITIES:
+        raise ValueError(f"'{granularity}' distributions are not supported")
+    if sample_size is None:
+        sample, population = transactions, None
+    else:
+        sample, population = sample_rows(transactions, sample_size, seed)
+    window = month_key_range(start_m, start_y, end_m, end_y)
+
+    monthly = {}
+    sampled = 0
+    for t in _scan(sample, deadline):
+        sampled += 1
+        key = date_month_key(t.get('date', '01-01-1970'))
+        if t['type'] != txn_type or key not in window:
+            continue
+        sketch = monthly.get(key)
+        if sketch is None:
+            sketch = monthly[key] = QuantileSketch(relative_accuracy)
+        sketch.add(float(t['amount']))
+
+    sketches = {}
+    for key, sketch in monthly.items():
+        bucket = month_key_rollup(key, granularity)
+        if bucket in sketches:
+            sketches[bucket].merge(sketch)
+        else:
+            sketches[bucket] = sketch
+
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    empty = QuantileSketch(relative_accuracy)
+    data = {"labels": [bucket_label(k, granularity) for k in keys]}
+    for name, q in QUANTILES:
+        values = [sketches.get(k, empty).quantile(q) for k in keys]
+        data[name] = [None if v is None else _cents(v) for v in values]
+    scale = population / sampled if population and sampled else 1
+    data["count"] = [round(sketches.get(k, empty).count * scale) for k in keys]
+    data["relativeAccuracy"] = relative_accuracy
+    if population is not None:
+        data["approx"] = {"sampled": sampled, "population": population, "confidence": 0.95,
+                          "truncated": sampled < len(sample)}
+    return data
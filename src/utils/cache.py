@@ -0,0 +1,166 @@
+"""
+In-process cache for transactions fetched from the Transaction Service.
+"""
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+# How many list items to measure when estimating the size of a payload.
+_SIZE_SAMPLE = 64
+
+
+def estimate_size(value):
+    """
+    Approximate memory footprint of a cached value, in bytes.
+
+    - objects exposing `nbytes` (NumPy arrays, TransactionFrame) report it directly
+    - lists of transaction dicts are estimated from a small sample of rows
+    - dicts (e.g. MonthlyBuckets) are estimated from a sample of items
+    """
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        sample = value[:_SIZE_SAMPLE]
+        per_row = sum(_dict_size(row) for row in sample) / len(sample)
+        return sys.getsizeof(value) + int(per_row * len(value))
+    if isinstance(value, dict):
+        if not value:
+            return sys.getsizeof(value)
+        sample = list(islice(value.items(), _SIZE_SAMPLE))
+        per_item = sum(_item_size(k, v) for k, v in sample) / len(sample)
+        return sys.getsizeof(value) + int(per_item * len(value))
+    return sys.getsizeof(value)
+
+
+def _dict_size(row):
+    if not isinstance(row, dict):
+        return sys.getsizeof(row)
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+def _item_size(key, value):
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(key, tuple):
+        size += sum(sys.getsizeof(part) for part in key)
+    return size
+
+
+def auth_identity(token):
+    """
+    Stable, non-reversible identity for an Authorization header, so raw
+    tokens are never kept as cache keys.
+    """
+    if not token:
+        return ''
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class TransactionCache:
+    """
+    LRU cache with a TTL, bounded both by entry count and approximate bytes.
+
+    :param ttl: seconds an entry stays fresh; 0 disables the cache
+    :param max_entries: maximum number of cached users
+    :param max_bytes: approximate memory budget for all entries
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key => (expires_at, size, value)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    @staticmethod
+    def make_key(user_id, token, scope=None):
+        """
+        :param scope: optional hashable narrowing the entry (e.g. date window)
+        """
+        return (str(user_id), auth_identity(token), scope)
+
+    def get(self, key):
+        """
+        Returns the cached value, or None on a miss or expired entry.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Would evict everything else and still not fit.
+                return
+            self._entries[key] = (self._clock() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_user(self, user_id):
+        """
+        Drops every entry of `user_id`, whatever its auth identity or scope.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,187 @@
+"""
+Calendar index for charts at day, week, month, quarter or year granularity.
+
+Dates are turned into day ordinals (datetime.date.toordinal()) once per
+distinct date string. A CalendarIndex then maps a day ordinal to its week,
+month, quarter or year bucket with one list lookup, from tables precomputed
+for a span of years. Like month keys, bucket keys are integers that grow by
+one from each bucket to the next:
+- day: the day ordinal
+- week: (ordinal - 1) // 7; weeks start on Monday (ordinal 1 is a Monday)
+- month: month_key(month, year), see date_utils
+- quarter: year * 4 + (month - 1) // 3
+- year: the year
+
+Month, quarter and year keys are also derived from month keys by integer
+division, so monthly sums roll up without going back to the days.
+"""
+import calendar
+import datetime
+import threading
+from array import array
+from functools import lru_cache
+
+from .date_utils import DATE_CACHE_SIZE, month_from_key, month_key, parse_full_date
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+
+# Granularities that need per-day data; the others roll up from months.
+DAY_GRANULARITIES = ('day', 'week')
+
+
+def date_ordinal(dd_mm_yyyy):
+    """
+    Given "2023-11-03" => datetime.date(2023, 11, 3).toordinal().
+    Invalid dates map to 0, like date_month_key. A day past the end of its
+    month (e.g. "2023-02-30", accepted by parse_full_date) is clamped to the
+    month's last day, so daily totals add up to the monthly ones.
+    """
+    try:
+        return _date_ordinal(dd_mm_yyyy)
+    except TypeError:
+        return 0
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _date_ordinal(dd_mm_yyyy):
+    day, month, year = parse_full_date(dd_mm_yyyy)
+    if not month:
+        return 0
+    try:
+        return datetime.date(year, month, min(day, calendar.monthrange(year, month)[1])).toordinal()
+    except ValueError:  # year outside 1..9999
+        return 0
+
+
+def month_key_rollup(key, granularity):
+    """
+    The month/quarter/year bucket of month key `key`.
+    """
+    if granularity == 'month':
+        return key
+    if granularity == 'quarter':
+        return (key - 1) // 3
+    if granularity == 'year':
+        return (key - 1) // 12
+    raise ValueError(f"Granularity '{granularity}' cannot be derived from months")
+
+
+def _ordinal_bucket(ordinal, granularity):
+    if granularity == 'day':
+        return ordinal
+    if granularity == 'week':
+        return (ordinal - 1) // 7
+    d = datetime.date.fromordinal(ordinal)
+    return month_key_rollup(month_key(d.month, d.year), granularity)
+
+
+class CalendarIndex:
+    """
+    Day ordinal => bucket key tables for every granularity, covering
+    `first_year` through `last_year`. Ordinals outside the span (or 0, an
+    invalid date) fall back to computing the key, or 0 for invalid dates.
+    """
+
+    def __init__(self, first_year=1970, last_year=2099):
+        self.base = datetime.date(first_year, 1, 1).toordinal()
+        end = datetime.date(last_year, 12, 31).toordinal() + 1
+        self.tables = {granularity: array('l') for granularity in GRANULARITIES}
+        for ordinal in range(self.base, end):
+            d = datetime.date.fromordinal(ordinal)
+            key = month_key(d.month, d.year)
+            self.tables['day'].append(ordinal)
+            self.tables['week'].append((ordinal - 1) // 7)
+            self.tables['month'].append(key)
+            self.tables['quarter'].append((key - 1) // 3)
+            self.tables['year'].append(d.year)
+
+    def bucket(self, ordinal, granularity):
+        """
+        The `granularity` bucket key of a day ordinal.
+        """
+        table = self.tables[granularity]
+        i = ordinal - self.base
+        if 0 <= i < len(table):
+            return table[i]
+        if ordinal < 1:
+            return 0
+        return _ordinal_bucket(ordinal, granularity)
+
+
+_index_lock = threading.Lock()
+_calendar_index = None
+
+
+def calendar_index():
+    """
+    Returns the shared CalendarIndex, built on first use.
+    """
+    global _calendar_index
+    with _index_lock:
+        if _calendar_index is None:
+            _calendar_index = CalendarIndex()
+        return _calendar_index
+
+
+def window_ordinals(start_month, start_year, end_month, end_year):
+    """
+    The day ordinals of the months (start_month, start_year) through
+    (end_month, end_year), as a range. Empty for an invalid window.
+    """
+    try:
+        first = datetime.date(start_year, start_month, 1).toordinal()
+        end_m, end_y = month_from_key(month_key(end_month, end_year) + 1)
+        return range(first, datetime.date(end_y, end_m, 1).toordinal())
+    except ValueError:
+        return range(0)
+
+
+def bucket_keys(start_month, start_year, end_month, end_year, granularity):
+    """
+    The bucket keys covering the window at `granularity`, in order. Weeks,
+    quarters and years at the edges may extend past the window; only the
+    part inside it is counted.
+    """
+    if granularity in DAY_GRANULARITIES:
+        days = window_ordinals(start_month, start_year, end_month, end_year)
+        if not days:
+            return range(0)
+        return range(_ordinal_bucket(days.start, granularity), _ordinal_bucket(days.stop - 1, granularity) + 1)
+    first = month_key(start_month, start_year)
+    last = month_key(end_month, end_year)
+    if not (start_month and end_month) or last < first:
+        return range(0)
+    return range(month_key_rollup(first, granularity), month_key_rollup(last, granularity) + 1)
+
+
+def bucket_months(key, granularity):
+    """
+    The first and last month keys of a month/quarter/year bucket.
+    """
+    if granularity == 'month':
+        return key, key
+    if granularity == 'quarter':
+        return key * 3 + 1, key * 3 + 3
+    if granularity == 'year':
+        return key * 12 + 1, key * 12 + 12
+    raise ValueError(f"Granularity '{granularity}' cannot be derived from months")
+
+
+def bucket_label(key, granularity):
+    """
+    Chart label of a bucket key: "03-11-2023" (day), "W44-2023" (ISO week),
+    "11-2023" (month), "Q4-2023" (quarter) or "2023" (year).
+    """
+    if granularity == 'day':
+        d = datetime.date.fromordinal(key)
+        return f"{d.day:02d}-{d.month:02d}-{d.year}"
+    if granularity == 'week':
+        iso_year, iso_week, _ = datetime.date.fromordinal(key * 7 + 1).isocalendar()
+        return f"W{iso_week:02d}-{iso_year}"
+    if granularity == 'month':
+        m, y = month_from_key(key)
+        return f"{m:02d}-{y}"
+    if granularity == 'quarter':
+        y, q = divmod(key, 4)
+        return f"Q{q + 1}-{y}"
+    return str(key)
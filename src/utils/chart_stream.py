@@ -0,0 +1,339 @@
+"""
+Live chart updates for Server-Sent Events streams.
+
+A dashboard that polls re-fetches and re-aggregates the user's history on
+every poll. A stream instead subscribes to a ChartFeed: the user's monthly
+buckets, fetched once and shared by all of that user's open streams (per
+auth identity, like cached transactions). The feed is kept current by
+- ingest(): new transactions pushed by a webhook are bucketed and added;
+- poll(): every so often, the months from the feed's high-water mark (the
+  month that was still open at the last sync) through the current month are
+  re-fetched and replaced, as for rollups and snapshots;
+- reload(): a full re-fetch, for changes without details.
+Only subscriptions whose window contains a changed month recompute their
+charts - from the buckets, without going upstream - and only the chart
+points that changed are queued to the client.
+"""
+import queue
+import threading
+import time
+
+from .aggregator import MonthlyBuckets, bucket_transactions, compute_charts
+from .date_utils import month_from_key, month_key_range
+
+
+class StreamLimitExceeded(Exception):
+    """Raised by ChartStreams.subscribe() when max_subscriptions are open."""
+
+
+def chart_delta(old, new):
+    """
+    The points of chart payload `new` that differ from `old` (same labels):
+    {series: [[index, value], ...]}, e.g. {"expenseData": [[2, 70.0]]}.
+    """
+    delta = {}
+    for name, values in new.items():
+        if name == 'labels':
+            continue
+        before = old.get(name, ())
+        changed = [[i, v] for i, v in enumerate(values) if i >= len(before) or before[i] != v]
+        if changed:
+            delta[name] = changed
+    return delta
+
+
+def _month_keys(buckets):
+    return {yyyy * 12 + mm for (yyyy, mm, _, _) in buckets if mm}
+
+
+class ChartFeed:
+    """
+    One owner's monthly buckets and the subscriptions reading them. Guarded
+    by `lock`; `fetch(window)` (window None = whole history) is the fetch of
+    the subscription that opened the feed.
+    """
+
+    def __init__(self, owner, fetch):
+        self.owner = owner
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.buckets = None
+        self.high_water = None
+        self.polled_at = None
+        self.subscriptions = set()
+
+    def load(self, current_key, now):
+        self.buckets = MonthlyBuckets(bucket_transactions(self.fetch(None)))
+        self.high_water = current_key
+        self.polled_at = now
+
+    def replace(self, buckets, months=None):
+        """
+        Replaces the buckets of `months` (a month key range, None = all) with
+        `buckets`. Returns the month keys whose buckets were replaced.
+        """
+        if months is None:
+            changed = _month_keys(self.buckets) | _month_keys(buckets)
+            self.buckets = MonthlyBuckets(buckets)
+            return changed
+        for key in [k for k in self.buckets if k[0] * 12 + k[1] in months]:
+            del self.buckets[key]
+        self.buckets.update(buckets)
+        return set(months)
+
+    def add(self, buckets):
+        """
+        Adds the totals of `buckets` (new transactions). Returns their month keys.
+        """
+        for key, amount in buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0.0) + amount
+        return _month_keys(buckets)
+
+    def publish(self, months):
+        """
+        Queues the chart changes of every subscription whose window contains
+        one of `months`. Returns how many subscriptions got an update.
+        """
+        return sum(
+            subscription.publish() for subscription in list(self.subscriptions)
+            if not subscription.months.isdisjoint(months)
+        )
+
+
+class Subscription:
+    """
+    One open stream: a window and chart specs (see compute_charts) over a
+    ChartFeed, plus the queue of events not yet sent to the client. A client
+    that falls `max_pending` events behind gets a fresh snapshot instead.
+    """
+
+    def __init__(self, feed, window, chart_specs, expense_categories, income_categories, max_pending):
+        self.feed = feed
+        self.window = window
+        self.chart_specs = chart_specs
+        self.categories = (expense_categories, income_categories)
+        self.months = set(month_key_range(*window))
+        self.events = queue.Queue(max_pending)
+        self.charts = None
+
+    def publish(self):
+        """
+        Recomputes the charts from the feed's buckets (under the feed lock)
+        and queues ("snapshot", {"charts": [...]}) the first time, then
+        ("delta", {"charts": [{"index": i, "changes": chart_delta(...)}]})
+        for the charts that changed. Returns True if an event was queued.
+        """
+        charts = compute_charts(self.feed.buckets, *self.window, self.chart_specs, *self.categories)
+        if self.charts is None:
+            event = ("snapshot", {"charts": charts})
+        else:
+            changes = [
+                {"index": i, "changes": delta}
+                for i, delta in enumerate(chart_delta(old, new) for old, new in zip(self.charts, charts))
+                if delta
+            ]
+            if not changes:
+                return False
+            event = ("delta", {"charts": changes})
+        self.charts = charts
+        self._queue(event, charts)
+        return True
+
+    def _queue(self, event, charts):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # too slow to keep up with deltas: start over from a snapshot
+            while not self.events.empty():
+                self.events.get_nowait()
+            self.events.put_nowait(("snapshot", {"charts": charts}))
+
+    def next_event(self, timeout):
+        """
+        The next (event, data) to send, or None after `timeout` seconds.
+        """
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """
+    A Subscription read by a coroutine on `loop` (the ASGI app): events go
+    to an asyncio.Queue, so an idle stream holds no thread. publish() runs
+    in worker threads and hands each event over to the loop.
+    """
+
+    def __init__(self, feed, window, chart_specs, expense_categories, income_categories, max_pending, loop):
+        import asyncio  # loaded by the ASGI server already; kept out of the WSGI import path
+
+        super().__init__(feed, window, chart_specs, expense_categories, income_categories, max_pending)
+        self.events = asyncio.Queue(max_pending)
+        self.loop = loop
+
+    def _queue(self, event, charts):
+        try:
+            self.loop.call_soon_threadsafe(self._queue_now, event, charts)
+        except RuntimeError:
+            pass  # the loop has closed: nobody is reading this stream any more
+
+    def _queue_now(self, event, charts):
+        import asyncio
+
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.events.empty():
+                self.events.get_nowait()
+            self.events.put_nowait(("snapshot", {"charts": charts}))
+
+    async def next_event_async(self, timeout):
+        """
+        The next (event, data) to send, or None after `timeout` seconds.
+        """
+        import asyncio
+
+        try:
+            return await asyncio.wait_for(self.events.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChartStreams:
+    """
+    Registry of the open chart streams of this process.
+
+    :param max_subscriptions: open streams allowed at once
+    :param max_pending: queued events per stream (see Subscription)
+    :param clock: time source for poll intervals, in seconds
+    """
+
+    def __init__(self, max_subscriptions=1000, max_pending=64, clock=time.monotonic):
+        self.max_subscriptions = max_subscriptions
+        self.max_pending = max_pending
+        self.clock = clock
+        self.feeds = {}
+        self.open = 0
+        self.published = 0
+        self.polls = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, owner, fetch, window, chart_specs, expense_categories, income_categories, current_key,
+                  loop=None):
+        """
+        Opens a stream and queues its first snapshot. The owner's feed is
+        loaded (a full-history fetch) by its first subscriber; fetch errors
+        propagate. Raises StreamLimitExceeded when too many streams are open.
+        
+        :param loop: event loop of an async reader (returns an AsyncSubscription)
+        """
+        with self._lock:
+            if self.open >= self.max_subscriptions:
+                raise StreamLimitExceeded(f"{self.max_subscriptions} streams are already open.")
+            feed = self.feeds.get(owner)
+            if feed is None:
+                feed = self.feeds[owner] = ChartFeed(owner, fetch)
+            if loop is None:
+                subscription = Subscription(
+                    feed, window, chart_specs, expense_categories, income_categories, self.max_pending
+                )
+            else:
+                subscription = AsyncSubscription(
+                    feed, window, chart_specs, expense_categories, income_categories, self.max_pending, loop
+                )
+            feed.subscriptions.add(subscription)
+            self.open += 1
+
+        try:
+            with feed.lock:
+                if feed.buckets is None:
+                    feed.load(current_key, self.clock())
+                subscription.publish()
+        except Exception:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription):
+        feed = subscription.feed
+        with self._lock:
+            if subscription not in feed.subscriptions:
+                return
+            feed.subscriptions.discard(subscription)
+            self.open -= 1
+            if not feed.subscriptions and self.feeds.get(feed.owner) is feed:
+                del self.feeds[feed.owner]
+
+    def _feeds_of(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            return [feed for owner, feed in self.feeds.items() if owner[0] == user_id]
+
+    def ingest(self, user_id, buckets):
+        """
+        Adds `buckets` (bucket_transactions() of new transactions) to every
+        loaded feed of `user_id` and publishes the changes. Returns the
+        number of subscriptions updated.
+        """
+        updated = 0
+        for feed in self._feeds_of(user_id):
+            with feed.lock:
+                if feed.buckets is not None:
+                    updated += feed.publish(feed.add(buckets))
+        self._count(updated)
+        return updated
+
+    def reload(self, user_id):
+        """
+        Re-fetches the whole history of every feed of `user_id` and publishes
+        the changes. Returns the number of subscriptions updated.
+        """
+        updated = 0
+        for feed in self._feeds_of(user_id):
+            if feed.buckets is None:
+                continue
+            # fetch outside the lock, so ingest() and new streams do not wait on upstream
+            buckets = bucket_transactions(feed.fetch(None))
+            with feed.lock:
+                updated += feed.publish(feed.replace(buckets))
+        self._count(updated)
+        return updated
+
+    def poll(self, feed, interval, current_key):
+        """
+        If `interval` seconds have passed since the feed was last synced,
+        re-fetches its months from the high-water mark through `current_key`
+        and publishes the changes. Called by the streams themselves, so a
+        feed is polled once per interval however many streams read it.
+        Returns the number of subscriptions updated.
+        """
+        with feed.lock:
+            now = self.clock()
+            if feed.buckets is None or now - feed.polled_at < interval:
+                return 0
+            # claimed: the feed's other streams skip this interval's poll
+            feed.polled_at = now
+            window = month_from_key(feed.high_water) + month_from_key(current_key)
+
+        # fetch outside the lock, so ingest() and the other streams do not wait on upstream
+        buckets = bucket_transactions(feed.fetch(window), *window)
+        with feed.lock:
+            updated = feed.publish(feed.replace(buckets, month_key_range(*window)))
+            feed.high_water = current_key
+        self._count(updated, polls=1)
+        return updated
+
+    def _count(self, published, polls=0):
+        with self._lock:
+            self.published += published
+            self.polls += polls
+
+    def stats(self):
+        with self._lock:
+            return {
+                "feeds": len(self.feeds),
+                "subscriptions": self.open,
+                "published": self.published,
+                "polls": self.polls
+            }
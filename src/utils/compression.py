@@ -0,0 +1,103 @@
+"""
+Response compression: Accept-Encoding negotiation, whole-body and streaming
+gzip / brotli encoders.
+
+Brotli is optional (`pip install brotli`); without it only gzip is offered.
+Streaming encoders flush after every chunk, so a client reading a streamed
+response (e.g. NDJSON batch lines) still gets each chunk as soon as it is
+produced.
+"""
+import gzip
+import zlib
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised only when brotli is absent
+    brotli = None
+
+HAS_BROTLI = brotli is not None
+
+# Response types worth compressing; images and the like are left alone.
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def supported_encodings(preferred):
+    """
+    The encodings of `preferred` (e.g. ['br', 'gzip']) this process can
+    produce, in order.
+    """
+    return [e for e in preferred if e == 'gzip' or (e == 'br' and HAS_BROTLI)]
+
+
+def upstream_accept_encoding():
+    """
+    Accept-Encoding to send to the Transaction Service: what requests/aiohttp
+    can transparently decode here.
+    """
+    return 'gzip, deflate, br' if HAS_BROTLI else 'gzip, deflate'
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Returns the entry of `encodings` the client prefers, or None.
+
+    :param accept_encoding: Accept-Encoding header value (or a parsed Accept)
+    :param encodings: what the server offers, most preferred first; it wins ties
+    """
+    if not accept_encoding or not encodings:
+        return None
+    if not isinstance(accept_encoding, Accept):
+        accept_encoding = parse_accept_header(accept_encoding)
+    return accept_encoding.best_match(encodings)
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, level=None):
+    """
+    Compresses `data` (bytes) whole.
+
+    :param level: gzip level 1-9 / brotli quality 0-11 (None => default)
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level is None else level)
+    return gzip.compress(data, compresslevel=9 if level is None else level)
+
+
+def iter_compress(chunks, encoding, level=None):
+    """
+    Compresses an iterable of byte (or str) chunks, yielding compressed
+    output after each input chunk.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=11 if level is None else level)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(9 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+        finish = compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            out = process(chunk) + flush()
+            if out:
+                yield out
+    yield finish()
+
+
+def weak_etag(etag):
+    """
+    A compressed body is a different byte sequence than the identity one, so
+    its strong ETag is downgraded to a weak one (W/"...").
+    """
+    if etag and not etag.startswith('W/'):
+        return 'W/' + etag
+    return etag
@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+
 def parse_month_year(mm_yyyy):
     """
     Given "02-2023" => (2, 2023).
@@ -15,6 +18,11 @@ def parse_month_year(mm_yyyy):
         return (0, 0)
 
 
+# Distinct dates in a user's history number in the thousands at most, while
+# every chart pass parses each transaction's date again.
+DATE_CACHE_SIZE = 8192
+
+
 def parse_full_date(dd_mm_yyyy):
     """
     Given "03-11-2023" => (3, 11, 2023).
@@ -22,7 +30,16 @@ def parse_full_date(dd_mm_yyyy):
     For simplicity:
       - month must be 1..12
       - day must be 1..31
+    Results are memoized per date string (bounded LRU, see DATE_CACHE_SIZE).
     """
+    try:
+        return _parse_full_date(dd_mm_yyyy)
+    except TypeError:  # unhashable, e.g. a list sent in place of a date
+        return (0, 0, 0)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_full_date(dd_mm_yyyy):
     try:
         y, m, d = dd_mm_yyyy.split('-')
         day = int(d)
@@ -40,6 +57,49 @@ def parse_full_date(dd_mm_yyyy):
         return (0, 0, 0)
 
 
+def month_key(month, year):
+    """
+    Given (11, 2023) => 24287, i.e. year * 12 + month.
+    Consecutive months get consecutive keys, so comparing or bucketing
+    months is plain integer arithmetic.
+    """
+    return year * 12 + month
+
+
+def month_from_key(key):
+    """
+    Inverse of month_key: 24287 => (11, 2023).
+    """
+    year, month = divmod(key - 1, 12)
+    return (month + 1, year)
+
+
+def date_month_key(dd_mm_yyyy):
+    """
+    Given "2023-11-03" => month_key(11, 2023).
+    Invalid dates map to 0, like the (0, 0) month parse_full_date implies.
+    """
+    try:
+        return _date_month_key(dd_mm_yyyy)
+    except TypeError:
+        return 0
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _date_month_key(dd_mm_yyyy):
+    _, month, year = _parse_full_date(dd_mm_yyyy)
+    return year * 12 + month
+
+
+def month_key_range(start_month, start_year, end_month, end_year):
+    """
+    The month keys from (start_month, start_year) to (end_month, end_year)
+    inclusive, as a range: `key in month_key_range(...)` is an O(1) check,
+    unlike scanning generate_month_range(). Empty if the end precedes the start.
+    """
+    return range(month_key(start_month, start_year), month_key(end_month, end_year) + 1)
+
+
 def generate_month_range(start_month, start_year, end_month, end_year):
     """
     Creates a list of (month, year) pairs from (start_month, start_year)
@@ -0,0 +1,69 @@
+"""
+Bounded fan-out helpers for batch requests.
+
+fan_out() runs a function over many items on a thread pool while holding
+only a bounded number of results at a time, so a batch of thousands of
+users streams through in constant memory. process_pool() provides the
+shared process pool used to move CPU-bound aggregation off the GIL.
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+_pool_lock = threading.Lock()
+_process_pool = None
+
+
+def fan_out(items, work, max_workers, max_in_flight=None):
+    """
+    Yields (item, result, error) for each item as soon as work(item) is done,
+    in completion order; `error` is the exception work() raised, if any.
+
+    :param max_workers: threads running work() concurrently
+    :param max_in_flight: items submitted but not yet yielded (default
+        2 * max_workers); bounds memory regardless of len(items)
+
+    Closing the generator early cancels the items not started yet.
+    """
+    max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+    items = iter(items)
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    def submit(count):
+        for item in islice(items, count):
+            pending[pool.submit(work, item)] = item
+
+    try:
+        submit(max_in_flight)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            finished = [(pending.pop(future), future) for future in done]
+            submit(len(finished))
+            for item, future in finished:
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def process_pool(processes, initializer=None, initargs=()):
+    """
+    Returns the shared ProcessPoolExecutor with `processes` workers (created
+    on first use). Workers are spawned rather than forked, since the serving
+    process is multi-threaded; `initializer(*initargs)` runs in each worker
+    when it starts, e.g. to install process-wide settings.
+    """
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # imported here: multiprocessing is only needed once a batch uses processes
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _process_pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                initializer=initializer, initargs=initargs
+            )
+        return _process_pool
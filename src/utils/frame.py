@@ -0,0 +1,228 @@
+"""
+Columnar (NumPy) representation of a user's transactions.
+
+The aggregators in aggregator.py work on a list of transaction dicts. When
+NumPy is installed, the same list can be converted once into parallel arrays
+and every chart becomes a vectorized group-by sum. NumPy is optional: without
+it, to_frame() hands the list back unchanged and the pure-Python bucket engine
+is used instead.
+
+NumPy is imported on first use (the first frame built), not with this
+module, so processes that never build a frame do not pay for it at startup.
+"""
+import importlib.util
+import sys
+
+from .calendar_index import bucket_keys, bucket_label, date_ordinal
+from .date_utils import date_month_key, month_key
+from .taxonomy import category_of, get_taxonomy
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+np = None  # the numpy module once _numpy() has imported it
+
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+# Small integer codes for the transaction "type" column. 0 => anything else.
+TYPE_CODES = {'receive': 1, 'spent': 2}
+
+
+class TransactionFrame:
+    """
+    Parallel arrays, one entry per transaction:
+    - amount (float64)
+    - month_key (int64): year * 12 + month, see date_utils.date_month_key
+    - day (int32): day ordinal, see calendar_index.date_ordinal
+    - type_code (int8): see TYPE_CODES
+    - category_code (int32): index into self.categories
+
+    self.categories holds the distinct canonical category names (see
+    taxonomy; None if the transaction had no category) in first-seen order.
+    Codes are per frame, so a frame stays valid in a process (e.g. a batch
+    worker) whose taxonomy has seen other categories. `version` and `etag`
+    are carried over from the TransactionList the frame was built from.
+    """
+
+    def __init__(self, amount, month_key, day, type_code, category_code, categories):
+        self.amount = amount
+        self.month_key = month_key
+        self.day = day
+        self.type_code = type_code
+        self.category_code = category_code
+        self.categories = categories
+        self.category_index = {cat: i for i, cat in enumerate(categories)}  # canonical name => code
+        self.version = None
+        self.etag = None
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def nbytes(self):
+        columns = (self.amount, self.month_key, self.day, self.type_code, self.category_code)
+        return sum(c.nbytes for c in columns) + sys.getsizeof(self.categories)
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """
+        Builds the frame in one pass over the decoded `resp.json()` payload.
+        """
+        np = _numpy()
+        canonical = get_taxonomy().canonical
+        amounts = []
+        keys = []
+        days = []
+        types = []
+        cat_codes = []
+        category_index = {}
+        raw_codes = {}  # raw value => code: one lookup per row, aliases resolved once
+
+        for t in transactions:
+            cat = category_of(t)
+            code = raw_codes.get(cat)
+            if code is None:
+                code = raw_codes[cat] = category_index.setdefault(canonical(cat), len(category_index))
+
+            amounts.append(float(t['amount']))
+            date = t.get('date', '01-01-1970')
+            keys.append(date_month_key(date))
+            days.append(date_ordinal(date))
+            types.append(TYPE_CODES.get(t['type'], 0))
+            cat_codes.append(code)
+
+        return cls(
+            np.array(amounts, dtype=np.float64),
+            np.array(keys, dtype=np.int64),
+            np.array(days, dtype=np.int32),
+            np.array(types, dtype=np.int8),
+            np.array(cat_codes, dtype=np.int32),
+            list(category_index)
+        )
+
+
+def to_frame(transactions):
+    """
+    Returns a TransactionFrame when NumPy is available, otherwise the
+    transaction list as-is (the aggregators accept either).
+
+    A frame reads the amount and type of every row, while the list engine
+    only reads those of rows inside the chart's window. So a list with a
+    malformed row (no amount or type, an amount that is not a number) is
+    also returned as-is: a bad row outside the window must not fail charts
+    that never look at it.
+    """
+    if not HAS_NUMPY or isinstance(transactions, TransactionFrame):
+        return transactions
+    try:
+        frame = TransactionFrame.from_transactions(transactions)
+    except (KeyError, TypeError, ValueError):
+        return transactions
+    frame.version = getattr(transactions, 'version', None)
+    frame.etag = getattr(transactions, 'etag', None)
+    return frame
+
+
+def _window_mask(frame, txn_type, start_m, start_y, end_m, end_y):
+    lo = month_key(start_m, start_y)
+    hi = month_key(end_m, end_y)
+    mask = (frame.month_key >= lo) & (frame.month_key <= hi)
+    mask &= frame.type_code == TYPE_CODES[txn_type]
+    return mask
+
+
+def _bucket_column(frame, granularity):
+    """
+    Bucket key of every row at `granularity`, see calendar_index.
+    """
+    if granularity == 'day':
+        return frame.day
+    if granularity == 'week':
+        return (frame.day - 1) // 7
+    if granularity == 'quarter':
+        return (frame.month_key - 1) // 3
+    if granularity == 'year':
+        return (frame.month_key - 1) // 12
+    return frame.month_key
+
+
+def _bucket_sums(frame, mask, keys, granularity='month'):
+    """
+    Sums amount[mask] into one slot per bucket key of `keys` (a range).
+    """
+    if len(keys) == 0:
+        return []
+    np = _numpy()
+    sums = np.bincount(
+        _bucket_column(frame, granularity)[mask] - keys.start,
+        weights=frame.amount[mask],
+        minlength=len(keys)
+    )
+    return [round(float(v), 2) for v in sums[:len(keys)]]
+
+
+def frame_line_data(frame, start_m, start_y, end_m, end_y, granularity='month'):
+    """
+    Vectorized compute_line_data.
+    """
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    income_mask = _window_mask(frame, 'receive', start_m, start_y, end_m, end_y)
+    expense_mask = _window_mask(frame, 'spent', start_m, start_y, end_m, end_y)
+
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "incomeData": _bucket_sums(frame, income_mask, keys, granularity),
+        "expenseData": _bucket_sums(frame, expense_mask, keys, granularity)
+    }
+
+
+def frame_pie_data(frame, start_m, start_y, end_m, end_y, categories, expense=True):
+    """
+    Vectorized compute_pie_data_range. Frame categories that are not in
+    `categories` are folded into 'Other' (the taxonomy's `other` category).
+    """
+    txn_type = 'spent' if expense else 'receive'
+    mask = _window_mask(frame, txn_type, start_m, start_y, end_m, end_y)
+
+    # frame code => pie slot, through the taxonomy's compiled slots
+    taxonomy = get_taxonomy()
+    codes = [taxonomy.code(cat) for cat in frame.categories]
+    pie_slots = taxonomy.pie_slots(categories)
+    np = _numpy()
+    lookup = np.array([pie_slots[code] for code in codes] or [0], dtype=np.int64)
+
+    slots = lookup[frame.category_code[mask]]
+    if (slots == -1).any():
+        raise KeyError(taxonomy.other)
+
+    totals = np.bincount(slots, weights=frame.amount[mask], minlength=len(categories))
+    return {
+        "labels": list(categories),
+        "data": [round(float(v), 2) for v in totals[:len(categories)]]
+    }
+
+
+def frame_bar_data(frame, start_m, start_y, end_m, end_y, chart_type, category, granularity='month'):
+    """
+    Vectorized compute_bar_data.
+    """
+    is_expense = (chart_type.lower() == "expense")
+    txn_type = 'spent' if is_expense else 'receive'
+
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    mask = _window_mask(frame, txn_type, start_m, start_y, end_m, end_y)
+    code = frame.category_index.get(get_taxonomy().canonical(category))
+    if code is None:
+        mask &= False
+    else:
+        mask &= frame.category_code == code
+
+    return {
+        "labels": [bucket_label(k, granularity) for k in keys],
+        "data": _bucket_sums(frame, mask, keys, granularity)
+    }
@@ -0,0 +1,61 @@
+"""
+HTTP caching helpers for the chart endpoints.
+
+Every fetched transaction set carries a `version`: the Transaction Service's
+ETag when it sends one, otherwise a hash of the response body (or of the
+buckets, for aggregated data). A chart's ETag hashes that version with the
+route and query, so it can be checked against If-None-Match before the
+chart is aggregated or serialized.
+"""
+import hashlib
+
+from werkzeug.http import parse_etags, quote_etag
+
+from .aggregator import DailyBuckets, MonthlyBuckets
+
+
+def content_version(*bodies):
+    """
+    Version of one or more raw upstream response bodies (bytes).
+    """
+    digest = hashlib.sha1()
+    for body in bodies:
+        digest.update(body)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def data_version(transactions):
+    """
+    Returns the version of a fetched transaction set, or None if unknown.
+    Monthly/DailyBuckets are small, so they are hashed on first use.
+    """
+    version = getattr(transactions, 'version', None)
+    if version is None and isinstance(transactions, (MonthlyBuckets, DailyBuckets)):
+        items = sorted(transactions.items(), key=repr)
+        version = transactions.version = hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+    return version
+
+
+def chart_etag(version, chart, args):
+    """
+    Returns the quoted ETag of a chart response.
+
+    :param version: data_version() of the transactions the chart is built from
+    :param chart: route of the chart, e.g. '/line'
+    :param args: (name, value) query pairs, in any order
+    """
+    digest = hashlib.sha1(f"{version}\n{chart}\n".encode('utf-8'))
+    for name, value in sorted(args):
+        digest.update(f"{name}={value}&".encode('utf-8'))
+    return quote_etag(digest.hexdigest())
+
+
+def etag_matches(if_none_match, etag):
+    """
+    True if an If-None-Match header value matches the quoted `etag`
+    (weak comparison, '*' matches anything).
+    """
+    if not if_none_match:
+        return False
+    return parse_etags(if_none_match).contains_weak(etag.strip('"'))
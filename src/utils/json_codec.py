@@ -0,0 +1,120 @@
+"""
+JSON encoding and decoding for responses and upstream payloads.
+
+make_codec() returns an orjson-backed codec when orjson is installed
+(`pip install orjson`, several times faster than the standard library in
+both directions) and a standard-library one otherwise. CodecJSONProvider
+plugs a codec into Flask, so jsonify() uses it too.
+"""
+import json
+import logging
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only when orjson is absent
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+logger = logging.getLogger(__name__)
+
+JSON_ENGINES = ('auto', 'orjson', 'stdlib')
+
+
+class JSONCodec:
+    """
+    Standard-library JSON.
+
+    `decoder_class` can be passed as `cls` to APIs built on json.loads(),
+    such as requests' resp.json(cls=...).
+    """
+
+    name = 'stdlib'
+    decoder_class = json.JSONDecoder
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        """
+        Returns `obj` encoded as UTF-8 bytes.
+
+        :param default: called for objects the encoder does not support
+        """
+        return json.dumps(obj, default=default, sort_keys=sort_keys).encode('utf-8')
+
+    def loads(self, data):
+        """
+        Decodes bytes or str. Raises ValueError on invalid JSON.
+        """
+        return json.loads(data)
+
+
+if HAS_ORJSON:
+    class _OrjsonDecoder(json.JSONDecoder):
+        def decode(self, s, _w=None):
+            return orjson.loads(s)
+
+    class OrjsonCodec(JSONCodec):
+        """
+        orjson: compact output, str/int/float dict keys, NumPy scalars and
+        arrays. datetimes go through `default` like with the standard library.
+        """
+
+        name = 'orjson'
+        decoder_class = _OrjsonDecoder
+        OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(self, obj, default=None, sort_keys=False):
+            option = self.OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else self.OPTIONS
+            return orjson.dumps(obj, default=default, option=option)
+
+        def loads(self, data):
+            return orjson.loads(data)
+
+
+def make_codec(engine='auto'):
+    """
+    Builds the codec named by JSON_ENGINE: 'auto' (orjson if installed),
+    'orjson' (falls back to the standard library with a warning when it is
+    missing) or 'stdlib'. Raises ValueError for anything else.
+    """
+    if engine not in JSON_ENGINES:
+        raise ValueError(f"Unknown JSON engine {engine!r}, expected one of {', '.join(JSON_ENGINES)}.")
+    if engine == 'stdlib':
+        return JSONCodec()
+    if not HAS_ORJSON:
+        if engine == 'orjson':
+            logger.warning("JSON_ENGINE=orjson but orjson is not installed, using the standard library")
+        return JSONCodec()
+    return OrjsonCodec()
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes and decodes with `codec`, keeping
+    Flask's conventions: sorted keys, default() for dates, decimals and
+    dataclasses, and a trailing newline. Indented debug output and calls with
+    extra json.dumps() arguments still go through the standard library.
+    """
+
+    def __init__(self, app, codec):
+        super().__init__(app)
+        self.codec = codec
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.codec.dumps(obj, default=self.default, sort_keys=self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self.codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and current_app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.codec.dumps(obj, default=self.default, sort_keys=self.sort_keys) + b"\n"
+        return current_app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,90 @@
+"""
+Incremental parsing of a top-level JSON array.
+
+iter_json_array() turns a stream of byte chunks (e.g. requests'
+`resp.iter_content()`) into a stream of decoded elements, so a large
+transaction list never has to be held in memory as a whole.
+"""
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """
+    Yields each element of the JSON array spread over `chunks`.
+
+    :param chunks: iterable of bytes (or str) fragments of one JSON document
+    :param encoding: text encoding of byte chunks
+
+    Raises ValueError if the document is not an array or is truncated.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buf = ''
+    pos = 0
+    started = False
+    expect_value = True
+    count = 0
+
+    chunks = iter(chunks)
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk)
+        buf = buf[pos:] + chunk
+        pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            ch = buf[pos]
+            if not started:
+                if ch != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if ch == ']':
+                if expect_value and count:
+                    raise ValueError(f"Unexpected ']' after ',' at offset {pos}")
+                _check_trailing(buf[pos + 1:], chunks, text_decoder)
+                return
+            if ch == ',':
+                if expect_value:
+                    raise ValueError(f"Unexpected ',' at offset {pos}")
+                expect_value = True
+                pos += 1
+                continue
+            if not expect_value:
+                raise ValueError(f"Expected ',' or ']' at offset {pos}")
+
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if not isinstance(element, (dict, list, str)) and \
+                    (end == len(buf) or buf[end] not in _DELIMITERS):
+                break  # a bare number might still be growing (e.g. "12." + "5")
+            yield element
+            count += 1
+            pos = end
+            expect_value = False
+
+    raise ValueError("Truncated JSON array")
+
+
+def _check_trailing(rest, chunks, text_decoder):
+    """
+    Only whitespace may follow the closing bracket (drains the stream).
+    """
+    for chunk in chunks:
+        rest += text_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if rest.strip(_WHITESPACE):
+            break
+    if rest.strip(_WHITESPACE):
+        raise ValueError("Unexpected data after JSON array")
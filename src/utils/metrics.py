@@ -0,0 +1,247 @@
+"""
+Request instrumentation: per-stage timers, histograms and counters rendered
+in the Prometheus text exposition format, plus Server-Timing values.
+
+Stages are timed with `instrumentation.stage(name)`; durations go to the
+analytics_stage_seconds histogram and, while a request is being served
+(start_request/finish_request), into that request's timings, which can be
+sent back as a Server-Timing header. When disabled, stage() hands back a
+shared no-op context manager so the hot path only pays for an attribute check.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TRANSACTION_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+MONTH_BUCKETS = (1, 3, 6, 12, 24, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # labels => [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    """
+    :param enabled: when False every hook is a no-op and nothing is recorded
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._timings = contextvars.ContextVar('request_timings', default=None)
+        self._collectors = []
+        self.requests = Counter(
+            'analytics_requests_total', 'Requests served, by endpoint and status.', ['endpoint', 'status']
+        )
+        self.request_seconds = Histogram(
+            'analytics_request_seconds', 'End-to-end request duration.', LATENCY_BUCKETS, ['endpoint']
+        )
+        self.stage_seconds = Histogram(
+            'analytics_stage_seconds', 'Time spent per request stage (fetch, decode, aggregate, serialize).',
+            LATENCY_BUCKETS, ['stage']
+        )
+        self.transactions = Histogram(
+            'analytics_request_transactions', 'Transactions behind one chart request.', TRANSACTION_BUCKETS
+        )
+        self.months = Histogram(
+            'analytics_request_months', 'Months in the requested chart window.', MONTH_BUCKETS
+        )
+
+    def stage(self, name):
+        """
+        Context manager timing one stage of the current request.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def record_stage(self, name, seconds):
+        self.stage_seconds.observe(seconds, name)
+        timings = self._timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    def observe_workload(self, transaction_count=None, month_count=None):
+        if not self.enabled:
+            return
+        if transaction_count is not None:
+            self.transactions.observe(transaction_count)
+        if month_count is not None:
+            self.months.observe(month_count)
+
+    def start_request(self):
+        """
+        Starts collecting stage timings for the request served by the current
+        thread/task. Returns a token for finish_request().
+        """
+        if not self.enabled:
+            return None
+        return (self._timings.set({}), time.perf_counter())
+
+    def finish_request(self, token, endpoint, status):
+        """
+        Records the request and returns its {stage: seconds} timings.
+        """
+        if token is None:
+            return {}
+        context_token, start = token
+        timings = self._timings.get() or {}
+        self._timings.reset(context_token)
+        self.requests.inc(endpoint, str(status))
+        self.request_seconds.observe(time.perf_counter() - start, endpoint)
+        return timings
+
+    def add_collector(self, collect):
+        """
+        Registers collect() => iterable of (name, type, help, [(labels dict, value)]),
+        called at scrape time (e.g. to export cache counters).
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in (self.requests, self.request_seconds, self.stage_seconds, self.transactions, self.months):
+            lines.extend(metric.render())
+        collected = {}  # several collectors may export the same metric
+        for collect in self._collectors:
+            for name, metric_type, help_text, samples in collect():
+                collected.setdefault(name, (metric_type, help_text, []))[2].extend(samples)
+        for name, (metric_type, help_text, samples) in collected.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                rendered = _format_labels(labels.keys(), labels.values())
+                lines.append(f"{name}{rendered} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def stats_collector(prefix, label, sources, counters=()):
+    """
+    Builds a collector exporting the stats() dicts of several objects, e.g.
+    stats_collector('analytics_cache', 'cache', {'transactions': cache}, ['hits'])
+    => analytics_cache_hits_total{cache="transactions"} 12, analytics_cache_entries{...} 3.
+
+    :param sources: {label value: object with a stats() method}
+    :param counters: stats keys exported as counters; the rest are gauges
+    """
+    def collect():
+        series = {}
+        for value, source in sources.items():
+            for key, number in source.stats().items():
+                series.setdefault(key, []).append(({label: value}, number))
+        for key, samples in series.items():
+            if key in counters:
+                yield f"{prefix}_{key}_total", 'counter', f"{prefix} {key}.", samples
+            else:
+                yield f"{prefix}_{key}", 'gauge', f"{prefix} {key}.", samples
+    return collect
+
+
+def server_timing(timings):
+    """
+    {stage: seconds} => Server-Timing header value, e.g. "fetch;dur=12.3, aggregate;dur=1.1".
+    """
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+instrumentation = Instrumentation()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
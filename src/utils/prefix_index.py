@@ -0,0 +1,164 @@
+"""
+Prefix-sum index over a user's monthly totals.
+
+A date-range slider fires many chart requests that differ only in their
+window. Rather than rescanning the transactions for each, PrefixIndex keeps
+cumulative monthly sums per (type, category) and per type over the whole
+history, so the total of any month range is one subtraction:
+
+    total(lo..hi) = sums[hi + 1] - sums[lo]
+
+A pie chart is then O(categories) and a line or bar chart O(buckets drawn),
+however many transactions or months the history holds.
+
+Sums are kept in integer cents: each month's total is rounded to the cent
+once, and the running sums and subtractions are then exact however large
+they grow, where float running sums would carry their rounding error into
+every window. For amounts in whole cents the prefix_* chart functions
+return the list engine's values to the cent; sub-cent amounts are rounded
+per month rather than per window. Day and week charts need per-day data
+and are not supported.
+"""
+import sys
+from itertools import accumulate
+
+from .calendar_index import DAY_GRANULARITIES, bucket_keys, bucket_label, bucket_months
+from .date_utils import month_key
+from .taxonomy import get_taxonomy
+
+
+def _cumulative(values):
+    return list(accumulate((round(value * 100) for value in values), initial=0))
+
+
+def _cents(cents):
+    # + 0.0 turns the int (or the 0 of an empty pie slot) into a float
+    return cents / 100 + 0.0
+
+
+class PrefixIndex:
+    """
+    :param first_key: month key of the first month of the history
+    :param category_sums: {(type, category): cumulative sums, in cents}
+    :param type_sums: {type: cumulative sums over every category, in cents}
+
+    Each cumulative list has one entry more than the history has months:
+    sums[i] is the total of months first_key .. first_key + i - 1, as an int
+    number of cents. `version`
+    is set by whoever builds the index (see http_cache.data_version).
+    """
+
+    def __init__(self, first_key, category_sums, type_sums):
+        self.first_key = first_key
+        self.category_sums = category_sums
+        self.type_sums = type_sums
+        self.months = len(next(iter(type_sums.values()), [0])) - 1
+        self.version = None
+
+    @classmethod
+    def from_buckets(cls, buckets):
+        """
+        Builds the index from MonthlyBuckets in one pass over the buckets.
+        Buckets of invalid dates (month 0) are left out, as every chart
+        window leaves them out.
+        """
+        keys = [yyyy * 12 + mm for (yyyy, mm, _, _) in buckets if mm]
+        if not keys:
+            return cls(0, {}, {})
+        first_key = min(keys)
+        n_months = max(keys) - first_key + 1
+
+        monthly = {}
+        for (yyyy, mm, t_type, cat), amount in buckets.items():
+            if mm:
+                monthly.setdefault((t_type, cat), [0.0] * n_months)[yyyy * 12 + mm - first_key] += amount
+
+        by_type = {}
+        for (t_type, _), values in monthly.items():
+            totals = by_type.setdefault(t_type, [0.0] * n_months)
+            for i, value in enumerate(values):
+                totals[i] += value
+
+        return cls(
+            first_key,
+            {series: _cumulative(values) for series, values in monthly.items()},
+            {t_type: _cumulative(values) for t_type, values in by_type.items()}
+        )
+
+    def __len__(self):
+        return self.months
+
+    @property
+    def nbytes(self):
+        series = list(self.category_sums.values()) + list(self.type_sums.values())
+        # a list slot plus an int object per entry
+        return sum(sys.getsizeof(s) + 24 * len(s) for s in series) + sys.getsizeof(self.category_sums)
+
+    def total(self, sums, lo_key, hi_key):
+        """
+        Sum of months lo_key..hi_key (inclusive) of one cumulative list, in
+        cents.
+        """
+        if sums is None:
+            return 0
+        lo = max(lo_key - self.first_key, 0)
+        hi = min(hi_key - self.first_key + 1, self.months)
+        if hi <= lo:
+            return 0
+        return sums[hi] - sums[lo]
+
+    def category_totals(self, txn_type, lo_key, hi_key):
+        """
+        {category: total in cents} of one type over months lo_key..hi_key.
+        """
+        return {
+            cat: self.total(sums, lo_key, hi_key)
+            for (t_type, cat), sums in self.category_sums.items() if t_type == txn_type
+        }
+
+
+def _series(index, sums, start_m, start_y, end_m, end_y, granularity):
+    if granularity in DAY_GRANULARITIES:
+        raise ValueError(f"'{granularity}' charts need per-day data, not a PrefixIndex")
+    lo, hi = month_key(start_m, start_y), month_key(end_m, end_y)
+    keys = bucket_keys(start_m, start_y, end_m, end_y, granularity)
+    values = []
+    for k in keys:
+        first, last = bucket_months(k, granularity)
+        values.append(_cents(index.total(sums, max(first, lo), min(last, hi))))
+    return [bucket_label(k, granularity) for k in keys], values
+
+
+def prefix_line_data(index, start_m, start_y, end_m, end_y, granularity='month'):
+    """
+    compute_line_data answered from a PrefixIndex.
+    """
+    window = (start_m, start_y, end_m, end_y)
+    labels, income = _series(index, index.type_sums.get('receive'), *window, granularity)
+    _, expense = _series(index, index.type_sums.get('spent'), *window, granularity)
+    return {"labels": labels, "incomeData": income, "expenseData": expense}
+
+
+def prefix_pie_data(index, start_m, start_y, end_m, end_y, categories, expense=True):
+    """
+    compute_pie_data_range answered from a PrefixIndex in O(categories).
+    Unknown or missing categories are folded into 'Other'.
+    """
+    txn_type = 'spent' if expense else 'receive'
+    lo, hi = month_key(start_m, start_y), month_key(end_m, end_y)
+
+    totals = get_taxonomy().pie_totals(categories, index.category_totals(txn_type, lo, hi).items())
+    return {
+        "labels": list(categories),
+        "data": [_cents(total) for total in totals]
+    }
+
+
+def prefix_bar_data(index, start_m, start_y, end_m, end_y, chart_type, category, granularity='month'):
+    """
+    compute_bar_data answered from a PrefixIndex.
+    """
+    txn_type = 'spent' if chart_type.lower() == "expense" else 'receive'
+    sums = index.category_sums.get((txn_type, get_taxonomy().canonical(category)))
+    labels, data = _series(index, sums, start_m, start_y, end_m, end_y, granularity)
+    return {"labels": labels, "data": data}
@@ -0,0 +1,355 @@
+"""
+Materialized monthly rollups per user.
+
+A month is closed once the calendar has moved past it: its (type, category)
+sums no longer change, so they are aggregated once and kept in a rollup
+store. A chart window is then answered from the stored closed months, and
+only the months that are missing or still open are fetched and aggregated
+again. Stores are pluggable (in-memory or SQLite); invalidate() is the hook
+for back-dated or edited transactions.
+"""
+import datetime
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .aggregator import MonthlyBuckets, bucket_transactions
+from .cache import auth_identity
+from .date_utils import month_from_key, month_key, month_key_range
+
+
+def current_month_key(today=None):
+    """
+    month_key of the current (open) month; every earlier month is closed.
+    """
+    today = today or datetime.date.today()
+    return month_key(today.month, today.year)
+
+
+def rollup_owner(user_id, token):
+    """
+    Rollups are kept per (userId, auth identity), like cached transactions.
+    """
+    return (str(user_id), auth_identity(token))
+
+
+class RollupStore:
+    """
+    Interface of a rollup store. `owner` is a rollup_owner() tuple and month
+    keys are date_utils.month_key values.
+    """
+
+    def missing_months(self, owner, month_keys):
+        """
+        Returns the keys in `month_keys` that have not been materialized.
+        """
+        raise NotImplementedError
+
+    def load(self, owner, month_keys):
+        """
+        Returns MonthlyBuckets with the stored sums of `month_keys`.
+        """
+        raise NotImplementedError
+
+    def save(self, owner, month_keys, buckets):
+        """
+        Materializes `month_keys` (months without transactions included),
+        replacing what was stored for them with their sums from `buckets`.
+        """
+        raise NotImplementedError
+
+    def invalidate(self, user_id=None, month_keys=None):
+        """
+        Drops rollups of `user_id` (every auth identity), or of every user if
+        None, restricted to `month_keys` if given.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        self.invalidate()
+
+    def reopen(self):
+        """
+        Called in a worker process forked after the store was created.
+        """
+
+
+class MemoryRollupStore(RollupStore):
+    """
+    Rollups in a dict, bounded to the `max_owners` most recently used owners.
+    """
+
+    def __init__(self, max_owners=10000):
+        self.max_owners = max_owners
+        self._lock = threading.Lock()
+        self._owners = OrderedDict()  # owner => {month_key: {(type, category): total}}
+
+    def missing_months(self, owner, month_keys):
+        with self._lock:
+            months = self._owners.get(owner, {})
+            return [k for k in month_keys if k not in months]
+
+    def load(self, owner, month_keys):
+        buckets = MonthlyBuckets()
+        with self._lock:
+            months = self._owners.get(owner)
+            if months is None:
+                return buckets
+            self._owners.move_to_end(owner)
+            for k in month_keys:
+                mm, yyyy = month_from_key(k)
+                for (t_type, cat), amount in months.get(k, {}).items():
+                    buckets[(yyyy, mm, t_type, cat)] = amount
+        return buckets
+
+    def save(self, owner, month_keys, buckets):
+        rows = {k: {} for k in month_keys}
+        for (yyyy, mm, t_type, cat), amount in buckets.items():
+            sums = rows.get(yyyy * 12 + mm)
+            if sums is not None:
+                sums[(t_type, cat)] = amount
+
+        with self._lock:
+            months = self._owners.setdefault(owner, {})
+            months.update(rows)
+            self._owners.move_to_end(owner)
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+
+    def invalidate(self, user_id=None, month_keys=None):
+        with self._lock:
+            for owner in list(self._owners):
+                if user_id is not None and owner[0] != str(user_id):
+                    continue
+                if month_keys is None:
+                    del self._owners[owner]
+                else:
+                    months = self._owners[owner]
+                    for k in month_keys:
+                        months.pop(k, None)
+
+
+class SQLiteRollupStore(RollupStore):
+    """
+    Rollups in a SQLite database, so they survive restarts and can be shared
+    by the worker processes of one host. Like MemoryRollupStore, it keeps the
+    `max_owners` most recently used owners: rotated tokens would otherwise
+    leave rows behind under every auth identity a user ever had.
+
+    :param path: database file (':memory:' for a private in-memory database)
+    :param max_owners: owners kept before the least recently used are dropped
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS rollup_months ("
+        " user_id TEXT NOT NULL, identity TEXT NOT NULL, month_key INTEGER NOT NULL,"
+        " PRIMARY KEY (user_id, identity, month_key))",
+        # type/category are declared without a type so values keep their JSON type
+        "CREATE TABLE IF NOT EXISTS rollups ("
+        " user_id TEXT NOT NULL, identity TEXT NOT NULL, month_key INTEGER NOT NULL,"
+        " type, category, amount REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS rollups_owner_month ON rollups (user_id, identity, month_key)",
+        # used: a counter bumped on every save and load, for LRU eviction
+        "CREATE TABLE IF NOT EXISTS rollup_owners ("
+        " user_id TEXT NOT NULL, identity TEXT NOT NULL, used INTEGER NOT NULL,"
+        " PRIMARY KEY (user_id, identity))",
+        "CREATE INDEX IF NOT EXISTS rollup_owners_used ON rollup_owners (used)",
+        # owners saved before rollup_owners existed count as least recently used
+        "INSERT OR IGNORE INTO rollup_owners (user_id, identity, used)"
+        " SELECT DISTINCT user_id, identity, 0 FROM rollup_months"
+    )
+
+    def __init__(self, path, max_owners=10000):
+        self.path = path
+        self.max_owners = max_owners
+        self._connect()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def reopen(self):
+        """
+        Opens a fresh connection: SQLite connections must not be used across
+        a fork. A ':memory:' database starts out empty again.
+        """
+        self._connect()
+
+    def missing_months(self, owner, month_keys):
+        month_keys = list(month_keys)
+        if not month_keys:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT month_key FROM rollup_months"
+                " WHERE user_id = ? AND identity = ? AND month_key BETWEEN ? AND ?",
+                (*owner, min(month_keys), max(month_keys))
+            ).fetchall()
+        stored = {row[0] for row in rows}
+        return [k for k in month_keys if k not in stored]
+
+    def load(self, owner, month_keys):
+        buckets = MonthlyBuckets()
+        month_keys = set(month_keys)
+        if not month_keys:
+            return buckets
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT month_key, type, category, amount FROM rollups"
+                " WHERE user_id = ? AND identity = ? AND month_key BETWEEN ? AND ?",
+                (*owner, min(month_keys), max(month_keys))
+            ).fetchall()
+            if rows:
+                self._touch(owner)
+        for k, t_type, cat, amount in rows:
+            if k in month_keys:
+                mm, yyyy = month_from_key(k)
+                buckets[(yyyy, mm, t_type, cat)] = amount
+        return buckets
+
+    def save(self, owner, month_keys, buckets):
+        month_keys = set(month_keys)
+        if not month_keys:
+            return
+        rows = []
+        for (yyyy, mm, t_type, cat), amount in buckets.items():
+            k = yyyy * 12 + mm
+            if k in month_keys:
+                rows.append((*owner, k, t_type, cat, amount))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._delete(owner[0], owner[1], month_keys)
+                self._conn.executemany(
+                    "INSERT INTO rollup_months (user_id, identity, month_key) VALUES (?, ?, ?)",
+                    [(*owner, k) for k in month_keys]
+                )
+                self._conn.executemany(
+                    "INSERT INTO rollups (user_id, identity, month_key, type, category, amount)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._touch(owner)
+                self._evict()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def invalidate(self, user_id=None, month_keys=None):
+        with self._lock:
+            self._delete(None if user_id is None else str(user_id), None, month_keys)
+
+    def _delete(self, user_id, identity, month_keys):
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if identity is not None:
+            where.append("identity = ?")
+            params.append(identity)
+        if month_keys is not None:
+            month_keys = list(month_keys)
+            where.append(f"month_key IN ({', '.join('?' * len(month_keys))})")
+            params.extend(month_keys)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        for table in ("rollup_months", "rollups"):
+            self._conn.execute(f"DELETE FROM {table}{clause}", params)
+        if month_keys is None:
+            self._conn.execute(f"DELETE FROM rollup_owners{clause}", params)
+
+    def _touch(self, owner):
+        self._conn.execute(
+            "INSERT INTO rollup_owners (user_id, identity, used)"
+            " VALUES (?, ?, (SELECT COALESCE(MAX(used), 0) + 1 FROM rollup_owners))"
+            " ON CONFLICT (user_id, identity) DO UPDATE SET used = excluded.used",
+            owner
+        )
+
+    def _evict(self):
+        """
+        Drops the rollups of the least recently used owners beyond max_owners.
+        """
+        stale = self._conn.execute(
+            "SELECT user_id, identity FROM rollup_owners ORDER BY used DESC LIMIT -1 OFFSET ?",
+            (self.max_owners,)
+        ).fetchall()
+        for user_id, identity in stale:
+            self._delete(user_id, identity, None)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def make_rollup_store(kind, sqlite_path=None, max_owners=10000):
+    """
+    Builds the store named by ROLLUP_STORE: 'none' (returns None), 'memory'
+    or 'sqlite'. Raises ValueError for anything else.
+    """
+    kind = (kind or 'none').lower()
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return MemoryRollupStore(max_owners=max_owners)
+    if kind == 'sqlite':
+        return SQLiteRollupStore(sqlite_path, max_owners=max_owners)
+    raise ValueError(f"Unknown rollup store '{kind}', expected none, memory or sqlite")
+
+
+def plan_rollup(store, owner, window, current_key):
+    """
+    Returns the sub-window (start_m, start_y, end_m, end_y) of `window` whose
+    transactions must be fetched, or None if stored rollups cover all of it.
+
+    Everything from the first missing closed month up to the end of the
+    window is fetched in one go, so answering a window never takes more than
+    one upstream call.
+    """
+    keys = month_key_range(*window)
+    closed = range(keys.start, min(keys.stop, current_key))
+    missing = store.missing_months(owner, closed)
+    if missing:
+        start = missing[0]
+    elif keys.stop > current_key:
+        start = max(keys.start, current_key)
+    else:
+        return None
+    return month_from_key(start) + tuple(window[2:])
+
+
+def assemble_rollup(store, owner, window, current_key, fetch_window, transactions):
+    """
+    Aggregates the `transactions` fetched for `fetch_window` (see plan_rollup),
+    saves the closed months among them and returns MonthlyBuckets for the
+    whole `window`.
+    """
+    keys = month_key_range(*window)
+    if fetch_window is None:
+        return store.load(owner, keys)
+
+    fetched_keys = month_key_range(*fetch_window)
+    fetched = bucket_transactions(transactions, *fetch_window)
+    store.save(owner, range(fetched_keys.start, min(fetched_keys.stop, current_key)), fetched)
+
+    buckets = store.load(owner, range(keys.start, fetched_keys.start))
+    buckets.update(fetched)
+    return buckets
+
+
+def rollup_buckets(store, owner, window, fetch, current_key=None):
+    """
+    Returns MonthlyBuckets for `window`, calling fetch(sub_window) for the
+    transactions of the months that are not materialized yet or still open.
+    """
+    if current_key is None:
+        current_key = current_month_key()
+    fetch_window = plan_rollup(store, owner, window, current_key)
+    transactions = fetch(fetch_window) if fetch_window is not None else ()
+    return assemble_rollup(store, owner, window, current_key, fetch_window, transactions)
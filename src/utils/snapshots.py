@@ -0,0 +1,225 @@
+"""
+Local SQLite snapshot of users' transactions.
+
+For users with very long histories, downloading every transaction for every
+chart dominates response time. A snapshot keeps one row per transaction,
+indexed on (user, year_month, type, category), and answers a chart window
+with a single GROUP BY over that index instead of fetching and iterating
+the whole list.
+
+Snapshots are synced incrementally: each owner has a last-synced month
+marker, and a sync re-fetches only the window from that month to the
+current one (earlier months are closed and assumed not to change), replacing
+the rows stored for it. The first sync fetches everything. Back-dated
+changes must go through invalidate(), which makes the next sync a full one.
+
+The store keeps at most `max_owners` snapshots, dropping the least recently
+synced beyond that. A full sync replaces every snapshot of the user, so the
+one left under a rotated token's auth identity does not linger.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from .aggregator import MonthlyBuckets, canonical_buckets
+from .date_utils import date_month_key, month_from_key, month_key_range
+from .taxonomy import category_of
+
+# window to fetch: (start_m, start_y, end_m, end_y), or None for a full sync
+SyncPlan = namedtuple('SyncPlan', ['window'])
+
+
+def _rows(owner, transactions, keys=None):
+    """
+    (user_id, identity, year_month, type, category, amount) per transaction,
+    skipping those outside the month-key range `keys` when given.
+
+    Rows without a type or a numeric amount are skipped too: a sync stores
+    the whole history, so one such row would otherwise fail every chart of
+    the user, whatever its window.
+    """
+    user_id, identity = owner
+    for t in transactions:
+        key = date_month_key(t.get('date', '01-01-1970'))
+        if keys is not None and key not in keys:
+            continue
+        try:
+            row = (user_id, identity, key, t['type'], category_of(t), float(t['amount']))
+        except (KeyError, TypeError, ValueError):
+            continue
+        yield row
+
+
+class SnapshotStore:
+    """
+    :param path: database file (':memory:' for a private in-memory database)
+    :param max_owners: snapshots kept before the least recently synced are dropped
+
+    Owners are rollups.rollup_owner() tuples, so snapshots are kept per
+    (userId, auth identity) like every other cache.
+    """
+
+    SCHEMA = (
+        # type/category are declared without a type so values keep their JSON type
+        "CREATE TABLE IF NOT EXISTS snapshot_transactions ("
+        " user_id TEXT NOT NULL, identity TEXT NOT NULL, year_month INTEGER NOT NULL,"
+        " type, category, amount REAL NOT NULL)",
+        # covering index: chart queries never touch the table itself
+        "CREATE INDEX IF NOT EXISTS snapshot_owner_month ON snapshot_transactions"
+        " (user_id, identity, year_month, type, category, amount)",
+        "CREATE TABLE IF NOT EXISTS snapshot_sync ("
+        " user_id TEXT NOT NULL, identity TEXT NOT NULL, synced_through INTEGER NOT NULL,"
+        " synced_at REAL NOT NULL, PRIMARY KEY (user_id, identity))"
+    )
+
+    def __init__(self, path, max_owners=1000, clock=time.time):
+        self.path = path
+        self.max_owners = max_owners
+        self._clock = clock
+        self._connect()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def reopen(self):
+        """
+        Opens a fresh connection (SQLite connections must not be used across
+        a fork). A ':memory:' database starts out empty again.
+        """
+        self._connect()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def plan_sync(self, owner, current_key, max_age):
+        """
+        Returns None if the owner's snapshot was synced less than `max_age`
+        seconds ago, otherwise the SyncPlan of the next sync: from the
+        last-synced month through `current_key`, or everything.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_through, synced_at FROM snapshot_sync WHERE user_id = ? AND identity = ?", owner
+            ).fetchone()
+        if row is None:
+            return SyncPlan(None)
+        synced_through, synced_at = row
+        if self._clock() - synced_at < max_age:
+            return None
+        start = min(synced_through, current_key)
+        return SyncPlan(month_from_key(start) + month_from_key(current_key))
+
+    def apply_sync(self, owner, plan, transactions, current_key):
+        """
+        Replaces the owner's rows in the plan's window (for a full sync, all
+        the rows of the user, whatever their auth identity) with
+        `transactions` (any iterable of transaction dicts; rows outside the
+        window are ignored), moves the marker to `current_key` and evicts the
+        least recently synced owners beyond max_owners.
+        """
+        keys = month_key_range(*plan.window) if plan.window is not None else None
+        # read (possibly streamed) transactions before taking the lock
+        rows = list(_rows(owner, transactions, keys))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if keys is None:
+                    self._delete(owner[0])
+                else:
+                    self._conn.execute(
+                        "DELETE FROM snapshot_transactions WHERE user_id = ? AND identity = ?"
+                        " AND year_month BETWEEN ? AND ?",
+                        (*owner, keys.start, keys.stop - 1)
+                    )
+                self._conn.executemany("INSERT INTO snapshot_transactions VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO snapshot_sync VALUES (?, ?, ?, ?)",
+                    (*owner, current_key, self._clock())
+                )
+                self._evict()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def buckets(self, owner, window):
+        """
+        MonthlyBuckets of `window` for the owner, summed by SQLite. Rows keep
+        the categories as sent; aliases are merged here, per bucket.
+        """
+        keys = month_key_range(*window)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT year_month, type, category, SUM(amount) FROM snapshot_transactions"
+                " WHERE user_id = ? AND identity = ? AND year_month BETWEEN ? AND ?"
+                " GROUP BY year_month, type, category",
+                (*owner, keys.start, keys.stop - 1)
+            ).fetchall()
+        buckets = MonthlyBuckets()
+        for key, t_type, category, amount in rows:
+            mm, yyyy = month_from_key(key)
+            buckets[(yyyy, mm, t_type, category)] = amount
+        return canonical_buckets(buckets)
+
+    def invalidate(self, user_id=None):
+        """
+        Drops the snapshots of `user_id` (every auth identity), or of every
+        user if None; their next sync is a full one.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._delete(user_id)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _delete(self, user_id=None, identity=None):
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(str(user_id))
+        if identity is not None:
+            where.append("identity = ?")
+            params.append(identity)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        for table in ("snapshot_sync", "snapshot_transactions"):
+            self._conn.execute(f"DELETE FROM {table}{clause}", params)
+
+    def _evict(self):
+        stale = self._conn.execute(
+            "SELECT user_id, identity FROM snapshot_sync ORDER BY synced_at DESC LIMIT -1 OFFSET ?",
+            (self.max_owners,)
+        ).fetchall()
+        for user_id, identity in stale:
+            self._delete(user_id, identity)
+
+    def stats(self):
+        with self._lock:
+            owners = self._conn.execute("SELECT COUNT(*) FROM snapshot_sync").fetchone()[0]
+            rows = self._conn.execute("SELECT COUNT(*) FROM snapshot_transactions").fetchone()[0]
+        return {"owners": owners, "rows": rows}
+
+
+def sync_snapshot(store, owner, fetch, max_age, current_key):
+    """
+    Syncs the owner's snapshot if it is older than `max_age` seconds, calling
+    fetch(sync_window) for the transactions (sync_window None => all of
+    them). Returns True if a sync ran.
+    """
+    plan = store.plan_sync(owner, current_key, max_age)
+    if plan is None:
+        return False
+    store.apply_sync(owner, plan, fetch(plan.window), current_key)
+    return True
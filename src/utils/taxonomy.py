@@ -0,0 +1,214 @@
+"""
+Category taxonomy: the pie categories of each transaction type, aliases and
+optional case/whitespace normalization, compiled once into integer-code
+lookup tables.
+
+Every category value the Transaction Service sends is resolved to a code
+the first time it is seen; after that, resolving it is one dict lookup.
+Codes index `Taxonomy.names`: the configured categories first (expense,
+then income, in pie order), then categories outside the taxonomy in
+first-seen order, so they still chart on their own in bar charts. Aliases
+share the code of their canonical category, as do spellings that differ in
+case when "caseSensitive" is false and spellings that differ in surrounding
+whitespace when "trimWhitespace" is true. Both are opt-in: by default
+categories match exactly, as charts did before the taxonomy was
+configurable. A pie is answered through
+pie_slots(categories), a list mapping every code to its slot in the pie.
+
+Configured from a JSON file (TAXONOMY_PATH), e.g.
+
+    {
+      "expense": ["Rent", "Groceries", "Utilities", "Entertainment", "Other"],
+      "income": ["Salary", "Investments", "Gifts", "Refunds", "Other"],
+      "aliases": {"Food": "Groceries", "Wages": "Salary"},
+      "caseSensitive": false,
+      "trimWhitespace": true,
+      "other": "Other"
+    }
+"""
+import json
+import threading
+
+DEFAULT_TAXONOMY = {
+    "expense": ["Rent", "Groceries", "Utilities", "Entertainment", "Other"],
+    "income": ["Salary", "Investments", "Gifts", "Refunds", "Other"]
+}
+
+# Distinct categories outside the taxonomy that get their own code; any
+# more are folded into the `other` category.
+MAX_CATEGORIES = 4096
+
+
+class Taxonomy:
+    """
+    :param expense: expense pie categories, in order
+    :param income: income pie categories, in order
+    :param aliases: {alias: canonical category}; the category must be one
+        of `expense` or `income`
+    :param case_sensitive: False => "groceries" and "GROCERIES" are "Groceries"
+    :param trim_whitespace: True => " Groceries " is "Groceries"
+    :param other: category that pies fold unknown categories into
+    :param max_categories: see MAX_CATEGORIES
+
+    Raises ValueError for an alias of an unknown category.
+    """
+
+    def __init__(self, expense, income, aliases=None, case_sensitive=True, trim_whitespace=False,
+                 other='Other', max_categories=MAX_CATEGORIES):
+        self.expense = tuple(expense)
+        self.income = tuple(income)
+        self.case_sensitive = case_sensitive
+        self.trim_whitespace = trim_whitespace
+        self.other = other
+        self.max_categories = max_categories
+        self.names = list(dict.fromkeys(self.expense + self.income))
+        self._configured = len(self.names)
+
+        self._normalized = {self._normalize(name): code for code, name in enumerate(self.names)}
+        for alias, category in (aliases or {}).items():
+            code = self._normalized.get(self._normalize(category))
+            if code is None or self.names[code] != category:
+                raise ValueError(f"Alias '{alias}' refers to unknown category '{category}'")
+            self._normalized[self._normalize(alias)] = code
+
+        # raw value => code / canonical name; the fast path of code() and canonical()
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        self._canonical = {name: name for name in self.names}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a taxonomy from a dict shaped like DEFAULT_TAXONOMY (see the
+        module docstring). Raises ValueError for a malformed one.
+        """
+        if not isinstance(config, dict) or not isinstance(config.get('expense'), list) \
+                or not isinstance(config.get('income'), list):
+            raise ValueError("A taxonomy needs 'expense' and 'income' category lists")
+        aliases = config.get('aliases') or {}
+        if not isinstance(aliases, dict):
+            raise ValueError("Taxonomy 'aliases' must map aliases to categories")
+        return cls(
+            config['expense'], config['income'], aliases,
+            case_sensitive=bool(config.get('caseSensitive', True)),
+            trim_whitespace=bool(config.get('trimWhitespace', False)),
+            other=config.get('other', 'Other')
+        )
+
+    def _normalize(self, value):
+        if not isinstance(value, str):
+            return value
+        if self.trim_whitespace:
+            value = value.strip()
+        return value if self.case_sensitive else value.casefold()
+
+    def code(self, raw):
+        """
+        The code of a raw category value (None included).
+        """
+        code = self.codes.get(raw)
+        if code is None:
+            code = self._compile(raw)
+        return code
+
+    def canonical(self, raw):
+        """
+        The canonical name of a raw category value, e.g. "food " => "Groceries".
+        """
+        name = self._canonical.get(raw, self)
+        if name is self:
+            name = self.names[self._compile(raw)]
+        return name
+
+    def _compile(self, raw):
+        with self._lock:
+            key = self._normalize(raw)
+            code = self._normalized.get(key)
+            if code is None:
+                if len(self.names) - self._configured >= self.max_categories and self.other in self.codes:
+                    # not memoized, so junk values cannot grow the tables
+                    return self.codes[self.other]
+                code = self._normalized[key] = len(self.names)
+                self.names.append(raw.strip() if self.trim_whitespace and isinstance(raw, str) else raw)
+            self.codes[raw] = code
+            self._canonical[raw] = self.names[code]
+            return code
+
+    def pie_slots(self, categories):
+        """
+        List mapping every code to its slot in a pie of `categories`:
+        categories outside it go to the slot of `other`, or -1 if the pie
+        has none. Compiled once per category list (and recompiled when new
+        categories have been seen since).
+        """
+        categories = tuple(categories)
+        slots = self._slots.get(categories)
+        if slots is None or len(slots) < len(self.names):
+            positions = {self.code(name): i for i, name in enumerate(categories)}
+            other = categories.index(self.other) if self.other in categories else -1
+            slots = self._slots[categories] = [positions.get(code, other) for code in range(len(self.names))]
+        return slots
+
+    def pie_totals(self, categories, items):
+        """
+        Sums (category, amount) pairs into the slots of a pie of `categories`
+        (see pie_slots). Raises KeyError(other) for a category the pie has
+        no slot for.
+        """
+        coded = [(self.code(cat), amount) for cat, amount in items]
+        slots = self.pie_slots(categories)
+        totals = [0.0] * len(categories)
+        for code, amount in coded:
+            slot = slots[code]
+            if slot < 0:
+                raise KeyError(self.other)
+            totals[slot] += amount
+        return totals
+
+    def __getstate__(self):
+        # sent to spawned worker processes (see fanout.process_pool)
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_slots'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def load_taxonomy(path):
+    """
+    Reads a taxonomy JSON file (see the module docstring).
+    """
+    with open(path, encoding='utf-8') as f:
+        return Taxonomy.from_config(json.load(f))
+
+
+_taxonomy = Taxonomy.from_config(DEFAULT_TAXONOMY)
+
+
+def get_taxonomy():
+    """
+    The taxonomy the aggregators use (the default one unless set_taxonomy()
+    installed another).
+    """
+    return _taxonomy
+
+
+def set_taxonomy(taxonomy):
+    global _taxonomy
+    _taxonomy = taxonomy
+
+
+def category_of(transaction):
+    """
+    The raw category of a transaction dict, usable as a bucket key: None if
+    missing, and the taxonomy's `other` category for a list or object
+    value, which cannot be a key (pies fold such values into it anyway).
+    """
+    category = transaction.get('category')
+    if isinstance(category, (list, dict)):
+        return _taxonomy.other
+    return category
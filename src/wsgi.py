@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production serving:
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+
+gunicorn.conf.py runs pre-forked workers with a few threads each, sized
+from the WSGI_* settings in src/config.py. `python -m src.app` and
+`flask run` start the single-process development server instead.
+"""
+from .app import create_app
+
+app = create_app()
@@ -0,0 +1,112 @@
+"""
+Local stub of the Transaction Management service for client tests.
+
+Each test queues the responses it wants; every GET pops the next one
+(the last response repeats once the queue is drained). A response body may
+be a callable taking the parsed query string, e.g. to serve pages.
+"""
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open many connections at once
+
+
+class StubResponse:
+    def __init__(self, status=200, body=None, delay=0.0, headers=None, compress=False):
+        self.status = status
+        self.body = body if body is not None else []
+        self.delay = delay
+        self.headers = headers or {}
+        self.compress = compress  # gzip the body if the client accepts it
+
+
+class StubTransactionService:
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        self.head_ports = []  # client port of each HEAD (connection warm-up)
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def queue(self, *responses):
+        with self._lock:
+            self.responses.extend(responses)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_response(self):
+        with self._lock:
+            if len(self.responses) > 1:
+                return self.responses.pop(0)
+            return self.responses[0] if self.responses else StubResponse()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = -1  # send headers and body in one write (no Nagle stalls)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                with stub._lock:
+                    stub.requests.append({
+                        "path": parsed.path,
+                        "query": parse_qs(parsed.query),
+                        "headers": dict(self.headers),
+                        "client_port": self.client_address[1]
+                    })
+                response = stub._next_response()
+                if response.delay:
+                    time.sleep(response.delay)
+                payload = response.body
+                if callable(payload):
+                    payload = payload(parse_qs(parsed.query))
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode('utf-8')
+                self.send_response(response.status)
+                if response.status == 304:
+                    payload = b''  # no body allowed
+                else:
+                    if response.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                        payload = gzip.compress(payload)
+                        self.send_header("Content-Encoding", "gzip")
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_HEAD(self):
+                with stub._lock:
+                    stub.head_ports.append(self.client_address[1])
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
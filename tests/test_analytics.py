@@ -2,9 +2,22 @@ import pytest
 from src.utils.aggregator import (
     compute_line_data,
     compute_pie_data_range,
-    compute_bar_data
+    compute_bar_data,
+    bucket_transactions,
+    line_from_buckets,
+    pie_from_buckets,
+    bar_from_buckets,
+    compute_dashboard_data,
+    compute_charts
+)
+from src.utils.date_utils import (
+    parse_month_year,
+    parse_full_date,
+    generate_month_range,
+    month_key,
+    date_month_key,
+    month_key_range
 )
-from src.utils.date_utils import parse_month_year, parse_full_date, generate_month_range
 
 def test_parse_month_year():
     # aggregator expects "YYYY-MM". e.g. "2023-02" => (month=2, year=2023)
@@ -20,6 +33,30 @@ def test_parse_full_date():
     assert parse_full_date("9999-99-99") == (0, 0, 0)
     assert parse_full_date("") == (0, 0, 0)
 
+def test_parse_full_date_is_memoized_and_tolerates_unhashable_input():
+    from src.utils.date_utils import _parse_full_date
+    parse_full_date("2023-03-11")
+    before = _parse_full_date.cache_info().hits
+    assert parse_full_date("2023-03-11") == (11, 3, 2023)
+    assert _parse_full_date.cache_info().hits == before + 1
+    assert parse_full_date(["2023", "03", "11"]) == (0, 0, 0)
+    assert parse_full_date(None) == (0, 0, 0)
+
+def test_month_keys():
+    assert month_key(11, 2023) == 2023 * 12 + 11
+    assert month_key(1, 2024) == month_key(12, 2023) + 1
+    assert date_month_key("2023-11-03") == month_key(11, 2023)
+    assert date_month_key("not-a-date") == 0
+    assert date_month_key({"oops": 1}) == 0
+
+def test_month_key_range():
+    window = month_key_range(11, 2023, 2, 2024)
+    assert len(window) == len(generate_month_range(11, 2023, 2, 2024)) == 4
+    assert month_key(12, 2023) in window
+    assert month_key(10, 2023) not in window
+    assert month_key(3, 2024) not in window
+    assert len(month_key_range(2, 2024, 11, 2023)) == 0
+
 def test_generate_month_range():
     result = generate_month_range(1, 2023, 3, 2023)
     assert result == [(1, 2023), (2, 2023), (3, 2023)]
@@ -73,4 +110,281 @@ def test_compute_bar_data():
     # For "Expense" + "Groceries" => Jan=100, Feb=50, Mar=0
     bar_result = compute_bar_data(transactions, 1, 2023, 3, 2023, "Expense", "Groceries")
     assert bar_result["labels"] == ["01-2023", "02-2023", "03-2023"]
-    assert bar_result["data"] == [100.0, 50.0, 0.0]
\ No newline at end of file
+    assert bar_result["data"] == [100.0, 50.0, 0.0]
+
+def test_bucket_transactions_single_pass():
+    # one pass => sums keyed by (year, month, type, category); the window drops 2023-10
+    transactions = [
+        {"date": "2023-10-31", "type": "spent", "amount": 999, "category": "Rent"},
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+        {"date": "2023-11-20", "type": "spent", "amount": "25.5", "category": "Groceries"},
+        {"date": "2023-12-01", "type": "receive", "amount": 1000, "category": "Salary"},
+        {"date": "2023-12-02", "type": "spent", "amount": 10}
+    ]
+    buckets = bucket_transactions(transactions, 11, 2023, 12, 2023)
+    assert buckets == {
+        (2023, 11, "spent", "Groceries"): 75.5,
+        (2023, 12, "receive", "Salary"): 1000.0,
+        (2023, 12, "spent", None): 10.0
+    }
+
+    # the same buckets answer every chart shape
+    assert line_from_buckets(buckets, 11, 2023, 12, 2023) == compute_line_data(transactions, 11, 2023, 12, 2023)
+    categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+    assert pie_from_buckets(buckets, 11, 2023, 12, 2023, categories) == {
+        "labels": categories,
+        "data": [0.0, 75.5, 0.0, 0.0, 10.0]
+    }
+    assert bar_from_buckets(buckets, 11, 2023, 12, 2023, "Expense", "Groceries") == {
+        "labels": ["11-2023", "12-2023"],
+        "data": [75.5, 0.0]
+    }
+
+def test_transaction_frame_matches_list_engine():
+    pytest.importorskip("numpy")
+    from src.utils.frame import TransactionFrame, to_frame
+
+    transactions = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Groceries"},
+        {"date": "2023-02-15", "type": "spent", "amount": "50.25", "category": "Groceries"},
+        {"date": "2023-02-20", "type": "spent", "amount": 30, "category": "Travel"},
+        {"date": "2023-03-10", "type": "receive", "amount": 200, "category": "Salary"},
+        {"date": "bad-date", "type": "spent", "amount": 1}
+    ]
+    frame = to_frame(transactions)
+    assert isinstance(frame, TransactionFrame)
+    assert len(frame) == 5
+    assert frame.month_key.tolist()[:4] == [2023 * 12 + 1, 2023 * 12 + 2, 2023 * 12 + 2, 2023 * 12 + 3]
+
+    categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+    assert compute_line_data(frame, 1, 2023, 3, 2023) == compute_line_data(transactions, 1, 2023, 3, 2023)
+    assert compute_pie_data_range(frame, 1, 2023, 3, 2023, categories) == {
+        "labels": categories,
+        "data": [0.0, 150.25, 0.0, 0.0, 30.0]
+    }
+    assert compute_bar_data(frame, 1, 2023, 3, 2023, "Expense", "Groceries") == \
+        compute_bar_data(transactions, 1, 2023, 3, 2023, "Expense", "Groceries")
+    assert compute_bar_data(frame, 1, 2023, 3, 2023, "Income", "Unknown")["data"] == [0.0, 0.0, 0.0]
+
+def test_to_frame_keeps_lists_with_malformed_rows():
+    """A bad row outside the window is ignored, as by the list engine, instead of failing the frame."""
+    pytest.importorskip("numpy")
+    from src.utils.frame import to_frame
+
+    transactions = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Groceries"},
+        {"date": "2020-06-01", "type": "spent", "amount": "n/a", "category": "Groceries"},
+        {"date": "2020-07-01", "amount": 5}
+    ]
+    assert to_frame(transactions) is transactions
+    assert compute_line_data(to_frame(transactions), 1, 2023, 1, 2023)["expenseData"] == [100.0]
+
+def test_unhashable_categories_are_folded_into_other():
+    from src.utils.approx import approx_pie_data
+    from src.utils.prefix_index import PrefixIndex
+
+    categories = ["Rent", "Groceries", "Other"]
+    transactions = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Rent"},
+        {"date": "2023-01-02", "type": "spent", "amount": 5, "category": ["Rent", "Fees"]},
+        {"date": "2023-01-03", "type": "spent", "amount": 2, "category": {"name": "Rent"}}
+    ]
+    buckets = bucket_transactions(transactions)
+    assert compute_line_data(transactions, 1, 2023, 1, 2023)["expenseData"] == [107.0]
+    for source in (transactions, buckets, PrefixIndex.from_buckets(buckets)):
+        assert compute_pie_data_range(source, 1, 2023, 1, 2023, categories)["data"] == [100.0, 0.0, 7.0]
+    assert approx_pie_data(transactions, 1, 2023, 1, 2023, categories)["data"] == [100.0, 0.0, 7.0]
+    assert compute_bar_data(transactions, 1, 2023, 1, 2023, "Expense", "Other")["data"] == [7.0]
+
+GRANULAR_TRANSACTIONS = [
+    {"date": "2023-12-31", "type": "spent", "amount": 10, "category": "Groceries"},  # Sunday
+    {"date": "2024-01-01", "type": "spent", "amount": 20, "category": "Groceries"},  # Monday
+    {"date": "2024-01-07", "type": "receive", "amount": 500, "category": "Salary"},
+    {"date": "2024-02-30", "type": "spent", "amount": 5, "category": "Rent"},  # clamped to 02-29
+    {"date": "2024-04-02", "type": "spent", "amount": 7.5, "category": "Groceries"},
+    {"date": "bad-date", "type": "spent", "amount": 1}
+]
+
+def test_line_data_at_every_granularity():
+    window = (12, 2023, 4, 2024)
+    weekly = compute_line_data(GRANULAR_TRANSACTIONS, *window, "week")
+    assert weekly["labels"][:3] == ["W48-2023", "W49-2023", "W50-2023"]
+    first_week = weekly["labels"].index("W52-2023")
+    assert weekly["expenseData"][first_week:first_week + 2] == [10.0, 20.0]
+    assert weekly["incomeData"][first_week + 1] == 500.0
+
+    daily = compute_line_data(GRANULAR_TRANSACTIONS, 2, 2024, 2, 2024, "day")
+    assert daily["labels"][0] == "01-02-2024" and daily["labels"][-1] == "29-02-2024"
+    assert daily["expenseData"][-1] == 5.0
+
+    assert compute_line_data(GRANULAR_TRANSACTIONS, *window, "quarter") == {
+        "labels": ["Q4-2023", "Q1-2024", "Q2-2024"],
+        "incomeData": [0.0, 500.0, 0.0],
+        "expenseData": [10.0, 25.0, 7.5]
+    }
+    assert compute_line_data(GRANULAR_TRANSACTIONS, *window, "year") == {
+        "labels": ["2023", "2024"],
+        "incomeData": [0.0, 500.0],
+        "expenseData": [10.0, 32.5]
+    }
+    assert compute_bar_data(GRANULAR_TRANSACTIONS, *window, "Expense", "Groceries", "quarter")["data"] == \
+        [10.0, 20.0, 7.5]
+
+def test_coarser_granularities_derive_from_finer_buckets():
+    from src.utils.aggregator import DailyBuckets, bucket_days
+
+    window = (12, 2023, 4, 2024)
+    days = bucket_days(GRANULAR_TRANSACTIONS, *window)
+    assert isinstance(days, DailyBuckets)
+    assert days.monthly() == bucket_transactions(GRANULAR_TRANSACTIONS, *window)
+
+    # DailyBuckets answer any granularity; MonthlyBuckets months and coarser
+    months = bucket_transactions(GRANULAR_TRANSACTIONS, *window)
+    for granularity in ("day", "week", "month", "quarter", "year"):
+        assert compute_line_data(days, *window, granularity) == \
+            compute_line_data(GRANULAR_TRANSACTIONS, *window, granularity)
+    for granularity in ("month", "quarter", "year"):
+        assert compute_line_data(months, *window, granularity) == compute_line_data(days, *window, granularity)
+    with pytest.raises(ValueError):
+        compute_line_data(months, *window, "week")
+
+def test_transaction_frame_matches_list_engine_at_every_granularity():
+    pytest.importorskip("numpy")
+    from src.utils.frame import to_frame
+
+    frame = to_frame(GRANULAR_TRANSACTIONS)
+    window = (12, 2023, 4, 2024)
+    for granularity in ("day", "week", "month", "quarter", "year"):
+        assert compute_line_data(frame, *window, granularity) == \
+            compute_line_data(GRANULAR_TRANSACTIONS, *window, granularity)
+        assert compute_bar_data(frame, *window, "Expense", "Groceries", granularity) == \
+            compute_bar_data(GRANULAR_TRANSACTIONS, *window, "Expense", "Groceries", granularity)
+
+def test_prefix_index_matches_list_engine():
+    import random
+    from src.utils.prefix_index import PrefixIndex
+
+    rng = random.Random(22)
+    categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+    transactions = [
+        {
+            "date": f"{rng.randint(2019, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": rng.choice(["spent", "receive"]),
+            # quarters are exact in binary, so both engines round the same sums
+            "amount": rng.randint(1, 40000) / 4,
+            "category": rng.choice(categories + ["Salary", "Travel", None])
+        }
+        for _ in range(500)
+    ] + [{"date": "bad-date", "type": "spent", "amount": 1, "category": "Rent"}]
+    index = PrefixIndex.from_buckets(bucket_transactions(transactions))
+
+    windows = [(1, 2018, 6, 2019), (11, 2024, 3, 2025), (5, 2022, 4, 2022)]
+    for _ in range(30):
+        start, end = sorted(rng.sample(range(2019 * 12 + 1, 2025 * 12 + 1), 2))
+        windows.append(((start - 1) % 12 + 1, (start - 1) // 12, (end - 1) % 12 + 1, (end - 1) // 12))
+    for window in windows:
+        for expense in (True, False):
+            assert compute_pie_data_range(index, *window, categories, expense) == \
+                compute_pie_data_range(transactions, *window, categories, expense)
+        for granularity in ("month", "quarter", "year"):
+            assert compute_line_data(index, *window, granularity) == \
+                compute_line_data(transactions, *window, granularity)
+            assert compute_bar_data(index, *window, "Income", "Salary", granularity) == \
+                compute_bar_data(transactions, *window, "Income", "Salary", granularity)
+    with pytest.raises(ValueError):
+        compute_line_data(index, 1, 2024, 3, 2024, "week")
+
+    charts = [("line", None, None), ("pie/expense", None, None), ("bar", "Expense", "Rent")]
+    assert compute_charts(index, 1, 2020, 12, 2021, charts, categories, ["Salary", "Other"]) == \
+        compute_charts(transactions, 1, 2020, 12, 2021, charts, categories, ["Salary", "Other"])
+    assert compute_line_data(PrefixIndex.from_buckets({}), 1, 2024, 2, 2024)["incomeData"] == [0.0, 0.0]
+
+def test_prefix_index_sums_large_amounts_in_exact_cents():
+    import random
+    from src.utils.date_utils import month_key
+    from src.utils.prefix_index import PrefixIndex
+
+    rng = random.Random(23)
+    cents = [rng.randint(10 ** 11, 10 ** 12) for _ in range(2000)]
+    transactions = [
+        {"date": f"{2000 + i % 25}-{i % 12 + 1:02d}-01", "type": "spent", "amount": c / 100, "category": "Rent"}
+        for i, c in enumerate(cents)
+    ]
+    index = PrefixIndex.from_buckets(bucket_transactions(transactions))
+
+    windows = [(1, 2000, 12, 2024), (7, 2003, 2, 2021), (12, 2024, 12, 2024)]
+    for window in windows:
+        lo, hi = month_key(*window[:2]), month_key(*window[2:])
+        exact = sum(c for i, c in enumerate(cents) if lo <= month_key(i % 12 + 1, 2000 + i % 25) <= hi)
+        total = compute_pie_data_range(index, *window, ["Rent", "Other"])["data"][0]
+        assert total == exact / 100
+        # float running sums may drift by a cent at this magnitude
+        assert total == pytest.approx(compute_pie_data_range(transactions, *window, ["Rent", "Other"])["data"][0],
+                                      abs=0.015)
+
+def test_calendar_index():
+    import datetime
+    from src.utils.calendar_index import CalendarIndex, bucket_label, date_ordinal
+
+    index = CalendarIndex(2020, 2025)
+    ordinal = datetime.date(2024, 2, 29).toordinal()
+    assert date_ordinal("2024-02-29") == ordinal
+    assert date_ordinal("2023-02-30") == datetime.date(2023, 2, 28).toordinal()
+    assert date_ordinal("bad-date") == date_ordinal(["2024-01-01"]) == 0
+    assert [bucket_label(index.bucket(ordinal, g), g) for g in ("day", "week", "month", "quarter", "year")] == \
+        ["29-02-2024", "W09-2024", "02-2024", "Q1-2024", "2024"]
+    # outside the precomputed span the key is computed, not looked up
+    late = datetime.date(2031, 7, 4).toordinal()
+    assert index.bucket(late, "quarter") == 2031 * 4 + 2
+    assert index.bucket(0, "month") == 0
+
+def test_compute_dashboard_data():
+    transactions = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Groceries"},
+        {"date": "2023-02-15", "type": "receive", "amount": 1000, "category": "Bonus"}
+    ]
+    expense_categories = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+    income_categories = ["Salary", "Investments", "Gifts", "Refunds", "Other"]
+    result = compute_dashboard_data(
+        transactions, 1, 2023, 2, 2023,
+        expense_categories, income_categories, [("Expense", "Groceries")]
+    )
+    assert result["line"] == compute_line_data(transactions, 1, 2023, 2, 2023)
+    assert result["expensePie"] == compute_pie_data_range(transactions, 1, 2023, 2, 2023, expense_categories)
+    assert result["incomePie"]["data"] == [0.0, 0.0, 0.0, 0.0, 1000.0]
+    assert result["bars"] == [{
+        "type": "Expense",
+        "category": "Groceries",
+        "labels": ["01-2023", "02-2023"],
+        "data": [100.0, 0.0]
+    }]
+
+    pytest.importorskip("numpy")
+    from src.utils.frame import to_frame
+    assert compute_dashboard_data(
+        to_frame(transactions), 1, 2023, 2, 2023,
+        expense_categories, income_categories, [("Expense", "Groceries")]
+    ) == result
+
+def test_compute_charts_matches_single_chart_functions():
+    transactions = [
+        {"date": "2023-11-03", "type": "spent", "amount": 150.75, "category": "Groceries"},
+        {"date": "2023-12-01", "type": "receive", "amount": 2000.00, "category": "Salary"}
+    ]
+    window = (11, 2023, 12, 2023)
+    expense_cats = ["Rent", "Groceries", "Other"]
+    income_cats = ["Salary", "Other"]
+
+    line, expense, income, bar = compute_charts(
+        transactions, *window,
+        [("line", None, None), ("pie/expense", None, None), ("pie/income", None, None),
+         ("bar", "Expense", "Groceries")],
+        expense_cats, income_cats
+    )
+    assert line == compute_line_data(transactions, *window)
+    assert expense == compute_pie_data_range(transactions, *window, expense_cats, expense=True)
+    assert income == compute_pie_data_range(transactions, *window, income_cats, expense=False)
+    assert bar == compute_bar_data(transactions, *window, "Expense", "Groceries")
+
+    with pytest.raises(ValueError):
+        compute_charts(transactions, *window, [("radar", None, None)], expense_cats, income_cats)
@@ -0,0 +1,135 @@
+import random
+import time
+
+import pytest
+
+from src.utils.aggregator import compute_bar_data, compute_line_data, compute_pie_data_range
+from src.utils.approx import (
+    QuantileSketch,
+    approx_bar_data,
+    approx_line_data,
+    approx_pie_data,
+    distribution_data,
+    is_truncated,
+    sample_rows
+)
+
+CATEGORIES = ["Rent", "Groceries", "Utilities", "Entertainment", "Other"]
+WINDOW = (1, 2023, 12, 2023)
+
+
+def history(rows, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "date": f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": rng.choice(("spent", "spent", "receive")),
+            "amount": round(rng.expovariate(1 / 80), 2),
+            "category": rng.choice(CATEGORIES + ["Travel"])
+        }
+        for _ in range(rows)
+    ]
+
+
+def test_small_histories_are_exact():
+    transactions = history(300)
+    line = approx_line_data(transactions, *WINDOW, sample_size=1000)
+    exact = compute_line_data(transactions, *WINDOW)
+    assert line["incomeData"] == exact["incomeData"] and line["expenseData"] == exact["expenseData"]
+    assert set(line["expenseError"]) == {0.0}
+    assert line["approx"] == {"sampled": 300, "population": 300, "confidence": 0.95, "truncated": False}
+
+    pie = approx_pie_data(transactions, *WINDOW, CATEGORIES, sample_size=1000)
+    assert pie["data"] == compute_pie_data_range(transactions, *WINDOW, CATEGORIES)["data"]
+    bar = approx_bar_data(transactions, *WINDOW, "Expense", "Groceries", "quarter", sample_size=1000)
+    assert bar["data"] == compute_bar_data(transactions, *WINDOW, "Expense", "Groceries", "quarter")["data"]
+
+
+def test_sampled_estimates_are_within_their_bounds():
+    transactions = history(40000)
+    exact = compute_line_data(transactions, *WINDOW)
+    line = approx_line_data(transactions, *WINDOW, sample_size=4000, seed="v1")
+    assert line["approx"]["sampled"] == 4000
+
+    # 95% intervals: allow a miss or two out of 24 points
+    points = zip(line["incomeData"] + line["expenseData"],
+                 line["incomeError"] + line["expenseError"],
+                 exact["incomeData"] + exact["expenseData"])
+    misses = sum(abs(estimate - true) > error for estimate, error, true in points)
+    assert misses <= 2
+    assert all(0 < e < 0.2 * v for e, v in zip(line["expenseError"], line["expenseData"]))
+
+    # same seed, same sample
+    assert approx_line_data(transactions, *WINDOW, sample_size=4000, seed="v1") == line
+
+    pie = approx_pie_data(transactions, *WINDOW, CATEGORIES, sample_size=4000, seed="v1")
+    truth = compute_pie_data_range(transactions, *WINDOW, CATEGORIES)["data"]
+    assert sum(abs(v - t) > 1.5 * e for v, e, t in zip(pie["data"], pie["error"], truth)) == 0
+
+
+def test_deadline_stops_the_scan_early():
+    # in upstream (date) order, and small enough not to be sampled
+    transactions = sorted(history(5000), key=lambda t: t["date"])
+    line = approx_line_data(transactions, *WINDOW, sample_size=5000, deadline=time.monotonic() - 1)
+    assert line["approx"]["sampled"] == 1024
+    assert line["approx"]["population"] == 5000
+    assert line["approx"]["truncated"] and is_truncated(line)
+    assert all(e > 0 for e in line["expenseError"])
+    # the rows scanned are spread over the year, not the first months
+    assert all(v > 0 for v in line["expenseData"])
+
+
+def test_sample_rows():
+    rows = list(range(10))
+    everything, population = sample_rows(rows, 20, seed="etag")
+    assert population == 10 and sorted(everything) == rows
+    assert everything != rows and sample_rows(rows, 20, seed="etag")[0] == everything
+    sample, population = sample_rows(rows, 4, seed="etag")
+    assert population == 10 and len(set(sample)) == 4
+    assert sample_rows(rows, 4, seed="etag")[0] == sample
+
+
+def test_quantile_sketch_accuracy_and_merge():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(3, 1) for _ in range(20001)]
+    halves = QuantileSketch(0.01), QuantileSketch(0.01)
+    for i, value in enumerate(values):
+        halves[i % 2].add(value)
+    sketch = halves[0].merge(halves[1])
+    assert sketch.count == len(values)
+
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        true = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - true) <= 0.01 * true
+
+    assert QuantileSketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        sketch.merge(QuantileSketch(0.05))
+
+
+def test_distribution_data():
+    transactions = [
+        {"date": "2023-01-05", "type": "spent", "amount": amount, "category": "Groceries"}
+        for amount in (10, 20, 30, 40, 100)
+    ] + [
+        {"date": "2023-02-05", "type": "spent", "amount": 0, "category": "Groceries"},
+        {"date": "2023-02-06", "type": "receive", "amount": 2000, "category": "Salary"}
+    ]
+    data = distribution_data(transactions, 1, 2023, 3, 2023)
+    assert data["labels"] == ["01-2023", "02-2023", "03-2023"]
+    assert data["median"][0] == pytest.approx(30, rel=0.01)
+    assert data["p90"][0] == pytest.approx(40, rel=0.01)  # rank 0.9 * (5 - 1)
+    assert data["median"][1:] == [0.0, None]
+    assert data["count"] == [5, 1, 0]
+    assert "approx" not in data
+
+    quarter = distribution_data(transactions, 1, 2023, 3, 2023, granularity="quarter")
+    assert quarter["count"] == [6]
+    assert distribution_data(transactions, 1, 2023, 3, 2023, txn_type="receive")["count"] == [0, 1, 0]
+    with pytest.raises(ValueError):
+        distribution_data(transactions, 1, 2023, 3, 2023, granularity="week")
+
+    sampled = distribution_data(history(20000), *WINDOW, sample_size=2000, seed=1)
+    assert sampled["approx"]["sampled"] == 2000
+    assert sum(sampled["count"]) == pytest.approx(20000 * 2 / 3, rel=0.1)
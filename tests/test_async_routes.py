@@ -0,0 +1,368 @@
+import asyncio
+import json
+
+import pytest
+
+from src.asgi import create_asgi_app
+from src.routes import async_routes
+from src.services.async_transaction_client import AsyncTransactionClient
+from tests.stub_transaction_service import StubResponse, StubTransactionService
+
+TRANSACTIONS = [
+    {"date": "2023-11-03", "type": "spent", "amount": 150.75, "category": "Groceries"},
+    {"date": "2023-11-04", "type": "receive", "amount": 2000.00, "category": "Salary"}
+]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    service = StubTransactionService().start()
+    client = AsyncTransactionClient(service.url, max_retries=1, backoff_factor=0, read_timeout=1)
+    monkeypatch.setattr(async_routes, "async_transaction_client", client)
+    monkeypatch.setattr(async_routes.async_transaction_cache, "ttl", 0)
+    yield service
+    service.stop()
+
+
+async def call_asgi(app, path, headers=None):
+    """
+    Minimal ASGI test driver: returns (status, decoded JSON body).
+    """
+    status, body, _ = await call_asgi_raw(app, path, headers)
+    return status, json.loads(body)
+
+
+async def call_asgi_raw(app, path, headers=None):
+    """
+    Returns (status, raw body, response headers dict).
+    """
+    raw_path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': raw_path,
+        'query_string': query.encode('latin-1'),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    response_headers = {k.decode(): v.decode() for k, v in messages[0]['headers']}
+    return messages[0]['status'], body, response_headers
+
+
+async def read_stream(app, path, count):
+    """
+    Reads the first `count` body chunks of a streamed response, then
+    disconnects. Returns (start message, chunks).
+    """
+    raw_path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': 'GET', 'path': raw_path, 'query_string': query.encode('latin-1'), 'headers': []}
+    messages = []
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if len(messages) > count:
+            disconnected.set()
+
+    await app(scope, receive, send)
+    return messages[0], [m['body'] for m in messages[1:count + 1]]
+
+
+def run_requests(*paths, headers=None):
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        try:
+            return await asyncio.gather(*(call_asgi(app, p, headers) for p in paths))
+        finally:
+            await async_routes.async_transaction_client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_async_chart_routes(stub):
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    line, expense, income, bar = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12",
+        "/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-11",
+        "/analytics/pie/income?userId=1&startMonth=2023-11&endMonth=2023-11",
+        "/analytics/bar?userId=1&startMonth=2023-11&endMonth=2023-11&type=Expense&category=Groceries",
+        headers={"Authorization": "Bearer abc"}
+    )
+
+    assert line == (200, {
+        "labels": ["11-2023", "12-2023"],
+        "incomeData": [2000.0, 0.0],
+        "expenseData": [150.75, 0.0]
+    })
+    assert expense[1]["data"] == [0.0, 150.75, 0.0, 0.0, 0.0]
+    assert income[1]["data"] == [2000.0, 0.0, 0.0, 0.0, 0.0]
+    assert bar == (200, {"labels": ["11-2023"], "data": [150.75]})
+
+    # the three 2023-11 charts share one coalesced fetch
+    assert len(stub.requests) == 2
+    assert async_routes.async_transaction_flights.stats()["in_flight"] == 0
+    assert stub.requests[0]["headers"]["Authorization"] == "Bearer abc"
+    assert stub.requests[0]["query"]["userId"] == ["1"]
+    assert stub.requests[0]["query"]["startDate"] == ["2023-11-01"]
+
+
+def test_async_chart_granularity(stub):
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    weekly, yearly, invalid = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&granularity=week",
+        "/analytics/bar?userId=1&startMonth=2023-11&endMonth=2023-12&type=Expense&category=Groceries"
+        "&granularity=year",
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&granularity=decade"
+    )
+    assert weekly[1]["labels"][:2] == ["W44-2023", "W45-2023"]
+    assert weekly[1]["expenseData"][:2] == [150.75, 0.0]
+    assert weekly[1]["incomeData"][:2] == [2000.0, 0.0]  # Friday and Saturday share a week
+    assert yearly == (200, {"labels": ["2023"], "data": [150.75]})
+    assert invalid[0] == 400
+
+
+def test_async_approx_and_distribution(stub, monkeypatch):
+    monkeypatch.setattr("src.routes.analytics_routes.APPROX_SAMPLE_SIZE", 1)
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    line, expense, distribution, invalid = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx",
+        "/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx",
+        "/analytics/distribution?userId=1&startMonth=2023-11&endMonth=2023-11&type=Income",
+        "/analytics/bar?userId=1&startMonth=2023-11&endMonth=2023-11&type=Expense&category=Groceries&mode=x"
+    )
+    assert line[1]["approx"] == {"sampled": 2, "population": 2, "confidence": 0.95, "truncated": False}
+    assert line[1]["expenseData"] == [150.75] and line[1]["expenseError"] == [0.0]
+    assert expense[1]["data"][1] == 150.75
+    assert distribution == (200, {
+        "labels": ["11-2023"], "median": [pytest.approx(2000, rel=0.01)], "p90": [pytest.approx(2000, rel=0.01)],
+        "count": [1], "relativeAccuracy": 0.01
+    })
+    assert invalid[0] == 400
+
+
+def test_async_client_stops_on_an_upstream_that_ignores_pages(stub):
+    stub.queue(StubResponse(body=lambda query: {"data": TRANSACTIONS}))
+    client = AsyncTransactionClient(stub.url, max_retries=0, page_size=2)
+
+    async def main():
+        try:
+            return await client.get_transactions(1)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == TRANSACTIONS
+    assert len(stub.requests) == 2
+
+
+def test_async_snapshot_charts(stub, monkeypatch):
+    from src.utils.snapshots import SnapshotStore
+    monkeypatch.setattr(async_routes, "snapshot_store", SnapshotStore(":memory:"))
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    line, income = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12",
+        "/analytics/pie/income?userId=1&startMonth=2023-11&endMonth=2023-11"
+    )
+    assert line[1]["incomeData"] == [2000.0, 0.0]
+    assert line[1]["expenseData"] == [150.75, 0.0]
+    assert income[1]["data"] == [2000.0, 0.0, 0.0, 0.0, 0.0]
+
+    # one full sync shared by both charts
+    assert len(stub.requests) == 1
+    assert "startDate" not in stub.requests[0]["query"]
+
+
+def test_async_prefix_index_charts(stub, monkeypatch):
+    monkeypatch.setattr(async_routes, "PREFIX_INDEX", True)
+    monkeypatch.setattr(async_routes.async_transaction_cache, "ttl", 60)
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    line, income, narrow = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12",
+        "/analytics/pie/income?userId=1&startMonth=2023-11&endMonth=2023-11",
+        "/analytics/pie/expense?userId=1&startMonth=2023-12&endMonth=2024-06"
+    )
+    assert line[1]["incomeData"] == [2000.0, 0.0]
+    assert line[1]["expenseData"] == [150.75, 0.0]
+    assert income[1]["data"] == [2000.0, 0.0, 0.0, 0.0, 0.0]
+    assert narrow[1]["data"] == [0.0, 0.0, 0.0, 0.0, 0.0]
+
+    # one full-history fetch shared by every window
+    assert len(stub.requests) == 1
+    assert "startDate" not in stub.requests[0]["query"]
+
+
+def test_async_errors(stub):
+    stub.queue(StubResponse(status=500))
+
+    failed, missing, unknown = run_requests(
+        "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12",
+        "/analytics/bar?userId=1&startMonth=2023-01",
+        "/analytics/nope"
+    )
+    assert failed[0] == 502
+    assert "Unable to fetch transactions" in failed[1]["error"]
+    assert missing == (400, {"error": "Missing required parameters."})
+    assert unknown[0] == 404
+
+
+def test_async_client_retries_then_succeeds(stub):
+    stub.queue(StubResponse(status=503), StubResponse(body=TRANSACTIONS))
+
+    (response,) = run_requests("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11")
+    assert response[0] == 200
+    assert len(stub.requests) == 2
+
+
+def test_async_chart_etag_and_not_modified(stub):
+    stub.queue(StubResponse(body=TRANSACTIONS))
+    url = "/analytics/pie/income?userId=1&startMonth=2023-11&endMonth=2023-11"
+
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        try:
+            status, _, headers = await call_asgi_raw(app, url)
+            again = await call_asgi_raw(app, url, {"If-None-Match": headers["etag"]})
+            return status, headers, again
+        finally:
+            await async_routes.async_transaction_client.aclose()
+
+    status, headers, (again_status, again_body, again_headers) = asyncio.run(main())
+    assert status == 200
+    assert headers["cache-control"] == "private, no-cache"
+    assert again_status == 304
+    assert again_body == b""
+    assert again_headers["etag"] == headers["etag"]
+
+
+def test_async_metrics_and_server_timing(stub, monkeypatch):
+    monkeypatch.setattr("src.asgi.SERVER_TIMING", True)
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        try:
+            chart = await call_asgi_raw(app, "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11")
+            return chart, await call_asgi_raw(app, "/metrics")
+        finally:
+            await async_routes.async_transaction_client.aclose()
+
+    (status, _, headers), (metrics_status, body, metrics_headers) = asyncio.run(main())
+    assert status == 200
+    assert [part.split(";")[0] for part in headers["server-timing"].split(", ")] == \
+        ["decode", "fetch", "aggregate", "serialize"]
+    assert metrics_status == 200
+    assert metrics_headers["content-type"].startswith("text/plain")
+    assert 'analytics_requests_total{endpoint="analytics.get_line_chart",status="200"}' in body.decode()
+    assert 'analytics_cache_hits_total{cache="async_transactions"}' in body.decode()
+
+
+def test_async_health_endpoints(stub):
+    live, ready = run_requests("/healthz", "/readyz")
+    assert live == (200, {"status": "ok"})
+    assert ready == (200, {"status": "ok", "transactionService": "closed"})
+
+
+def test_async_lifespan_warms_up(stub):
+    stub.queue(StubResponse(body=TRANSACTIONS))
+
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            message = messages.pop(0)
+            if message['type'] == 'lifespan.shutdown':
+                # serve one request between startup and shutdown
+                await call_asgi(app, "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11")
+            return message
+
+        async def send(message):
+            sent.append(message['type'])
+
+        await app({'type': 'lifespan'}, receive, send)
+        return sent
+
+    assert asyncio.run(main()) == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    # the chart request reused the connection opened during startup
+    assert stub.head_ports == [stub.requests[0]["client_port"]]
+
+
+def test_async_response_compression(stub):
+    import gzip
+    stub.queue(StubResponse(body=TRANSACTIONS))
+    url = "/analytics/line?userId=1&startMonth=2000-01&endMonth=2023-12"
+
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        try:
+            return await call_asgi_raw(app, url), await call_asgi_raw(app, url, {"Accept-Encoding": "gzip"})
+        finally:
+            await async_routes.async_transaction_client.aclose()
+
+    (_, plain, plain_headers), (status, packed, headers) = asyncio.run(main())
+    assert status == 200
+    assert "content-encoding" not in plain_headers
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == "W/" + plain_headers["etag"]
+    assert json.loads(gzip.decompress(packed)) == json.loads(plain)
+
+
+def test_async_chart_stream(stub, monkeypatch):
+    """Streams wait on the event loop; keep-alives poll the feed through the async client."""
+    stub.queue(StubResponse(body=TRANSACTIONS))
+    monkeypatch.setattr(async_routes, "STREAM_HEARTBEAT", 0.01)
+    monkeypatch.setattr(async_routes, "STREAM_POLL_INTERVAL", 0.01)
+
+    async def main():
+        app = create_asgi_app(client=async_routes.async_transaction_client)
+        try:
+            return await read_stream(app, "/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12&charts=line", 3)
+        finally:
+            await async_routes.async_transaction_client.aclose()
+
+    start, chunks = asyncio.run(main())
+    assert start['status'] == 200
+    assert (b'content-type', b'text/event-stream') in start['headers']
+    event, data = chunks[0].split(b"\n")[:2]
+    assert event == b"event: snapshot"
+    assert json.loads(data[len(b"data: "):]) == {"charts": [{
+        "labels": ["11-2023", "12-2023"], "incomeData": [2000.0, 0.0], "expenseData": [150.75, 0.0]
+    }]}
+    assert chunks[1:] == [b": keepalive\n\n"] * 2
+    assert len(stub.requests) >= 2 and stub.requests[0]["query"].get("startDate") is None
+    # the disconnect closed the subscription
+    assert async_routes.async_chart_streams.stats()["subscriptions"] == 0
+
+
+def test_async_chart_stream_errors(stub, monkeypatch):
+    stub.queue(StubResponse(status=500))
+    bad_charts, upstream_down = run_requests(
+        "/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12&charts=line,bar:Savings:x",
+        "/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12"
+    )
+    assert bad_charts[0] == 400
+    assert upstream_down[0] == 502
+
+    monkeypatch.setattr(async_routes.async_chart_streams, "max_subscriptions", 0)
+    [(status, _)] = run_requests("/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12")
+    assert status == 503
+    assert async_routes.async_chart_streams.stats()["subscriptions"] == 0
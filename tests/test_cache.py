@@ -0,0 +1,54 @@
+from src.utils.cache import TransactionCache, auth_identity, estimate_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_ttl_and_counters():
+    clock = FakeClock()
+    cache = TransactionCache(ttl=10, max_entries=4, max_bytes=10 ** 6, clock=clock)
+    key = cache.make_key(1, "Bearer abc")
+
+    assert cache.get(key) is None
+    cache.set(key, [{"amount": 1}])
+    assert cache.get(key) == [{"amount": 1}]
+
+    clock.now = 10.5
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+
+
+def test_cache_lru_eviction_by_count_and_bytes():
+    cache = TransactionCache(ttl=60, max_entries=2, max_bytes=10 ** 6)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    cache.get("a")          # "b" is now least recently used
+    cache.set("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.stats()["evictions"] == 1
+
+    small = TransactionCache(ttl=60, max_entries=10, max_bytes=estimate_size([{"amount": 1}]) * 2)
+    for i in range(5):
+        small.set(i, [{"amount": i}])
+    assert small.stats()["entries"] == 2
+    assert small.stats()["bytes"] <= small.max_bytes
+
+
+def test_cache_disabled_and_auth_identity():
+    cache = TransactionCache(ttl=0, max_entries=10, max_bytes=10 ** 6)
+    cache.set("a", [1])
+    assert cache.get("a") is None
+
+    assert auth_identity(None) == ''
+    assert auth_identity("Bearer abc") != "Bearer abc"
+    assert auth_identity("Bearer abc") == auth_identity("Bearer abc")
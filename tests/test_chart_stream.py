@@ -0,0 +1,205 @@
+import asyncio
+
+import pytest
+
+from src.utils.aggregator import bucket_transactions
+from src.utils.chart_stream import ChartStreams, StreamLimitExceeded, chart_delta
+from src.utils.date_utils import month_key
+
+OWNER = ("7", "identity")
+DEC, JAN = month_key(12, 2023), month_key(1, 2024)
+CHARTS = [("line", None, None), ("pie/expense", None, None)]
+EXPENSES = ["Rent", "Groceries", "Other"]
+INCOME = ["Salary", "Other"]
+
+TRANSACTIONS = [
+    {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+    {"date": "2023-12-24", "type": "receive", "amount": 20, "category": "Salary"}
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Upstream:
+    """Records the windows asked for and serves the current rows."""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.windows = []
+
+    def __call__(self, window):
+        self.windows.append(window)
+        return list(self.transactions)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def streams(clock):
+    return ChartStreams(max_subscriptions=3, max_pending=2, clock=clock)
+
+
+def drain(subscription):
+    events = []
+    while True:
+        event = subscription.next_event(0)
+        if event is None:
+            return events
+        events.append(event)
+
+
+def test_chart_delta():
+    old = {"labels": ["11-2023", "12-2023"], "incomeData": [0.0, 20.0], "expenseData": [50.0, 0.0]}
+    new = {"labels": ["11-2023", "12-2023"], "incomeData": [0.0, 20.0], "expenseData": [50.0, 12.5]}
+    assert chart_delta(old, new) == {"expenseData": [[1, 12.5]]}
+    assert chart_delta(new, new) == {}
+
+
+def test_ingest_pushes_only_changed_points(streams):
+    upstream = Upstream(TRANSACTIONS)
+    recent = streams.subscribe(OWNER, upstream, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN)
+    old = streams.subscribe(OWNER, upstream, (1, 2023, 3, 2023), CHARTS, EXPENSES, INCOME, JAN)
+    assert upstream.windows == [None]  # one full-history fetch per owner
+
+    [(event, data)] = drain(recent)
+    assert event == "snapshot"
+    assert data["charts"][0]["expenseData"] == [50.0, 0.0]
+    drain(old)
+
+    new = bucket_transactions([{"date": "2023-12-02", "type": "spent", "amount": 12.5, "category": "Rent"}])
+    assert streams.ingest(7, new) == 1
+    assert drain(recent) == [("delta", {"charts": [
+        {"index": 0, "changes": {"expenseData": [[1, 12.5]]}},
+        {"index": 1, "changes": {"data": [[0, 12.5]]}}
+    ]})]
+    assert drain(old) == []  # window without a changed month
+    assert streams.ingest(8, new) == 0
+    assert streams.stats() == {"feeds": 1, "subscriptions": 2, "published": 1, "polls": 0}
+
+
+def test_poll_refetches_from_the_high_water_mark(streams, clock):
+    upstream = Upstream(TRANSACTIONS)
+    subscription = streams.subscribe(OWNER, upstream, (11, 2023, 1, 2024), CHARTS, EXPENSES, INCOME, DEC)
+    drain(subscription)
+
+    assert streams.poll(subscription.feed, 30, JAN) == 0  # not due yet
+    clock.now += 30
+    upstream.transactions = TRANSACTIONS + [
+        {"date": "2024-01-05", "type": "receive", "amount": 2000, "category": "Salary"}
+    ]
+    assert streams.poll(subscription.feed, 30, JAN) == 1
+    assert upstream.windows[1] == (12, 2023, 1, 2024)
+    assert drain(subscription) == [("delta", {"charts": [{"index": 0, "changes": {"incomeData": [[2, 2000.0]]}}]})]
+
+    # December is closed now; only January is re-fetched
+    clock.now += 30
+    assert streams.poll(subscription.feed, 30, JAN) == 0
+    assert upstream.windows[2] == (1, 2024, 1, 2024)
+
+
+def test_poll_does_not_block_ingest_while_fetching(streams, clock):
+    import threading
+
+    upstream = Upstream(TRANSACTIONS)
+    subscription = streams.subscribe(OWNER, upstream, (11, 2023, 1, 2024), CHARTS, EXPENSES, INCOME, DEC)
+    drain(subscription)
+
+    fetching, release = threading.Event(), threading.Event()
+
+    def slow_fetch(window):
+        fetching.set()
+        release.wait(5)
+        return upstream(window)
+
+    subscription.feed.fetch = slow_fetch
+    clock.now += 30
+    poller = threading.Thread(target=streams.poll, args=(subscription.feed, 30, JAN))
+    poller.start()
+    assert fetching.wait(5)
+
+    # the feed lock is free while upstream is slow, and the poll is already claimed
+    new = bucket_transactions([{"date": "2023-11-20", "type": "spent", "amount": 5, "category": "Groceries"}])
+    assert streams.ingest(7, new) == 1
+    assert streams.poll(subscription.feed, 30, JAN) == 0
+
+    release.set()
+    poller.join(5)
+    assert not poller.is_alive()
+    assert streams.stats()["polls"] == 1
+
+
+def test_reload_and_slow_clients(streams):
+    upstream = Upstream(TRANSACTIONS)
+    subscription = streams.subscribe(OWNER, upstream, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN)
+
+    # the queue holds the snapshot plus one delta; one more starts over
+    for amount in (1, 2):
+        streams.ingest(7, bucket_transactions([
+            {"date": "2023-11-20", "type": "spent", "amount": amount, "category": "Groceries"}
+        ]))
+    [(event, data)] = drain(subscription)
+    assert event == "snapshot"
+    assert data["charts"][0]["expenseData"] == [53.0, 0.0]
+
+    # a reload replaces the ingested totals with the upstream's
+    assert streams.reload(7) == 1
+    assert drain(subscription) == [("delta", {"charts": [
+        {"index": 0, "changes": {"expenseData": [[0, 50.0]]}},
+        {"index": 1, "changes": {"data": [[1, 50.0]]}}
+    ]})]
+
+
+def test_subscription_limit_and_unsubscribe(streams):
+    upstream = Upstream(TRANSACTIONS)
+    subscriptions = [
+        streams.subscribe(OWNER, upstream, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN) for _ in range(3)
+    ]
+    with pytest.raises(StreamLimitExceeded):
+        streams.subscribe(OWNER, upstream, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN)
+
+    for subscription in subscriptions:
+        streams.unsubscribe(subscription)
+    streams.unsubscribe(subscriptions[0])
+    assert streams.stats()["feeds"] == 0 and streams.stats()["subscriptions"] == 0
+
+    def broken(window):
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        streams.subscribe(OWNER, broken, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN)
+    assert streams.stats()["subscriptions"] == 0
+
+
+def test_async_subscription_queues_on_the_loop(streams):
+    async def main():
+        loop = asyncio.get_running_loop()
+        upstream = Upstream(TRANSACTIONS)
+        # subscribe and ingest publish from worker threads, as in the ASGI app
+        subscription = await asyncio.to_thread(
+            streams.subscribe, OWNER, upstream, (11, 2023, 12, 2023), CHARTS, EXPENSES, INCOME, JAN, loop
+        )
+        event, data = await subscription.next_event_async(1)
+        assert event == "snapshot" and data["charts"][0]["expenseData"] == [50.0, 0.0]
+        assert await subscription.next_event_async(0.01) is None
+
+        for amount in (1, 2, 4):
+            await asyncio.to_thread(streams.ingest, 7, bucket_transactions([
+                {"date": "2023-12-20", "type": "spent", "amount": amount, "category": "Rent"}
+            ]))
+        # too slow for the deltas: the full queue starts over from a snapshot
+        event, data = await subscription.next_event_async(1)
+        assert event == "snapshot" and data["charts"][0]["expenseData"] == [50.0, 7.0]
+        assert await subscription.next_event_async(0.01) is None
+        streams.unsubscribe(subscription)
+
+    asyncio.run(main())
+    assert streams.stats()["subscriptions"] == 0
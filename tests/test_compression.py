@@ -0,0 +1,68 @@
+import gzip
+import zlib
+
+import pytest
+
+from src.utils.compression import (
+    HAS_BROTLI,
+    compress,
+    is_compressible,
+    iter_compress,
+    negotiate_encoding,
+    supported_encodings,
+    weak_etag
+)
+
+ENCODINGS = ["gzip", pytest.param("br", marks=pytest.mark.skipif(not HAS_BROTLI, reason="brotli not installed"))]
+
+
+def decompress(data, encoding):
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def test_negotiate_encoding():
+    offered = ["br", "gzip"]
+    assert negotiate_encoding("gzip, deflate", offered) == "gzip"
+    assert negotiate_encoding("gzip, br", offered) == "br"  # tie => server preference
+    assert negotiate_encoding("br;q=0.5, gzip", offered) == "gzip"
+    assert negotiate_encoding("gzip;q=0, br;q=0", offered) is None
+    assert negotiate_encoding("*", offered) == "br"
+    assert negotiate_encoding("identity", offered) is None
+    assert negotiate_encoding(None, offered) is None
+    assert negotiate_encoding("gzip", []) is None
+
+
+def test_supported_encodings_and_types():
+    assert supported_encodings(["br", "gzip", "zstd"]) == (["br", "gzip"] if HAS_BROTLI else ["gzip"])
+    assert is_compressible("application/json")
+    assert is_compressible("application/x-ndjson")
+    assert not is_compressible("image/png")
+    assert weak_etag('"abc"') == 'W/"abc"'
+    assert weak_etag('W/"abc"') == 'W/"abc"'
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_compress_round_trip(encoding):
+    data = b'{"labels": ["01-2023"], "data": [1.0]}' * 100
+    packed = compress(data, encoding, 5)
+    assert len(packed) < len(data)
+    assert decompress(packed, encoding) == data
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_iter_compress_flushes_each_chunk(encoding):
+    lines = [f'{{"userId": {i}}}\n' for i in range(50)]
+    chunks = iter_compress(iter(lines), encoding, 5)
+
+    first = next(chunks)
+    # the first line can be decoded before the rest has been produced
+    if encoding == "gzip":
+        assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first) == lines[0].encode()
+    else:
+        import brotli
+        assert brotli.Decompressor().process(first) == lines[0].encode()
+
+    assert decompress(first + b"".join(chunks), encoding) == "".join(lines).encode()
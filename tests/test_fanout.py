@@ -0,0 +1,49 @@
+import threading
+import time
+
+from src.utils.fanout import fan_out
+
+
+def test_fan_out_yields_every_item_with_errors():
+    def work(n):
+        if n == 3:
+            raise ValueError("bad item")
+        return n * n
+
+    results = {item: (result, error) for item, result, error in fan_out(range(10), work, max_workers=4)}
+    assert sorted(results) == list(range(10))
+    assert results[4] == (16, None)
+    assert results[3][0] is None and isinstance(results[3][1], ValueError)
+
+
+def test_fan_out_bounds_items_in_flight():
+    lock = threading.Lock()
+    started = []
+
+    def work(n):
+        with lock:
+            started.append(n)
+        time.sleep(0.001)
+        return n
+
+    seen = 0
+    for _ in fan_out(range(100), work, max_workers=2, max_in_flight=4):
+        seen += 1
+        # never more than max_in_flight items submitted ahead of what was consumed
+        assert len(started) <= seen + 4
+    assert seen == 100
+
+
+def test_fan_out_close_cancels_pending():
+    calls = []
+
+    def work(n):
+        calls.append(n)
+        time.sleep(0.01)
+        return n
+
+    gen = fan_out(range(1000), work, max_workers=2, max_in_flight=4)
+    next(gen)
+    gen.close()
+    time.sleep(0.05)
+    assert len(calls) < 10
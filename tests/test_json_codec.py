@@ -0,0 +1,68 @@
+import datetime
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from src.utils.json_codec import HAS_ORJSON, CodecJSONProvider, JSONCodec, make_codec
+
+ENGINES = ["stdlib", pytest.param("orjson", marks=pytest.mark.skipif(not HAS_ORJSON, reason="orjson not installed"))]
+
+PAYLOAD = {
+    "labels": ["11-2023", "12-2023"],
+    "incomeData": [2000.0, 0.0],
+    "expenseData": [150.75, 0.0],
+    "category": None,
+    "note": "café"
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_codec_round_trip(engine):
+    codec = make_codec(engine)
+    assert codec.name == engine
+    encoded = codec.dumps(PAYLOAD)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == PAYLOAD
+    assert codec.loads(encoded) == PAYLOAD
+    assert codec.loads(encoded.decode("utf-8")) == PAYLOAD
+    assert list(json.loads(codec.dumps(PAYLOAD, sort_keys=True))) == sorted(PAYLOAD)
+    # usable as a json.loads() `cls`, e.g. resp.json(cls=...)
+    assert json.loads(json.dumps(PAYLOAD), cls=codec.decoder_class) == PAYLOAD
+    with pytest.raises(ValueError):
+        codec.loads(b"[1, 2")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_codec_encodes_numpy_values(engine):
+    np = pytest.importorskip("numpy")
+    codec = make_codec(engine)
+    assert json.loads(codec.dumps({"total": np.float64(1.5)})) == {"total": 1.5}
+
+
+def test_make_codec_fallback(monkeypatch):
+    assert type(make_codec("stdlib")) is JSONCodec
+    monkeypatch.setattr("src.utils.json_codec.HAS_ORJSON", False)
+    assert make_codec("orjson").name == "stdlib"
+    assert make_codec("auto").name == "stdlib"
+    with pytest.raises(ValueError):
+        make_codec("simdjson")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_provider_matches_flask_default(engine):
+    payload = dict(PAYLOAD, when=datetime.datetime(2023, 11, 3, 12, 0))
+    default_app = Flask(__name__)
+    codec_app = Flask(__name__)
+    codec_app.json = CodecJSONProvider(codec_app, make_codec(engine))
+
+    with default_app.app_context():
+        expected = jsonify(payload)
+    with codec_app.app_context():
+        response = jsonify(payload)
+        assert codec_app.json.loads(codec_app.json.dumps(payload)) == json.loads(expected.data)
+
+    assert response.mimetype == "application/json"
+    assert response.data.endswith(b"\n")
+    assert json.loads(response.data) == json.loads(expected.data)
+    assert list(json.loads(response.data)) == sorted(payload)
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from src.utils.json_stream import iter_json_array
+
+
+def chunked(raw, size):
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def test_iter_json_array_any_chunking():
+    document = [
+        {"date": "2023-11-03", "type": "spent", "amount": 12.5e3, "category": "Café ]\"x,"},
+        {"nested": [1, {"a": None}], "flag": True},
+        -7,
+        "text"
+    ]
+    raw = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    for size in (1, 2, 5, 64, len(raw)):
+        assert list(iter_json_array(chunked(raw, size))) == document
+
+    assert list(iter_json_array([b" [ ] "])) == []
+
+
+@pytest.mark.parametrize("raw", [b"", b"[1,2", b'{"a": 1}', b"[1 2]", b"[1,]", b"[,1]", b"[1] x"])
+def test_iter_json_array_rejects_invalid(raw):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(raw, 2) or [raw]))
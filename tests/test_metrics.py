@@ -0,0 +1,78 @@
+import threading
+
+from src.utils.metrics import Histogram, Instrumentation, server_timing, stats_collector
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", (0.1, 1), ["stage"])
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, "fetch")
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{stage="fetch",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="fetch",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="fetch",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="fetch"} 6.05' in lines
+    assert 'latency_seconds_count{stage="fetch"} 4' in lines
+
+
+def test_histogram_is_thread_safe():
+    histogram = Histogram("n", "N.", (10,))
+
+    def observe():
+        for _ in range(1000):
+            histogram.observe(1)
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert "n_count 8000" in histogram.render()
+
+
+def test_request_timings_and_server_timing():
+    instrumentation = Instrumentation()
+    token = instrumentation.start_request()
+    with instrumentation.stage("fetch"):
+        pass
+    with instrumentation.stage("aggregate"):
+        pass
+    timings = instrumentation.finish_request(token, "analytics.get_line_chart", 200)
+
+    assert list(timings) == ["fetch", "aggregate"]
+    assert server_timing({"fetch": 0.0123, "aggregate": 0.001}) == "fetch;dur=12.3, aggregate;dur=1.0"
+    text = instrumentation.render()
+    assert 'analytics_requests_total{endpoint="analytics.get_line_chart",status="200"} 1' in text
+    assert 'analytics_stage_seconds_count{stage="aggregate"} 1' in text
+
+
+def test_disabled_instrumentation_records_nothing():
+    instrumentation = Instrumentation(enabled=False)
+    token = instrumentation.start_request()
+    with instrumentation.stage("fetch"):
+        pass
+    instrumentation.observe_workload(100, 12)
+
+    assert instrumentation.finish_request(token, "x", 200) == {}
+    assert "analytics_stage_seconds_count" not in instrumentation.render()
+
+
+def test_stats_collector_merges_sources():
+    class Source:
+        def __init__(self, hits):
+            self.hits = hits
+
+        def stats(self):
+            return {"hits": self.hits, "entries": 2}
+
+    instrumentation = Instrumentation()
+    instrumentation.add_collector(stats_collector("cache", "name", {"a": Source(3)}, counters=("hits",)))
+    instrumentation.add_collector(stats_collector("cache", "name", {"b": Source(4)}, counters=("hits",)))
+
+    text = instrumentation.render()
+    assert text.count("# TYPE cache_hits_total counter") == 1
+    assert 'cache_hits_total{name="a"} 3' in text
+    assert 'cache_hits_total{name="b"} 4' in text
+    assert "# TYPE cache_entries gauge" in text
@@ -0,0 +1,131 @@
+import pytest
+
+from src.utils.date_utils import month_key
+from src.utils.rollups import (
+    MemoryRollupStore,
+    SQLiteRollupStore,
+    make_rollup_store,
+    plan_rollup,
+    rollup_buckets
+)
+
+OWNER = ("7", "identity")
+NOV, DEC, JAN = month_key(11, 2023), month_key(12, 2023), month_key(1, 2024)
+
+TRANSACTIONS = [
+    {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+    {"date": "2023-11-20", "type": "spent", "amount": 25, "category": "Groceries"},
+    {"date": "2024-01-05", "type": "receive", "amount": 2000, "category": "Salary"},
+    {"date": "2024-01-06", "type": "spent", "amount": 10, "category": None}
+]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRollupStore()
+    return SQLiteRollupStore(str(tmp_path / "rollups.sqlite3"))
+
+
+class Upstream:
+    """Records the sub-windows asked for and serves the matching rows."""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.windows = []
+
+    def __call__(self, window):
+        self.windows.append(window)
+        return list(self.transactions)
+
+
+def test_store_roundtrip_and_empty_months(store):
+    store.save(OWNER, [NOV, DEC], {
+        (2023, 11, "spent", "Groceries"): 75.0,
+        (2023, 11, "spent", None): 5.0,
+        (2024, 1, "spent", "Rent"): 600.0  # not in the saved months
+    })
+
+    assert store.missing_months(OWNER, [NOV, DEC, JAN]) == [JAN]
+    assert store.load(OWNER, [NOV, DEC, JAN]) == {
+        (2023, 11, "spent", "Groceries"): 75.0,
+        (2023, 11, "spent", None): 5.0
+    }
+    assert store.missing_months(("7", "other"), [NOV]) == [NOV]
+
+
+def test_store_invalidation(store):
+    store.save(OWNER, [NOV, DEC], {(2023, 11, "spent", "Groceries"): 75.0})
+    store.save(("8", "identity"), [NOV], {})
+
+    store.invalidate(7, [NOV])
+    assert store.missing_months(OWNER, [NOV, DEC]) == [NOV]
+    assert store.missing_months(("8", "identity"), [NOV]) == []
+
+    store.invalidate(7)
+    assert store.missing_months(OWNER, [NOV, DEC]) == [NOV, DEC]
+
+    store.clear()
+    assert store.missing_months(("8", "identity"), [NOV]) == [NOV]
+
+
+def test_only_open_months_are_refetched(store):
+    upstream = Upstream(TRANSACTIONS)
+    window = (11, 2023, 1, 2024)
+
+    first = rollup_buckets(store, OWNER, window, upstream, current_key=JAN)
+    assert upstream.windows == [(11, 2023, 1, 2024)]
+    assert first[(2023, 11, "spent", "Groceries")] == 75.0
+    assert first[(2024, 1, "receive", "Salary")] == 2000.0
+
+    # November and December are closed now: only January is fetched again
+    second = rollup_buckets(store, OWNER, window, upstream, current_key=JAN)
+    assert upstream.windows[1] == (1, 2024, 1, 2024)
+    assert second == first
+
+    # a window of closed months needs no upstream call at all
+    rollup_buckets(store, OWNER, (11, 2023, 12, 2023), upstream, current_key=JAN)
+    assert len(upstream.windows) == 2
+
+
+def test_plan_fetches_from_first_missing_month(store):
+    store.save(OWNER, [NOV], {})
+    assert plan_rollup(store, OWNER, (11, 2023, 12, 2023), current_key=JAN) == (12, 2023, 12, 2023)
+    store.save(OWNER, [DEC], {})
+    assert plan_rollup(store, OWNER, (11, 2023, 12, 2023), current_key=JAN) is None
+    assert plan_rollup(store, OWNER, (10, 2023, 12, 2023), current_key=JAN) == (10, 2023, 12, 2023)
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_store_is_bounded_by_owner(kind):
+    store = make_rollup_store(kind, ":memory:", max_owners=2)
+    store.save(("1", "old-token"), [NOV], {(2023, 11, "spent", "Rent"): 10.0})
+    store.save(("2", ""), [NOV], {})
+    store.load(("1", "old-token"), [NOV])
+    store.save(("1", "new-token"), [NOV], {})
+
+    # owner 2 was the least recently used
+    assert store.missing_months(("2", ""), [NOV]) == [NOV]
+    assert store.missing_months(("1", "old-token"), [NOV]) == []
+    assert store.missing_months(("1", "new-token"), [NOV]) == []
+
+    store.save(("3", ""), [NOV], {})
+    assert store.missing_months(("1", "old-token"), [NOV]) == [NOV]
+    assert store.load(("1", "old-token"), [NOV]) == {}
+
+
+def test_make_rollup_store():
+    assert make_rollup_store("none") is None
+    assert isinstance(make_rollup_store("memory"), MemoryRollupStore)
+    assert isinstance(make_rollup_store("sqlite", ":memory:"), SQLiteRollupStore)
+    with pytest.raises(ValueError):
+        make_rollup_store("redis")
+
+
+def test_sqlite_store_reopens_after_fork(tmp_path):
+    store = SQLiteRollupStore(str(tmp_path / "rollups.sqlite3"))
+    store.save(OWNER, [NOV], {(2023, 11, "spent", "Rent"): 10.0})
+
+    store.reopen()
+    assert store.load(OWNER, [NOV]) == {(2023, 11, "spent", "Rent"): 10.0}
+    store.close()
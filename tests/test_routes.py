@@ -1,19 +1,23 @@
 import pytest
 import json
+import requests
 from unittest.mock import patch
 from src.app import create_app
+from src.routes.analytics_routes import transaction_cache, transaction_client
 
 
 @pytest.fixture
-def client():
-    """Creates a test client for the Flask app."""
+def client(monkeypatch):
+    """Creates a test client for the Flask app (transaction cache disabled)."""
+    monkeypatch.setattr(transaction_cache, "ttl", 0)
+    transaction_client.breaker.reset()
     app = create_app()
     app.config["TESTING"] = True
     with app.test_client() as client:
         yield client
 
 
-@patch("src.routes.analytics_routes.requests.get")
+@patch("src.routes.analytics_routes.transaction_client.session.get")
 def test_get_line_chart(mock_get, client):
     """Covers /analytics/line for valid and error cases."""
 
@@ -55,7 +59,7 @@ def test_get_line_chart(mock_get, client):
     assert b"Missing required parameters" in response.data
 
 
-@patch("src.routes.analytics_routes.requests.get")
+@patch("src.routes.analytics_routes.transaction_client.session.get")
 def test_get_expense_pie_range(mock_get, client):
     """Covers /analytics/pie/expense route."""
 
@@ -85,7 +89,7 @@ def test_get_expense_pie_range(mock_get, client):
     assert b"Missing required params" in response.data
 
 
-@patch("src.routes.analytics_routes.requests.get")
+@patch("src.routes.analytics_routes.transaction_client.session.get")
 def test_get_income_pie_range(mock_get, client):
     """Covers /analytics/pie/income route."""
 
@@ -114,7 +118,7 @@ def test_get_income_pie_range(mock_get, client):
     assert b"Missing required params" in response.data
 
 
-@patch("src.routes.analytics_routes.requests.get")
+@patch("src.routes.analytics_routes.transaction_client.session.get")
 def test_get_bar_chart(mock_get, client):
     """Covers /analytics/bar route."""
     mock_transactions = [
@@ -143,11 +147,629 @@ def test_get_bar_chart(mock_get, client):
     assert b"Missing required parameters" in response.data
 
 
-@patch("src.routes.analytics_routes.requests.get")
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_chart_granularity(mock_get, client, monkeypatch):
+    """/line and /bar accept day/week/month/quarter/year; day charts bypass the rollup store."""
+    from src.routes import analytics_routes
+    from src.utils.rollups import MemoryRollupStore
+    monkeypatch.setattr(analytics_routes, "rollup_store", MemoryRollupStore())
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Groceries"},
+        {"date": "2023-02-15", "type": "spent", "amount": 50, "category": "Groceries"},
+        {"date": "2023-04-03", "type": "receive", "amount": 900, "category": "Salary"}
+    ]
+
+    quarterly = json.loads(client.get(
+        "/analytics/bar?userId=1&startMonth=2023-01&endMonth=2023-06&type=Expense&category=Groceries"
+        "&granularity=quarter"
+    ).data)
+    assert quarterly == {"labels": ["Q1-2023", "Q2-2023"], "data": [150.0, 0.0]}
+
+    weekly = json.loads(client.get(
+        "/analytics/line?userId=1&startMonth=2023-04&endMonth=2023-04&granularity=week"
+    ).data)
+    assert weekly["labels"][:2] == ["W13-2023", "W14-2023"]
+    assert weekly["incomeData"][:2] == [0.0, 900.0]
+
+    daily = json.loads(client.get("/analytics/line?userId=1&startMonth=2023-02&endMonth=2023-02&granularity=day").data)
+    assert len(daily["labels"]) == 28
+    assert daily["expenseData"][14] == 50.0
+
+    response = client.get("/analytics/line?userId=1&startMonth=2023-01&endMonth=2023-02&granularity=hour")
+    assert response.status_code == 400
+    assert b"Invalid granularity" in response.data
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
 def test_transaction_service_unavailable(mock_get, client):
     """Simulates Transaction Service downtime (502 response)."""
     mock_get.return_value.status_code = 500
 
     response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12")
     assert response.status_code == 502
-    assert b"Unable to fetch transactions" in response.data
\ No newline at end of file
+    assert b"Unable to fetch transactions" in response.data
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_transactions_cached_across_charts(mock_get, client, monkeypatch):
+    """Line + pie for the same user and token hit the Transaction Service once."""
+    monkeypatch.setattr(transaction_cache, "ttl", 60)
+    transaction_cache.clear()
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}
+    ]
+    headers = {"Authorization": "Bearer abc"}
+
+    assert client.get("/analytics/line?userId=7&startMonth=2023-11&endMonth=2023-11", headers=headers).status_code == 200
+    assert client.get("/analytics/pie/expense?userId=7&startMonth=2023-11&endMonth=2023-11", headers=headers).status_code == 200
+    assert mock_get.call_count == 1
+
+    # a different auth identity is a separate cache entry
+    client.get("/analytics/line?userId=7&startMonth=2023-11&endMonth=2023-11", headers={"Authorization": "Bearer xyz"})
+    assert mock_get.call_count == 2
+    transaction_cache.clear()
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_get_dashboard(mock_get, client):
+    """Covers /analytics/dashboard: one upstream call, every chart in the response."""
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-01-01", "type": "spent", "amount": 100, "category": "Groceries"},
+        {"date": "2023-02-15", "type": "spent", "amount": 20, "category": "Rent"},
+        {"date": "2023-02-20", "type": "receive", "amount": 1000, "category": "Salary"}
+    ]
+
+    response = client.get(
+        "/analytics/dashboard?userId=1&startMonth=2023-01&endMonth=2023-02"
+        "&bar=Expense:Groceries&bar=Income:Salary"
+    )
+    assert response.status_code == 200
+    assert mock_get.call_count == 1
+    data = json.loads(response.data)
+
+    assert data["line"] == {
+        "labels": ["01-2023", "02-2023"],
+        "incomeData": [0.0, 1000.0],
+        "expenseData": [100.0, 20.0]
+    }
+    assert data["expensePie"]["data"] == [20.0, 100.0, 0.0, 0.0, 0.0]
+    assert data["incomePie"]["data"] == [1000.0, 0.0, 0.0, 0.0, 0.0]
+    assert data["bars"] == [
+        {"type": "Expense", "category": "Groceries", "labels": ["01-2023", "02-2023"], "data": [100.0, 0.0]},
+        {"type": "Income", "category": "Salary", "labels": ["01-2023", "02-2023"], "data": [0.0, 1000.0]}
+    ]
+
+    # Invalid bar spec
+    response = client.get("/analytics/dashboard?userId=1&startMonth=2023-01&endMonth=2023-02&bar=Groceries")
+    assert response.status_code == 400
+    assert b"Invalid bar spec" in response.data
+
+    # Missing parameters
+    response = client.get("/analytics/dashboard?userId=1&startMonth=2023-01")
+    assert response.status_code == 400
+    assert b"Missing required parameters" in response.data
+
+    # Upstream failure
+    mock_get.return_value.status_code = 500
+    response = client.get("/analytics/dashboard?userId=1&startMonth=2023-01&endMonth=2023-02")
+    assert response.status_code == 502
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_circuit_open_returns_503(mock_get, client):
+    """Once the upstream keeps failing, handlers fail fast with 503."""
+    mock_get.return_value.status_code = 500
+    breaker = transaction_client.breaker
+
+    for _ in range(breaker.failure_threshold):
+        assert client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12").status_code == 502
+
+    calls = mock_get.call_count
+    response = client.get("/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-12")
+    assert response.status_code == 503
+    assert mock_get.call_count == calls
+    breaker.reset()
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_streaming_ingestion(mock_get, client, monkeypatch):
+    """With STREAM_TRANSACTIONS on, the body is parsed chunk by chunk into buckets."""
+    monkeypatch.setattr("src.routes.analytics_routes.STREAM_TRANSACTIONS", True)
+    raw = json.dumps([
+        {"date": "2023-11-03", "type": "spent", "amount": 150.75, "category": "Groceries"},
+        {"date": "2023-11-04", "type": "receive", "amount": 2000.00, "category": "Salary"}
+    ]).encode()
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.encoding = None
+    mock_get.return_value.iter_content.return_value = [raw[i:i + 10] for i in range(0, len(raw), 10)]
+
+    response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12")
+    assert response.status_code == 200
+    assert json.loads(response.data)["incomeData"] == [2000.0, 0.0]
+    assert mock_get.call_args.kwargs["stream"] is True
+
+    # day/week charts are bucketed per day as the body streams in
+    response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&granularity=day")
+    assert json.loads(response.data)["expenseData"][2] == 150.75
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_rollups_reuse_closed_months(mock_get, client, monkeypatch):
+    """Closed months are aggregated once; invalidate_rollups() forces a refetch."""
+    from src.routes import analytics_routes
+    from src.utils.rollups import MemoryRollupStore
+    monkeypatch.setattr(analytics_routes, "rollup_store", MemoryRollupStore())
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+        {"date": "2023-12-24", "type": "receive", "amount": 20, "category": "Gifts"}
+    ]
+    url = "/analytics/line?userId=7&startMonth=2023-11&endMonth=2023-12"
+
+    first = json.loads(client.get(url).data)
+    assert first["expenseData"] == [50.0, 0.0]
+    assert first["incomeData"] == [0.0, 20.0]
+    assert mock_get.call_args.kwargs["params"]["startDate"] == "2023-11-01"
+
+    # answered from the rollups alone; a narrower window too
+    assert json.loads(client.get(url).data) == first
+    pie = json.loads(client.get("/analytics/pie/income?userId=7&startMonth=2023-12&endMonth=2023-12").data)
+    assert pie["data"][pie["labels"].index("Gifts")] == 20.0
+    assert mock_get.call_count == 1
+
+    analytics_routes.invalidate_rollups(7)
+    client.get(url)
+    assert mock_get.call_count == 2
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_snapshot_answers_charts_locally(mock_get, client, monkeypatch):
+    """Charts are summed from the local snapshot; invalidate_rollups() drops it."""
+    from src.routes import analytics_routes
+    from src.utils.snapshots import SnapshotStore
+    monkeypatch.setattr(analytics_routes, "snapshot_store", SnapshotStore(":memory:"))
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+        {"date": "2023-12-24", "type": "receive", "amount": 20, "category": "Gifts"}
+    ]
+    url = "/analytics/line?userId=7&startMonth=2023-11&endMonth=2023-12"
+
+    first = json.loads(client.get(url).data)
+    assert first["expenseData"] == [50.0, 0.0]
+    assert first["incomeData"] == [0.0, 20.0]
+    assert "startDate" not in mock_get.call_args.kwargs["params"]  # first sync: full history
+
+    # the snapshot is fresh: other charts and windows need no upstream call
+    pie = json.loads(client.get("/analytics/pie/income?userId=7&startMonth=2023-12&endMonth=2023-12").data)
+    assert pie["data"][pie["labels"].index("Gifts")] == 20.0
+    assert mock_get.call_count == 1
+
+    analytics_routes.invalidate_rollups(7)
+    assert json.loads(client.get(url).data) == first
+    assert mock_get.call_count == 2
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_prefix_index_answers_any_window_from_one_fetch(mock_get, client, monkeypatch):
+    """Dragging the date-range slider re-uses the cached prefix index."""
+    from src.routes import analytics_routes
+    monkeypatch.setattr("src.routes.analytics_routes.PREFIX_INDEX", True)
+    monkeypatch.setattr(transaction_cache, "ttl", 60)
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+        {"date": "2023-12-24", "type": "receive", "amount": 20, "category": "Gifts"},
+        {"date": "2024-02-01", "type": "spent", "amount": 12.5, "category": "Groceries"}
+    ]
+
+    for start, end, groceries in [("2023-11", "2024-02", 62.5), ("2023-12", "2024-02", 12.5), ("2023-12", "2024-01", 0.0)]:
+        pie = json.loads(client.get(f"/analytics/pie/expense?userId=7&startMonth={start}&endMonth={end}").data)
+        assert pie["data"][pie["labels"].index("Groceries")] == groceries
+    line = json.loads(client.get("/analytics/line?userId=7&startMonth=2023-10&endMonth=2024-03&granularity=quarter").data)
+    assert line == {"labels": ["Q4-2023", "Q1-2024"], "incomeData": [20.0, 0.0], "expenseData": [50.0, 12.5]}
+    assert mock_get.call_count == 1
+    assert "startDate" not in mock_get.call_args.kwargs["params"]  # whole history
+
+    # day charts still need transactions; invalidation drops the index
+    client.get("/analytics/line?userId=7&startMonth=2023-11&endMonth=2023-11&granularity=day")
+    assert mock_get.call_count == 2
+    analytics_routes.invalidate_rollups(7)
+    client.get("/analytics/pie/expense?userId=7&startMonth=2023-11&endMonth=2024-02")
+    assert mock_get.call_count == 3
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_approx_mode_and_distribution(mock_get, client, monkeypatch):
+    """mode=approx charts sample rows and report error bounds."""
+    monkeypatch.setattr("src.routes.analytics_routes.APPROX_SAMPLE_SIZE", 2)
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": amount, "category": "Groceries"}
+        for amount in (10, 20, 30)
+    ]
+
+    line = json.loads(client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx").data)
+    assert line["approx"] == {"sampled": 2, "population": 3, "confidence": 0.95, "truncated": False}
+    assert line["expenseError"][0] > 0
+    pie = json.loads(client.get("/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx").data)
+    assert len(pie["error"]) == len(pie["data"])
+    bar = client.get("/analytics/bar?userId=1&startMonth=2023-11&endMonth=2023-11"
+                     "&type=Expense&category=Groceries&mode=approx")
+    assert json.loads(bar.data)["labels"] == ["11-2023"]
+
+    response = client.get("/analytics/distribution?userId=1&startMonth=2023-11&endMonth=2023-12")
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["median"][0] == pytest.approx(20, rel=0.01)
+    assert data["median"][1] is None and data["count"] == [3, 0]
+
+    for path in ("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&mode=fast",
+                 "/analytics/distribution?userId=1&startMonth=2023-11&endMonth=2023-11&granularity=day",
+                 "/analytics/distribution?userId=1&startMonth=2023-11&endMonth=2023-11&type=Transfer"):
+        assert client.get(path).status_code == 400
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_approx_mode_uses_the_prefix_index(mock_get, client, monkeypatch):
+    """With a monthly source, mode=approx charts are answered from it exactly, like exact ones."""
+    monkeypatch.setattr("src.routes.analytics_routes.PREFIX_INDEX", True)
+    monkeypatch.setattr(transaction_cache, "ttl", 60)
+    monkeypatch.setattr("src.routes.analytics_routes.APPROX_SAMPLE_SIZE", 2)
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": amount, "category": "Groceries"}
+        for amount in (10, 20, 30)
+    ]
+
+    line = json.loads(client.get("/analytics/line?userId=3&startMonth=2023-11&endMonth=2023-12&mode=approx").data)
+    assert "startDate" not in mock_get.call_args.kwargs["params"]  # the whole-history index fetch
+    assert line["expenseData"] == [60.0, 0.0] and line["expenseError"] == [0.0, 0.0]
+    assert line["approx"] == {"sampled": None, "population": None, "confidence": 0.95, "truncated": False}
+    pie = json.loads(client.get("/analytics/pie/expense?userId=3&startMonth=2023-11&endMonth=2023-11&mode=approx").data)
+    assert pie["data"][1] == 60.0 and set(pie["error"]) == {0.0}
+    assert mock_get.call_count == 1
+
+    # day charts need rows, so they still sample
+    daily = client.get("/analytics/line?userId=3&startMonth=2023-11&endMonth=2023-11&granularity=day&mode=approx")
+    assert json.loads(daily.data)["approx"]["population"] == 3
+    assert mock_get.call_count == 2
+    transaction_cache.clear()
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_truncated_approx_charts_get_no_etag(mock_get, client, monkeypatch):
+    """A scan cut by the time budget depends on timing, so its response must not be validated."""
+    monkeypatch.setattr("src.routes.analytics_routes.APPROX_TIME_BUDGET", 1e-9)
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 1, "category": "Groceries"} for _ in range(3000)
+    ]
+
+    response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx")
+    assert json.loads(response.data)["approx"]["truncated"]
+    assert "ETag" not in response.headers
+
+    monkeypatch.setattr("src.routes.analytics_routes.APPROX_TIME_BUDGET", 0)
+    response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-11&mode=approx")
+    assert not json.loads(response.data)["approx"]["truncated"]
+    assert "ETag" in response.headers
+
+
+def read_events(response, count):
+    """Parses the next `count` Server-Sent Events of a streamed response."""
+    events = []
+    for chunk in response.response:
+        if chunk.startswith(b"event: "):
+            name, data = chunk.decode().strip().split("\n")
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        if len(events) == count:
+            return events
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_chart_stream_pushes_ingested_deltas(mock_get, client, monkeypatch):
+    """One upstream fetch per stream; ingested transactions arrive as deltas."""
+    from src.routes import analytics_routes
+    monkeypatch.setattr("src.routes.analytics_routes.INGEST_SECRET", "s3cret")
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = [
+        {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}
+    ]
+    response = client.get("/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12&charts=line,bar:Expense:Rent")
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    [(event, data)] = read_events(response, 1)
+    assert event == "snapshot"
+    assert data["charts"][0]["expenseData"] == [50.0, 0.0]
+    assert data["charts"][1] == {"labels": ["11-2023", "12-2023"], "data": [0.0, 0.0]}
+
+    ingest = {"userId": 7, "transactions": [{"date": "2023-12-01", "type": "spent", "amount": 900, "category": "Rent"}]}
+    assert client.post("/analytics/ingest", json=ingest).status_code == 403
+    result = client.post("/analytics/ingest", json=ingest, headers={"X-Ingest-Secret": "s3cret"})
+    assert json.loads(result.data) == {"userId": 7, "months": 1, "streams": 1}
+    assert read_events(response, 1) == [("delta", {"charts": [
+        {"index": 0, "changes": {"expenseData": [[1, 900.0]]}},
+        {"index": 1, "changes": {"data": [[1, 900.0]]}}
+    ]})]
+    assert mock_get.call_count == 1
+
+    response.close()
+    assert analytics_routes.chart_streams.stats()["subscriptions"] == 0
+
+
+def test_chart_stream_and_ingest_errors(client, monkeypatch):
+    """Bad chart lists, the disabled webhook and malformed ingest bodies."""
+    response = client.get("/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12&charts=line,bar:Savings:x")
+    assert response.status_code == 400
+    assert client.get("/analytics/stream?userId=7").status_code == 400
+
+    # the sync worker (one thread) has no thread to spare for a stream: refused up front
+    monkeypatch.setattr("src.routes.analytics_routes.chart_streams.max_subscriptions", 0)
+    response = client.get("/analytics/stream?userId=7&startMonth=2023-11&endMonth=2023-12")
+    assert response.status_code == 503
+    assert "ASGI app" in json.loads(response.data)["error"]
+
+    assert client.post("/analytics/ingest", json={"userId": 7}).status_code == 404
+    monkeypatch.setattr("src.routes.analytics_routes.INGEST_SECRET", "s3cret")
+    headers = {"X-Ingest-Secret": "s3cret"}
+    assert client.post("/analytics/ingest", json={"transactions": []}, headers=headers).status_code == 400
+    bad = {"userId": 7, "transactions": [{"date": "2023-12-01", "amount": "x"}]}
+    assert client.post("/analytics/ingest", json=bad, headers=headers).status_code == 400
+    result = client.post("/analytics/ingest", json={"userId": 7}, headers=headers)
+    assert json.loads(result.data) == {"userId": 7, "months": None, "streams": 0}
+
+
+def upstream_response(body, status=200, headers=None):
+    """A real requests.Response, for tests that depend on raw body/headers."""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode() if status == 200 else b''
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    response.encoding = 'utf-8'
+    return response
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_chart_etag_and_not_modified(mock_get, client):
+    transactions = [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}]
+    mock_get.side_effect = lambda *a, **kw: upstream_response(transactions)
+    url = "/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    with patch("src.routes.analytics_routes.compute_line_data") as compute:
+        second = client.get(url, headers={"If-None-Match": etag})
+        assert not compute.called
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == etag
+
+    # another chart or query of the same data has its own ETag
+    pie = client.get("/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-12")
+    assert pie.headers["ETag"] != etag
+    assert client.get(url + "&x=1", headers={"If-None-Match": etag}).status_code == 200
+
+    # changed upstream data => new ETag, full response
+    transactions = [{"date": "2023-11-03", "type": "spent", "amount": 60, "category": "Groceries"}]
+    third = client.get(url, headers={"If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.headers["ETag"] != etag
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_upstream_revalidated_with_if_none_match(mock_get, client):
+    from src.routes.analytics_routes import revalidation_cache
+    revalidation_cache.clear()
+    transactions = [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}]
+    mock_get.side_effect = [
+        upstream_response(transactions, headers={"ETag": '"v7"'}),
+        upstream_response(None, status=304, headers={"ETag": '"v7"'})
+    ]
+    url = "/analytics/line?userId=9&startMonth=2023-11&endMonth=2023-11"
+
+    first = client.get(url)
+    second = client.get(url)  # transaction cache is off: goes upstream again
+    assert second.status_code == 200
+    assert json.loads(second.data) == json.loads(first.data)
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == '"v7"'
+    revalidation_cache.clear()
+
+
+def batch_upstream(*args, **kwargs):
+    """Each user has one transaction of amount == userId; user 13 fails."""
+    user_id = int(kwargs["params"]["userId"])
+    if user_id == 13:
+        return upstream_response(None, status=500)
+    return upstream_response([
+        {"date": "2023-11-03", "type": "spent", "amount": user_id, "category": "Rent"}
+    ])
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_batch_streams_ndjson_per_user(mock_get, client):
+    mock_get.side_effect = batch_upstream
+    response = client.post("/analytics/batch", json={
+        "userIds": list(range(1, 21)),
+        "startMonth": "2023-11",
+        "endMonth": "2023-12",
+        "charts": ["line", "pie/expense", {"chart": "bar", "type": "Expense", "category": "Rent"}]
+    })
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = {line["userId"]: line for line in map(json.loads, response.data.decode().splitlines())}
+    assert sorted(lines) == list(range(1, 21))
+    line_chart, pie, bar = lines[5]["charts"]
+    assert line_chart["expenseData"] == [5.0, 0.0]
+    assert pie["data"][pie["labels"].index("Rent")] == 5.0
+    assert bar == {"labels": ["11-2023", "12-2023"], "data": [5.0, 0.0]}
+    assert lines[13]["status"] == 502
+    assert "charts" not in lines[13]
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_batch_aggregates_on_process_pool(mock_get, client, monkeypatch):
+    monkeypatch.setattr("src.routes.analytics_routes.BATCH_PROCESSES", 2)
+    mock_get.side_effect = batch_upstream
+    response = client.post("/analytics/batch", json={
+        "userIds": [1, 2, 3], "startMonth": "2023-11", "endMonth": "2023-11", "charts": ["line"]
+    })
+    lines = sorted(map(json.loads, response.data.decode().splitlines()), key=lambda l: l["userId"])
+    assert [l["charts"][0]["expenseData"] for l in lines] == [[1.0], [2.0], [3.0]]
+
+
+def test_batch_validation(client):
+    assert client.post("/analytics/batch", data="nope").status_code == 400
+    assert client.post("/analytics/batch", json={"userIds": [1]}).status_code == 400
+    response = client.post("/analytics/batch", json={
+        "userIds": [1], "startMonth": "2023-11", "endMonth": "2023-11", "charts": [{"chart": "bar"}]
+    })
+    assert response.status_code == 400
+    assert "Bar charts need" in json.loads(response.data)["error"]
+    response = client.post("/analytics/batch", json={
+        "userIds": [1], "startMonth": "2023-11", "endMonth": "2023-11", "charts": ["radar"]
+    })
+    assert response.status_code == 400
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_metrics_and_server_timing(mock_get, client, monkeypatch):
+    monkeypatch.setattr("src.routes.analytics_routes.SERVER_TIMING", True)
+    mock_get.side_effect = lambda *a, **kw: upstream_response(
+        [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}]
+    )
+
+    response = client.get("/analytics/line?userId=1&startMonth=2023-11&endMonth=2023-12")
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert stages == ["decode", "fetch", "aggregate", "serialize"]
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.content_type.startswith("text/plain; version=0.0.4")
+    text = metrics.data.decode()
+    assert 'analytics_requests_total{endpoint="analytics.get_line_chart",status="200"}' in text
+    assert 'analytics_stage_seconds_bucket{stage="decode",le="+Inf"}' in text
+    assert 'analytics_request_months_bucket{le="3"}' in text
+    assert 'analytics_cache_hits_total{cache="transactions"}' in text
+
+
+def test_metrics_disabled(client, monkeypatch):
+    from src.routes.analytics_routes import instrumentation
+    monkeypatch.setattr(instrumentation, "enabled", False)
+    assert client.get("/metrics").status_code == 404
+    response = client.get("/analytics/line?userId=1")
+    assert response.status_code == 400
+    assert "Server-Timing" not in response.headers
+
+
+def test_liveness_and_readiness(client):
+    assert client.get("/healthz").status_code == 200
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert json.loads(ready.data) == {"status": "ok", "transactionService": "closed"}
+
+    for _ in range(transaction_client.breaker.failure_threshold):
+        transaction_client.breaker.record_failure()
+    not_ready = client.get("/readyz")
+    assert not_ready.status_code == 503
+    assert json.loads(not_ready.data)["transactionService"] == "open"
+    assert client.get("/healthz").status_code == 200
+    transaction_client.breaker.reset()
+
+
+def test_gunicorn_config(monkeypatch):
+    import runpy
+    from src.routes import analytics_routes
+    monkeypatch.setattr(transaction_client, "warm_up", lambda: None)
+    settings = runpy.run_path("gunicorn.conf.py")
+    assert settings["workers"] >= 1
+    assert settings["preload_app"] is True
+    assert settings["worker_class"] == "gthread"
+    assert settings["max_requests"] > 0
+    settings["post_fork"](None, None)  # safe to call in the current process
+    assert analytics_routes.warmed_up.wait(5)
+
+
+def test_readiness_waits_for_warm_up(client, monkeypatch):
+    import threading
+    from src.routes import analytics_routes
+    release = threading.Event()
+    monkeypatch.setattr(transaction_client, "warm_up", release.wait)
+
+    analytics_routes.start_warm_up()
+    warming = client.get("/readyz")
+    assert warming.status_code == 503
+    assert json.loads(warming.data)["status"] == "warming up"
+    assert client.get("/healthz").status_code == 200
+
+    release.set()
+    assert analytics_routes.warmed_up.wait(5)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_warm_up_never_raises(monkeypatch):
+    from src.routes import analytics_routes
+
+    def broken():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(analytics_routes, "prime_engines", broken)
+    analytics_routes.warmed_up.clear()
+    analytics_routes.warm_up()
+    assert analytics_routes.warmed_up.is_set()
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_responses_compressed_above_threshold(mock_get, client):
+    import gzip
+    mock_get.side_effect = lambda *a, **kw: upstream_response(
+        [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"}]
+    )
+    long_range = "/analytics/line?userId=1&startMonth=2000-01&endMonth=2023-12"
+
+    plain = client.get(long_range)
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    packed = client.get(long_range, headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed.data) == plain.data
+    assert int(packed.headers["Content-Length"]) == len(packed.data) < len(plain.data)
+    assert packed.headers["ETag"] == "W/" + plain.headers["ETag"]
+    assert client.get(long_range, headers={
+        "Accept-Encoding": "gzip", "If-None-Match": packed.headers["ETag"]
+    }).status_code == 304
+
+    # small responses are not worth it
+    pie = client.get("/analytics/pie/expense?userId=1&startMonth=2023-11&endMonth=2023-11",
+                     headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in pie.headers
+    assert json.loads(pie.data)["labels"]
+
+
+@patch("src.routes.analytics_routes.transaction_client.session.get")
+def test_batch_stream_compressed(mock_get, client):
+    import gzip
+    mock_get.side_effect = batch_upstream
+    response = client.post("/analytics/batch", headers={"Accept-Encoding": "gzip"}, json={
+        "userIds": list(range(1, 11)), "startMonth": "2023-01", "endMonth": "2023-12", "charts": ["line"]
+    })
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    lines = [json.loads(line) for line in gzip.decompress(response.data).decode().splitlines()]
+    assert sorted(line["userId"] for line in lines) == list(range(1, 11))
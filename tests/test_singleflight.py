@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_threads(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as exc:
+            errors[i] = exc
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ["shared"]
+
+    def request():
+        return flights.do(("7", "id", None), fetch)
+
+    def release_when_joined():
+        while flights.stats()["executions"] + flights.stats()["coalesced"] < 5:
+            time.sleep(0.001)
+        release.set()
+
+    threading.Thread(target=release_when_joined).start()
+    results, errors = run_threads(5, request)
+
+    assert calls == [1]
+    assert errors == [None] * 5
+    assert all(r is results[0] for r in results)
+    assert flights.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+    # once finished, the next call runs again
+    release.set()
+    flights.do(("7", "id", None), fetch)
+    assert len(calls) == 2
+
+
+def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    def release_when_joined():
+        while flights.stats()["coalesced"] < 2:
+            time.sleep(0.001)
+        release.set()
+
+    threading.Thread(target=release_when_joined).start()
+    _, errors = run_threads(3, lambda: flights.do("k", failing))
+
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flights.do("k", lambda: "ok") == "ok"
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == 1
+    assert flights.do("b", lambda: 2) == 2
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_async_single_flight():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"data": 1}
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(10)))
+        other = await flights.do("other", fetch)
+        return results, other
+
+    results, other = asyncio.run(main())
+    assert len(calls) == 2
+    assert all(r is results[0] for r in results)
+    assert other == {"data": 1}
+    assert flights.stats() == {"executions": 2, "coalesced": 9, "in_flight": 0}
+
+
+def test_async_cancelled_caller_does_not_cancel_shared_fetch():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_async_errors_propagate():
+    flights = AsyncSingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(e, ValueError) for e in asyncio.run(main()))
@@ -0,0 +1,150 @@
+import pytest
+
+from src.utils.aggregator import bucket_transactions
+from src.utils.date_utils import month_key
+from src.utils.snapshots import SnapshotStore, SyncPlan, sync_snapshot
+
+OWNER = ("7", "identity")
+NOV, DEC, JAN = month_key(11, 2023), month_key(12, 2023), month_key(1, 2024)
+
+TRANSACTIONS = [
+    {"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Groceries"},
+    {"date": "2023-11-20", "type": "spent", "amount": 25, "category": "Groceries"},
+    {"date": "2023-12-24", "type": "receive", "amount": 20, "category": "Gifts"},
+    {"date": "2024-01-05", "type": "receive", "amount": 2000, "category": "Salary"},
+    {"date": "2024-01-06", "type": "spent", "amount": 10, "category": None}
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Upstream:
+    """Records the sync windows asked for and serves the current rows."""
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.windows = []
+
+    def __call__(self, window):
+        self.windows.append(window)
+        return iter(self.transactions)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"), clock=clock)
+    yield store
+    store.close()
+
+
+def test_group_by_matches_python_buckets(store):
+    sync_snapshot(store, OWNER, Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+
+    window = (11, 2023, 1, 2024)
+    assert store.buckets(OWNER, window) == bucket_transactions(TRANSACTIONS)
+    assert store.buckets(OWNER, (12, 2023, 12, 2023)) == {(2023, 12, "receive", "Gifts"): 20.0}
+    assert store.buckets(("7", "other"), window) == {}
+    assert store.stats() == {"owners": 1, "rows": 5}
+
+
+def test_incremental_sync_replaces_only_recent_months(store, clock):
+    upstream = Upstream(TRANSACTIONS)
+    assert sync_snapshot(store, OWNER, upstream, max_age=60, current_key=DEC)
+    assert upstream.windows == [None]
+
+    # fresh: no upstream call
+    assert not sync_snapshot(store, OWNER, upstream, max_age=60, current_key=DEC)
+    assert len(upstream.windows) == 1
+
+    # stale: re-fetch from the last-synced month (December) through January
+    clock.now += 61
+    upstream.transactions = TRANSACTIONS[:2] + [
+        {"date": "2023-12-24", "type": "receive", "amount": 30, "category": "Gifts"},
+        {"date": "2024-01-05", "type": "receive", "amount": 2000, "category": "Salary"}
+    ]
+    assert sync_snapshot(store, OWNER, upstream, max_age=60, current_key=JAN)
+    assert upstream.windows[1] == (12, 2023, 1, 2024)
+
+    buckets = store.buckets(OWNER, (11, 2023, 1, 2024))
+    assert buckets[(2023, 11, "spent", "Groceries")] == 75.0  # kept, not duplicated
+    assert buckets[(2023, 12, "receive", "Gifts")] == 30.0
+    assert (2024, 1, "spent", None) not in buckets
+    assert store.plan_sync(OWNER, JAN, max_age=0) == SyncPlan((1, 2024, 1, 2024))
+
+
+def test_invalidate_forces_full_sync(store):
+    sync_snapshot(store, OWNER, Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+    sync_snapshot(store, ("8", "identity"), Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+
+    store.invalidate(7)
+    assert store.plan_sync(OWNER, JAN, max_age=60) == SyncPlan(None)
+    assert store.buckets(OWNER, (11, 2023, 1, 2024)) == {}
+    assert store.plan_sync(("8", "identity"), JAN, max_age=60) is None
+
+    store.invalidate()
+    assert store.stats() == {"owners": 0, "rows": 0}
+
+
+def test_store_is_bounded_by_owner(tmp_path, clock):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"), max_owners=2, clock=clock)
+    for user in ("1", "2", "3"):
+        sync_snapshot(store, (user, "identity"), Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+        clock.now += 1
+
+    # the least recently synced snapshot went
+    assert store.plan_sync(("1", "identity"), JAN, max_age=60) == SyncPlan(None)
+    assert store.buckets(("1", "identity"), (11, 2023, 1, 2024)) == {}
+    assert store.plan_sync(("3", "identity"), JAN, max_age=60) is None
+    assert store.stats() == {"owners": 2, "rows": 2 * len(TRANSACTIONS)}
+    store.close()
+
+
+def test_full_sync_drops_rotated_token_snapshots(store):
+    sync_snapshot(store, ("7", "old-token"), Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+    sync_snapshot(store, ("8", "identity"), Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+    sync_snapshot(store, ("7", "new-token"), Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+
+    assert store.plan_sync(("7", "old-token"), JAN, max_age=60) == SyncPlan(None)
+    assert store.buckets(("7", "new-token"), (11, 2023, 1, 2024)) == bucket_transactions(TRANSACTIONS)
+    assert store.stats() == {"owners": 2, "rows": 2 * len(TRANSACTIONS)}
+
+
+def test_malformed_rows_are_skipped(store):
+    malformed = [
+        {"date": "2023-11-05", "amount": 1, "category": "Groceries"},
+        {"date": "2023-12-05", "type": "spent", "amount": "n/a", "category": "Groceries"},
+        {"date": "2024-01-07", "type": "spent", "amount": None}
+    ]
+    sync_snapshot(store, OWNER, Upstream(TRANSACTIONS + malformed), max_age=60, current_key=JAN)
+    assert store.buckets(OWNER, (11, 2023, 1, 2024)) == bucket_transactions(TRANSACTIONS)
+
+
+def test_failed_sync_keeps_previous_snapshot(store, clock):
+    sync_snapshot(store, OWNER, Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+    clock.now += 61
+
+    def failing(window):
+        yield TRANSACTIONS[-1]
+        raise RuntimeError("stream cut off")
+
+    with pytest.raises(RuntimeError):
+        sync_snapshot(store, OWNER, failing, max_age=60, current_key=JAN)
+    assert store.buckets(OWNER, (11, 2023, 1, 2024)) == bucket_transactions(TRANSACTIONS)
+    assert store.plan_sync(OWNER, JAN, max_age=60) == SyncPlan((1, 2024, 1, 2024))
+
+
+def test_snapshot_survives_reopen(store):
+    sync_snapshot(store, OWNER, Upstream(TRANSACTIONS), max_age=60, current_key=JAN)
+    store.reopen()
+    assert store.buckets(OWNER, (11, 2023, 11, 2023)) == {(2023, 11, "spent", "Groceries"): 75.0}
@@ -0,0 +1,54 @@
+"""
+Startup cost of the WSGI app, measured with `python -X importtime` in a
+fresh interpreter.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of src.app (Flask, requests and our modules). About
+# 0.25 s on a developer laptop; the budget leaves room for slow CI machines
+# while still catching an eagerly imported heavy dependency.
+STARTUP_BUDGET_US = 1_500_000
+
+# Optional or mode-specific dependencies that must load on first use only.
+LAZY_MODULES = ("numpy", "asyncio", "multiprocessing", "aiohttp")
+
+
+def import_times(code):
+    """
+    Runs `code` under -X importtime and returns {module: cumulative µs}.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_create_app_import_budget():
+    times = import_times("from src.app import create_app; create_app()")
+
+    assert "src.app" in times
+    assert times["src.app"] < STARTUP_BUDGET_US, f"src.app imports took {times['src.app'] / 1000:.0f} ms"
+    assert not [module for module in LAZY_MODULES if module in times]
+
+
+def test_numpy_is_imported_on_first_frame():
+    code = (
+        "import sys\n"
+        "from src.utils.frame import HAS_NUMPY, to_frame\n"
+        "assert 'numpy' not in sys.modules\n"
+        "to_frame([{'date': '2024-01-05', 'type': 'spent', 'amount': 1, 'category': None}])\n"
+        "assert ('numpy' in sys.modules) == HAS_NUMPY\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
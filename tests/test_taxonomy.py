@@ -0,0 +1,126 @@
+import json
+import pickle
+
+import pytest
+
+from src.utils.aggregator import (
+    bucket_transactions,
+    compute_bar_data,
+    compute_line_data,
+    compute_pie_data_range
+)
+from src.utils.frame import to_frame
+from src.utils.prefix_index import PrefixIndex
+from src.utils.taxonomy import DEFAULT_TAXONOMY, Taxonomy, get_taxonomy, load_taxonomy, set_taxonomy
+
+CONFIG = {
+    "expense": ["Housing", "Food", "Misc"],
+    "income": ["Salary", "Misc"],
+    "aliases": {"Rent": "Housing", "Groceries": "Food", "Wages": "Salary"},
+    "caseSensitive": False,
+    "trimWhitespace": True,
+    "other": "Misc"
+}
+
+TRANSACTIONS = [
+    {"date": "2024-01-03", "type": "spent", "amount": 600, "category": "Rent"},
+    {"date": "2024-01-04", "type": "spent", "amount": 50.5, "category": " groceries"},
+    {"date": "2024-01-05", "type": "spent", "amount": 20, "category": "FOOD"},
+    {"date": "2024-02-01", "type": "spent", "amount": 12, "category": "Travel"},
+    {"date": "2024-02-02", "type": "spent", "amount": 3, "category": "travel"},
+    {"date": "2024-02-03", "type": "spent", "amount": 1, "category": None},
+    {"date": "2024-02-28", "type": "receive", "amount": 2000, "category": "wages"}
+]
+
+
+@pytest.fixture
+def taxonomy():
+    previous = get_taxonomy()
+    taxonomy = Taxonomy.from_config(CONFIG)
+    set_taxonomy(taxonomy)
+    yield taxonomy
+    set_taxonomy(previous)
+
+
+def test_codes_aliases_and_case(taxonomy):
+    assert taxonomy.names == ["Housing", "Food", "Misc", "Salary"]
+    assert [taxonomy.code(c) for c in ("Housing", "rent", "Groceries", " food ", "Wages")] == [0, 0, 1, 1, 3]
+    assert taxonomy.canonical("RENT") == "Housing"
+
+    # unknown categories get their own codes, first spelling wins
+    assert taxonomy.code("Travel") == taxonomy.code("TRAVEL ") == 4
+    assert taxonomy.canonical("travel") == "Travel"
+    assert taxonomy.canonical(None) is None
+
+    assert taxonomy.pie_slots(taxonomy.expense)[:5] == [0, 1, 2, 2, 2]
+    assert taxonomy.pie_slots(["Housing"]) == [0, -1, -1, -1, -1, -1]
+
+
+def test_case_sensitive_taxonomy_and_category_cap():
+    taxonomy = Taxonomy(["Rent", "Other"], [], case_sensitive=True, trim_whitespace=True, max_categories=2)
+    assert taxonomy.code("rent") != taxonomy.code("Rent")
+    assert taxonomy.code("Rent ") == taxonomy.code("Rent")
+    taxonomy.code("Travel")
+    # past max_categories unknown values fold into `other`, without being remembered
+    assert taxonomy.canonical("Junk") == "Other"
+    assert len(taxonomy.names) == 4 and "Junk" not in taxonomy.codes
+
+
+def test_default_taxonomy_matches_exactly():
+    # the categories charts had before the taxonomy: neither "groceries" nor " Rent" is a pie category
+    taxonomy = Taxonomy.from_config(DEFAULT_TAXONOMY)
+    assert taxonomy.case_sensitive and not taxonomy.trim_whitespace
+    previous = get_taxonomy()
+    set_taxonomy(taxonomy)
+    try:
+        transactions = [
+            {"date": "2024-01-03", "type": "spent", "amount": 10, "category": "Groceries"},
+            {"date": "2024-01-04", "type": "spent", "amount": 5, "category": "groceries"},
+            {"date": "2024-01-05", "type": "spent", "amount": 2, "category": "RENT"},
+            {"date": "2024-01-06", "type": "spent", "amount": 1, "category": " Rent"}
+        ]
+        buckets = bucket_transactions(transactions)
+        for source in (transactions, buckets, PrefixIndex.from_buckets(buckets), to_frame(transactions)):
+            pie = compute_pie_data_range(source, 1, 2024, 1, 2024, taxonomy.expense)
+            assert pie["data"] == [0.0, 10.0, 0.0, 0.0, 8.0]
+            assert compute_bar_data(source, 1, 2024, 1, 2024, "Expense", "Groceries")["data"] == [10.0]
+            assert compute_bar_data(source, 1, 2024, 1, 2024, "Expense", "groceries")["data"] == [5.0]
+            assert compute_bar_data(source, 1, 2024, 1, 2024, "Expense", "Rent")["data"] == [0.0]
+    finally:
+        set_taxonomy(previous)
+
+
+def test_invalid_config(tmp_path):
+    with pytest.raises(ValueError):
+        Taxonomy.from_config({"expense": ["Rent"]})
+    with pytest.raises(ValueError):
+        Taxonomy.from_config({**DEFAULT_TAXONOMY, "aliases": {"Food": "Grocery"}})
+
+    path = tmp_path / "taxonomy.json"
+    path.write_text(json.dumps(CONFIG))
+    assert load_taxonomy(str(path)).canonical("wages") == "Salary"
+
+
+def test_taxonomy_survives_pickling(taxonomy):
+    taxonomy.code("Travel")
+    copy = pickle.loads(pickle.dumps(taxonomy))
+    assert copy.names == taxonomy.names
+    assert copy.canonical("groceries") == "Food"
+
+
+def test_engines_chart_canonical_categories(taxonomy):
+    window = (1, 2024, 2, 2024)
+    buckets = bucket_transactions(TRANSACTIONS)
+    assert buckets[(2024, 1, "spent", "Food")] == 70.5
+    assert buckets[(2024, 2, "spent", "Travel")] == 15.0
+
+    pie = {"labels": ["Housing", "Food", "Misc"], "data": [600.0, 70.5, 16.0]}
+    # to_frame() returns the list itself without NumPy
+    sources = [TRANSACTIONS, buckets, PrefixIndex.from_buckets(buckets), to_frame(TRANSACTIONS)]
+
+    for source in sources:
+        assert compute_pie_data_range(source, *window, taxonomy.expense) == pie
+        assert compute_pie_data_range(source, *window, taxonomy.income, expense=False)["data"] == [2000.0, 0.0]
+        assert compute_bar_data(source, *window, "Expense", "groceries")["data"] == [70.5, 0.0]
+        assert compute_bar_data(source, *window, "Expense", "Travel")["data"] == [0.0, 15.0]
+        assert compute_line_data(source, *window)["expenseData"] == [670.5, 16.0]
@@ -0,0 +1,230 @@
+import pytest
+from src.services.transaction_client import (
+    CircuitBreaker,
+    TransactionClient,
+    TransactionServiceError
+)
+from tests.stub_transaction_service import StubResponse, StubTransactionService
+
+
+@pytest.fixture
+def stub():
+    service = StubTransactionService().start()
+    yield service
+    service.stop()
+
+
+def make_client(stub, **kwargs):
+    options = dict(connect_timeout=1, read_timeout=1, max_retries=2, backoff_factor=0)
+    options.update(kwargs)
+    return TransactionClient(stub.url, **options)
+
+
+def test_get_transactions_reuses_keep_alive_connection(stub):
+    transactions = [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Rent"}]
+    stub.queue(StubResponse(body=transactions))
+    client = make_client(stub)
+
+    assert client.get_transactions(1, "Bearer abc") == transactions
+    assert client.get_transactions(1, "Bearer abc") == transactions
+
+    assert stub.requests[0]["query"] == {"userId": ["1"]}
+    assert stub.requests[0]["headers"]["Authorization"] == "Bearer abc"
+    # both calls went over the same pooled connection
+    assert stub.requests[0]["client_port"] == stub.requests[1]["client_port"]
+
+
+def test_warm_up_opens_pooled_connection(stub):
+    client = make_client(stub)
+    client.warm_up()
+    client.get_transactions(1)
+    assert stub.head_ports == [stub.requests[0]["client_port"]]
+
+    # an unreachable upstream is logged, not raised, and does not trip the breaker
+    down = TransactionClient("http://127.0.0.1:9", connect_timeout=0.5, max_retries=0,
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    down.warm_up()
+    assert down.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_get_transactions_retries_transient_errors(stub):
+    stub.queue(StubResponse(status=503), StubResponse(status=502), StubResponse(body=[]))
+    client = make_client(stub)
+
+    assert client.get_transactions(1) == []
+    assert len(stub.requests) == 3
+
+
+def test_get_transactions_times_out(stub):
+    stub.queue(StubResponse(body=[], delay=0.5))
+    client = make_client(stub, read_timeout=0.1, max_retries=0)
+
+    with pytest.raises(TransactionServiceError) as exc:
+        client.get_transactions(1)
+    assert exc.value.status_code == 502
+
+
+def test_circuit_breaker_fails_fast_then_recovers(stub):
+    clock = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: clock[0])
+    stub.queue(StubResponse(status=500), StubResponse(status=500), StubResponse(body=[]))
+    client = make_client(stub, max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(TransactionServiceError) as exc:
+            client.get_transactions(1)
+        assert exc.value.status_code == 502
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # open => fail fast without touching the upstream
+    with pytest.raises(TransactionServiceError) as exc:
+        client.get_transactions(1)
+    assert exc.value.status_code == 503
+    assert len(stub.requests) == 2
+
+    # after the reset timeout a trial call goes through and closes the circuit
+    clock[0] = 31
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.get_transactions(1) == []
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_iter_transactions_streams_records(stub):
+    transactions = [{"date": "2023-11-%02d" % d, "type": "spent", "amount": d} for d in range(1, 29)]
+    stub.queue(StubResponse(body=transactions))
+    client = make_client(stub)
+
+    assert list(client.iter_transactions(1, chunk_size=16)) == transactions
+
+
+def test_iter_transactions_truncated_body(stub):
+    stub.queue(StubResponse(body=b'[{"amount": 1}, {"amo'))
+    client = make_client(stub)
+
+    with pytest.raises(TransactionServiceError) as exc:
+        list(client.iter_transactions(1))
+    assert exc.value.status_code == 502
+
+
+def test_get_transactions_pushes_down_window_and_filters_client_side(stub):
+    # this upstream ignores the filters and returns everything
+    stub.queue(StubResponse(body=[
+        {"date": "2023-10-31", "type": "spent", "amount": 1},
+        {"date": "2023-11-15", "type": "spent", "amount": 2},
+        {"date": "2023-11-16", "type": "receive", "amount": 3},
+        {"date": "2024-01-01", "type": "spent", "amount": 4}
+    ]))
+    client = make_client(stub)
+
+    result = client.get_transactions(1, window=(11, 2023, 12, 2023), txn_type="spent")
+    assert result == [{"date": "2023-11-15", "type": "spent", "amount": 2}]
+    assert stub.requests[0]["query"] == {
+        "userId": ["1"],
+        "startDate": ["2023-11-01"],
+        "endDate": ["2023-12-31"],
+        "type": ["spent"]
+    }
+
+
+def paged(records, page_size, with_total=True):
+    def body(query):
+        page = int(query["page"][0])
+        size = int(query["pageSize"][0])
+        assert size == page_size
+        envelope = {"data": records[(page - 1) * size:page * size], "page": page}
+        if with_total:
+            envelope["totalPages"] = -(-len(records) // size)
+        return envelope
+    return body
+
+
+def test_get_transactions_walks_pages_concurrently(stub):
+    records = [{"date": "2023-11-01", "type": "spent", "amount": i} for i in range(23)]
+    stub.queue(StubResponse(body=paged(records, 5), delay=0.05))
+    client = make_client(stub, page_size=5, page_concurrency=4)
+
+    assert client.get_transactions(1) == records
+    assert sorted(int(r["query"]["page"][0]) for r in stub.requests) == [1, 2, 3, 4, 5]
+
+
+def test_get_transactions_walks_pages_without_total(stub):
+    records = [{"date": "2023-11-01", "type": "spent", "amount": i} for i in range(10)]
+    stub.queue(StubResponse(body=paged(records, 5, with_total=False)))
+    client = make_client(stub, page_size=5)
+
+    # two full pages, then an empty one ends the walk
+    assert client.get_transactions(1) == records
+    assert len(stub.requests) == 3
+
+
+def test_get_transactions_stops_on_an_upstream_that_ignores_pages(stub):
+    records = [{"date": "2023-11-01", "type": "spent", "amount": i} for i in range(5)]
+    # an envelope without totalPages that always returns the first page
+    stub.queue(StubResponse(body=lambda query: {"data": records}))
+    client = make_client(stub, page_size=5)
+
+    assert client.get_transactions(1) == records
+    assert len(stub.requests) == 2
+
+
+def test_get_transactions_page_limit(stub):
+    endless = paged([{"date": "2023-11-01", "type": "spent", "amount": i} for i in range(100)], 5, with_total=False)
+    stub.queue(StubResponse(body=endless))
+    client = make_client(stub, page_size=5, max_pages=3)
+    with pytest.raises(TransactionServiceError):
+        client.get_transactions(1)
+    assert len(stub.requests) == 3
+
+    stub.queue(StubResponse(body=paged([{"amount": i} for i in range(100)], 5)))
+    with pytest.raises(TransactionServiceError):
+        client.get_transactions(1)  # totalPages = 20
+
+
+@pytest.mark.parametrize("total", [{"pages": 2}, "n/a", [2], True, 2.5])
+def test_get_transactions_rejects_a_bad_page_count(stub, total):
+    stub.queue(StubResponse(body={"data": [{"amount": 1}], "totalPages": total}))
+    with pytest.raises(TransactionServiceError):
+        make_client(stub).get_transactions(1)
+
+
+def test_conditional_requests_with_upstream_etag(stub):
+    transactions = [{"date": "2023-11-03", "type": "spent", "amount": 50, "category": "Rent"}]
+    stub.queue(StubResponse(body=transactions, headers={"ETag": '"v1"'}), StubResponse(status=304))
+    client = make_client(stub)
+
+    first = client.get_transactions(1)
+    assert first == transactions
+    assert first.etag == '"v1"'
+    assert first.version == '"v1"'
+    assert "If-None-Match" not in stub.requests[0]["headers"]
+
+    assert client.get_transactions(1, etag=first.etag) is None
+    assert stub.requests[1]["headers"]["If-None-Match"] == '"v1"'
+    assert client.breaker.state == client.breaker.CLOSED
+
+
+def test_version_without_upstream_etag_follows_the_body(stub):
+    stub.queue(
+        StubResponse(body=[{"date": "2023-11-03", "type": "spent", "amount": 50}]),
+        StubResponse(body=[{"date": "2023-11-03", "type": "spent", "amount": 50}]),
+        StubResponse(body=[{"date": "2023-11-03", "type": "spent", "amount": 51}])
+    )
+    client = make_client(stub)
+
+    first, second, third = (client.get_transactions(1) for _ in range(3))
+    assert first.etag is None
+    assert first.version == second.version != third.version
+
+
+def test_requests_and_decodes_compressed_payloads(stub):
+    transactions = [{"date": "2023-11-%02d" % d, "type": "spent", "amount": d} for d in range(1, 29)]
+    stub.queue(StubResponse(body=transactions, compress=True))
+
+    client = make_client(stub, accept_encoding="gzip")
+    assert client.get_transactions(1) == transactions
+    assert list(client.iter_transactions(1, chunk_size=16)) == transactions
+    assert all(r["headers"]["Accept-Encoding"] == "gzip" for r in stub.requests)
+
+    identity = make_client(stub, accept_encoding="identity")
+    assert identity.get_transactions(1) == transactions
+    assert stub.requests[-1]["headers"]["Accept-Encoding"] == "identity"